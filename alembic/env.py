@@ -9,6 +9,7 @@ from app.db.base import Base
 from app.core.config import settings as s
 from app.models.user import User
 from app.models.note import Note
+from app.models.fsm import FSMRecord
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -29,7 +30,7 @@ target_metadata = Base.metadata
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
-config.set_main_option("sqlalchemy.url", f"{s.DATABASE_URL}")
+config.set_main_option("sqlalchemy.url", f"{s.MIGRATIONS_DATABASE_URL}")
 
 
 def run_migrations_offline() -> None:
@@ -0,0 +1,28 @@
+"""Note tags search indexes
+
+Revision ID: 3a9d7c5e2f14
+Revises: 8c2f4e1a7b3d
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9d7c5e2f14'
+down_revision: Union[str, None] = '8c2f4e1a7b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Отдельный индекс по notes.user_id не нужен: его роль выполняет
+    # ix_notes_user_id_updated_at_id, в котором user_id - ведущий столбец
+    op.create_index('ix_note_tags_tag_id_note_id', 'note_tags', ['tag_id', 'note_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_note_tags_tag_id_note_id', table_name='note_tags')
@@ -0,0 +1,27 @@
+"""Notes keyset pagination index
+
+Revision ID: 5e6d06b5b924
+Revises: ba9f1b50c7ef
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e6d06b5b924'
+down_revision: Union[str, None] = 'ba9f1b50c7ef'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_notes_user_id_updated_at_id', 'notes',
+                    ['user_id', 'updated_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_user_id_updated_at_id', table_name='notes')
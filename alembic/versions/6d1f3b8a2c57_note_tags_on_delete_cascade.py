@@ -0,0 +1,35 @@
+"""note_tags on delete cascade
+
+Revision ID: 6d1f3b8a2c57
+Revises: 0b8e2d4f6a13
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d1f3b8a2c57'
+down_revision: Union[str, None] = '0b8e2d4f6a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Имена ограничений, которые PostgreSQL присвоил внешним ключам при создании note_tags
+FOREIGN_KEYS = (
+    ('note_tags_note_id_fkey', 'notes', 'note_id'),
+    ('note_tags_tag_id_fkey', 'tags', 'tag_id'),
+)
+
+
+def upgrade() -> None:
+    for name, referent, column in FOREIGN_KEYS:
+        op.drop_constraint(name, 'note_tags', type_='foreignkey')
+        op.create_foreign_key(name, 'note_tags', referent, [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    for name, referent, column in FOREIGN_KEYS:
+        op.drop_constraint(name, 'note_tags', type_='foreignkey')
+        op.create_foreign_key(name, 'note_tags', referent, [column], ['id'])
@@ -0,0 +1,43 @@
+"""Notes full-text search
+
+Revision ID: 8c2f4e1a7b3d
+Revises: 5e6d06b5b924
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2f4e1a7b3d'
+down_revision: Union[str, None] = '5e6d06b5b924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # btree_gin позволяет включить user_id в GIN-индекс вместе с tsvector
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.add_column('notes', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(content, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index('ix_notes_user_id_search_vector', 'notes',
+                    ['user_id', 'search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_user_id_search_vector', table_name='notes', postgresql_using='gin')
+    op.drop_column('notes', 'search_vector')
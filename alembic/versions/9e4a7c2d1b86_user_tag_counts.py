@@ -0,0 +1,47 @@
+"""user_tag_counts
+
+Revision ID: 9e4a7c2d1b86
+Revises: c3e8a1f5d742
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4a7c2d1b86'
+down_revision: Union[str, None] = 'c3e8a1f5d742'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_tag_counts',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'tag_id')
+    )
+    op.create_index('ix_user_tag_counts_user_id_name', 'user_tag_counts', ['user_id', 'name'], unique=False,
+                    postgresql_ops={'name': 'varchar_pattern_ops'}, postgresql_where=sa.text('count > 0'))
+    # Начальное заполнение по существующим заметкам
+    op.execute(
+        "INSERT INTO user_tag_counts (user_id, tag_id, name, count) "
+        "SELECT notes.user_id, tags.id, tags.name, count(*) "
+        "FROM note_tags "
+        "JOIN notes ON notes.id = note_tags.note_id "
+        "JOIN tags ON tags.id = note_tags.tag_id "
+        "WHERE notes.user_id IS NOT NULL "
+        "GROUP BY notes.user_id, tags.id, tags.name"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_tag_counts_user_id_name', table_name='user_tag_counts')
+    op.drop_table('user_tag_counts')
@@ -0,0 +1,85 @@
+"""fold tag names
+
+Revision ID: c3e8a1f5d742
+Revises: 6d1f3b8a2c57
+Create Date: 2026-10-18 17:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f5d742'
+down_revision: Union[str, None] = '6d1f3b8a2c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Имя тега в том виде, в котором его сохраняет и ищет app.crud.note.normalize_tag_names
+# (копия: миграция не должна зависеть от будущих версий кода приложения)
+def fold(name: str) -> str:
+    return (name or '').strip().casefold()
+
+
+def upgrade() -> None:
+    # Теги, сохраненные до нормализации ("Work", " work"), сводятся к одному тегу "work".
+    # Имена приводятся в Python тем же правилом, что и в приложении: lower() в
+    # PostgreSQL совпадает с str.casefold() не для всех символов.
+    conn = op.get_bind()
+    groups: dict[str, list[tuple[int, str]]] = {}
+    for tag_id, name in conn.execute(sa.text("SELECT id, name FROM tags ORDER BY id")):
+        groups.setdefault(fold(name), []).append((tag_id, name))
+
+    merges = []  # (old_id, new_id): связи old_id переносятся на new_id, сам old_id удаляется
+    renames = []  # (id, name)
+    dropped = []  # Теги с пустым после обрезки именем
+    for folded, tags in groups.items():
+        if not folded:
+            dropped += [tag_id for tag_id, _ in tags]
+            continue
+        # Остается тег, уже названный нормализованно, иначе самый старый
+        keep_id = next((tag_id for tag_id, name in tags if name == folded), tags[0][0])
+        merges += [(tag_id, keep_id) for tag_id, _ in tags if tag_id != keep_id]
+        if dict(tags)[keep_id] != folded:
+            renames.append((keep_id, folded))
+    if not (merges or renames or dropped):
+        return
+
+    op.execute("CREATE TEMPORARY TABLE tag_fold (old_id integer PRIMARY KEY, new_id integer) ON COMMIT DROP")
+    conn.execute(sa.text("INSERT INTO tag_fold (old_id, new_id) VALUES (:old_id, :new_id)"),
+                 [{"old_id": old_id, "new_id": new_id} for old_id, new_id in merges]
+                 + [{"old_id": tag_id, "new_id": tag_id} for tag_id, _ in renames]
+                 + [{"old_id": tag_id, "new_id": None} for tag_id in dropped])
+
+    # Списки заметок затронутых пользователей меняются: сбрасываем их ETag
+    op.execute(
+        "UPDATE users SET notes_version = notes_version + 1 WHERE id IN ("
+        "SELECT notes.user_id FROM notes "
+        "JOIN note_tags ON note_tags.note_id = notes.id "
+        "JOIN tag_fold ON tag_fold.old_id = note_tags.tag_id)"
+    )
+    # Связи переносятся на оставшийся тег; совпавшие с уже существующими отбрасываются
+    op.execute(
+        "INSERT INTO note_tags (note_id, tag_id) "
+        "SELECT note_tags.note_id, tag_fold.new_id FROM note_tags "
+        "JOIN tag_fold ON tag_fold.old_id = note_tags.tag_id "
+        "WHERE tag_fold.new_id IS NOT NULL AND tag_fold.new_id <> tag_fold.old_id "
+        "ON CONFLICT DO NOTHING"
+    )
+    # Связи удаляемых тегов удаляются каскадно (6d1f3b8a2c57)
+    op.execute(
+        "DELETE FROM tags USING tag_fold "
+        "WHERE tags.id = tag_fold.old_id AND tag_fold.new_id IS DISTINCT FROM tag_fold.old_id"
+    )
+    # Переименование - после удаления дублей, иначе нарушилась бы уникальность имени
+    if renames:
+        conn.execute(sa.text("UPDATE tags SET name = :name WHERE id = :id"),
+                     [{"id": tag_id, "name": name} for tag_id, name in renames])
+
+
+def downgrade() -> None:
+    # Исходное написание и объединенные теги не восстановить
+    pass
@@ -1,12 +1,13 @@
 # app/api/auth.py
 from fastapi import APIRouter, Depends, HTTPException, Response, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.security import verify_password, create_access_token
-# from app.models.user import User
+from app.core.security import verify_and_update_password, create_user_access_token
+from app.models.user import User
 from app.schemas.user import UserCreate, UserInDB
 from app.crud.user import (get_user_by_email, get_user_by_telegram_id,
-                           create_user, create_user_by_telegram_id)
-from app.api.deps import get_db
+                           create_user, create_user_by_telegram_id, revoke_user_tokens)
+from app.api.deps import get_db, get_current_user, read_user_row, use_read_replica
+from app.db.routing import set_session_identity
 
 router = APIRouter(
     prefix="/auth",
@@ -35,6 +36,8 @@ async def register_new_user_by_telegram(
         telegram_id: int = Header(...),  # Извлекаем telegram_id из заголовка
         db: AsyncSession = Depends(get_db)
 ):
+    # Следующий вход этого пользователя должен увидеть созданную запись
+    set_session_identity(db, ("telegram", telegram_id))
     existing_user = await get_user_by_telegram_id(db, telegram_id)
     if existing_user:
         raise HTTPException(status_code=400, detail="User with this Telegram ID already exists")
@@ -63,27 +66,46 @@ async def login_for_access_token(
     # Логин по email и паролю
     elif form_data:
         user = await get_user_by_email(db, form_data.email)
-        if not user or not verify_password(form_data.password, user.hashed_password):
+        if not user:
+            raise HTTPException(status_code=400, detail="Invalid email or password")
+        verified, new_hash = await verify_and_update_password(form_data.password, user.hashed_password)
+        if not verified:
             raise HTTPException(status_code=400, detail="Invalid email or password")
+        if new_hash:
+            # Хеш сделан устаревшей схемой или с прежней стоимостью - заменяем, пока пароль известен
+            user.hashed_password = new_hash
+            await db.commit()
 
     # Если не указаны ни email, ни Telegram ID
     if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
     # Генерация токена
-    access_token = create_access_token(data={"sub": user.email})  # используем email как уникальный идентификатор
+    access_token = create_user_access_token(user)  # id пользователя и версия его токенов
     response.set_cookie(key="access_token", value=access_token, httponly=True)
 
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@router.post("/login/telegram", response_model=UserInDB)
+@router.post("/login/telegram", response_model=UserInDB, dependencies=[Depends(use_read_replica)])
 async def login_by_telegram_id(
         telegram_id: int = Header(...),  # Получаем telegram_id из заголовка
         db: AsyncSession = Depends(get_db)
 ):
-    user = await get_user_by_telegram_id(db, telegram_id)
+    set_session_identity(db, ("telegram", telegram_id))
+    user = await read_user_row(db, get_user_by_telegram_id, telegram_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     return user
+
+
+@router.post("/revoke", status_code=204)
+async def revoke_access_tokens(
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    # Все выданные пользователю токены (включая текущий) перестают действовать
+    await revoke_user_tokens(db, current_user)
+    response.delete_cookie(key="access_token")
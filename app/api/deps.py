@@ -1,21 +1,42 @@
-from typing import Optional
+import hashlib
+import logging
+import time
+from typing import NamedTuple, Optional
 from fastapi import Depends, HTTPException, status, Cookie, Header
 from jose import jwt, JWTError, ExpiredSignatureError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
+from app.core.cache import principal_cache, token_state_cache, verified_token_cache
 from app.core.config import settings
 from app.db.base import get_db
+from app.db.routing import mark_read_only, pin_to_primary, set_session_identity
 from app.models.user import User
-from app.crud.user import get_user_by_email, get_user_by_telegram_id
+from app.crud.user import get_token_state, get_user_by_id, get_user_by_telegram_id
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
 
 # Модель для токена
 class TokenData(BaseModel):
     email: Optional[str] = None
 
 
+# Утверждения проверенного токена доступа
+class TokenClaims(NamedTuple):
+    user_id: int
+    token_version: int
+    active: bool
+
+
+class Principal(NamedTuple):
+    """Аутентифицированный пользователь. Для входа по токену строка users не
+    загружается (user=None): эндпоинтам заметок достаточно id."""
+    id: int
+    user: Optional[User] = None
+
+
 async def get_token(request: Request) -> str:
     token = request.cookies.get("access_token")
     if not token:
@@ -23,29 +44,98 @@ async def get_token(request: Request) -> str:
     return token
 
 
-# Зависимость для получения текущего пользователя по токену или Telegram ID
-async def get_current_user(
+# Проверка подписи и срока действия токена. Результат кэшируется по sha256 токена
+# до момента его истечения, поэтому повторные запросы с тем же токеном не декодируют его.
+def decode_access_token(token: str) -> TokenClaims:
+    cache_key = hashlib.sha256(token.encode()).digest()
+    claims = verified_token_cache.get(cache_key)
+    if claims is not None:
+        return claims
+
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except ExpiredSignatureError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Token has expired")
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Could not validate credentials")
+
+    try:
+        claims = TokenClaims(int(payload["sub"]), int(payload["ver"]), bool(payload.get("active", True)))
+        expires_in = float(payload["exp"]) - time.time()
+    except (KeyError, TypeError, ValueError):
+        # В том числе токены старого формата (sub = email): нужно войти заново
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Invalid token payload")
+
+    verified_token_cache.set(cache_key, claims, ttl=max(0.0, expires_in))
+    return claims
+
+
+# Чтение строки пользователя (read(db, key)). Промах на реплике повторяется в основной
+# БД: пользователь мог только что зарегистрироваться через другой воркер, и его
+# запись еще не дошла до реплики.
+async def read_user_row(db: AsyncSession, read, key):
+    row = await read(db, key)
+    if row is None and pin_to_primary(db):
+        row = await read(db, key)
+    return row
+
+
+# Проверка, что токен не отозван: версия в токене совпадает с текущей версией
+# токенов пользователя, а пользователь активен. Состояние кэшируется на
+# PRINCIPAL_CACHE_TTL; в этом процессе отзыв виден сразу (invalidate_principal).
+async def check_token_not_revoked(db: AsyncSession, claims: TokenClaims):
+    state = token_state_cache.get(claims.user_id)
+    if state is None:
+        state = await read_user_row(db, get_token_state, claims.user_id)
+        if state is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="Invalid credentials")
+        token_state_cache.set(claims.user_id, state)
+
+    if not (claims.active and state.is_active and state.token_version == claims.token_version):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Token has been revoked")
+
+
+# Зависимость маршрутов без записи (подключается в dependencies=[...], чтобы выполниться
+# раньше аутентификации): SELECT сессии запроса, включая поиск пользователя, могут идти
+# на реплику для чтения (см. app.db.routing)
+async def use_read_replica(db: AsyncSession = Depends(get_db)):
+    mark_read_only(db)
+
+
+# Зависимость для получения текущего пользователя по токену или Telegram ID.
+# Для токена, уже проверенного ранее, запросов к БД нет вовсе.
+async def get_current_principal(
         db: AsyncSession = Depends(get_db),
         telegram_id: int = Header(None),
         access_token: str = Cookie(None),  # Извлечение токена из куки
         authorization: str = Header(None)  # Извлечение токена из заголовка Authorization
-) -> User:
+) -> Principal:
     token = None
 
-    print(f"Received Telegram ID: {telegram_id=}")  # Отладочное сообщение
+    logger.debug("Authenticating request", extra={"telegram_id": telegram_id})
 
     # Если есть Telegram-ID в заголовке, ищем пользователя по нему
     if telegram_id:
-        user = await get_user_by_telegram_id(db, telegram_id)
-        if user:
-            return user
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail="Invalid Telegram ID")
+        cache_key = ("telegram", telegram_id)
+        set_session_identity(db, cache_key)
+        user = principal_cache.get(cache_key)
+        if not user:
+            user = await read_user_row(db, get_user_by_telegram_id, telegram_id)
+            if not user:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                    detail="Invalid Telegram ID")
+            principal_cache.set(cache_key, user)
+        set_session_identity(db, ("id", user.id))
+        return Principal(user.id, user)
 
     # На случай добавления клиентов (мобильных приложений или фронтенд-фреймворков
     # вроде React) оставим возможность передачи токена в заголовке
     elif authorization:
-        print(authorization)
         # Если токен передан в заголовке Authorization
         scheme, _, param = authorization.partition(" ")
         if scheme.lower() != "bearer":
@@ -57,28 +147,32 @@ async def get_current_user(
         # Если токен передан в куки
         token = access_token
 
-    if token:
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-            email = payload.get("sub")
-            if email is None:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                                    detail="Invalid token payload")
-            user = await get_user_by_email(db=db, email=email)
-            if not user:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                                    detail="Invalid credentials")
-        except ExpiredSignatureError:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                                detail="Token has expired")
-        except JWTError:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                                detail="Could not validate credentials")
-
-    else:
+    if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Authorization credentials not provided")
 
+    claims = decode_access_token(token)
+    set_session_identity(db, ("id", claims.user_id))
+    await check_token_not_revoked(db, claims)
+    return Principal(claims.user_id)
+
+
+# Зависимость для эндпоинтов, которым нужна вся строка пользователя
+async def get_current_user(
+        db: AsyncSession = Depends(get_db),
+        principal: Principal = Depends(get_current_principal)
+) -> User:
+    if principal.user is not None:
+        return principal.user
+
+    cache_key = ("id", principal.id)
+    user = principal_cache.get(cache_key)
+    if not user:
+        user = await read_user_row(db, get_user_by_id, principal.id)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="Invalid credentials")
+        principal_cache.set(cache_key, user)
     return user
 
 
@@ -87,3 +181,11 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     if not current_user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
     return current_user
+
+
+# Зависимость для служебных эндпоинтов: доступ только по токену из настроек
+async def verify_internal_token(x_internal_token: str = Header(None)):
+    if not settings.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_internal_token != settings.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
@@ -0,0 +1,30 @@
+# app/api/internal.py
+from fastapi import APIRouter, Depends
+
+from app.api.deps import verify_internal_token
+from app.core.security import password_hasher
+from app.db.base import get_pool_status, replica_router
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["Служебное"],
+    dependencies=[Depends(verify_internal_token)],
+    include_in_schema=False,
+)
+
+
+@router.get("/db-pool")
+async def read_db_pool_status():
+    # Статистика относится к воркеру, обработавшему запрос (см. поле pid)
+    return get_pool_status()
+
+
+@router.get("/db-replicas")
+async def read_db_replicas_status():
+    # Состояние реплик по последней проверке этого воркера
+    return replica_router.status()
+
+
+@router.get("/password-hasher")
+async def read_password_hasher_status():
+    return password_hasher.stats()
@@ -0,0 +1,16 @@
+# app/api/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import registry
+
+router = APIRouter(include_in_schema=False)
+
+# Тип содержимого текстового формата Prometheus
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics")
+async def read_metrics():
+    # Значения относятся к воркеру, обработавшему запрос
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,37 +1,118 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+import csv
+import io
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
+from fastapi.responses import Response, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Literal, Optional, Union
 from fastapi import Query
 
 from app.db.base import AsyncSessionLocal
-from app.schemas.note import NoteCreate, NoteInDB
-from app.crud.note import create_note, get_notes, update_note, delete_note, search_notes
-from app.api.deps import get_db, get_current_user
+from app.schemas.note import (NoteCreate, NoteInDB, NotePage, NoteSummaryPage, NoteSearchResult, NoteBatchRequest,
+                              NoteBatchResult, NoteAdapter, NotePageAdapter, NoteSummaryPageAdapter,
+                              NoteSearchResultListAdapter, NoteBatchResultAdapter)
+from app.crud.note import (create_note, get_note, get_notes, update_note, delete_note, search_notes,
+                           fulltext_search_notes, stream_notes_for_export, import_notes_batch,
+                           get_notes_version, apply_note_batch)
+from app.api.deps import Principal, get_db, get_current_principal, use_read_replica
 
 router = APIRouter(
     prefix="/notes",
     tags=["Заметки"],
 )
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+DEFAULT_PREVIEW_LENGTH = 200  # Длина превью содержания в сокращенных списках (fields=summary)
+MAX_PREVIEW_LENGTH = 2000
+
+IMPORT_BATCH_SIZE = 500  # Сколько заметок вставлять одной пачкой при импорте
+IMPORT_MAX_LINE_BYTES = 1024 * 1024  # Ограничение на размер одной строки NDJSON
+
+
+# JSON-ответ, собранный заранее построенным TypeAdapter: проверка и кодирование идут
+# одним проходом в pydantic-core. Возвращенный Response FastAPI отдает как есть,
+# response_model у маршрута остается для документации OpenAPI.
+def adapter_response(adapter: TypeAdapter, value, status_code: int = status.HTTP_200_OK) -> Response:
+    content = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return Response(content=content, status_code=status_code, media_type="application/json")
+
+
+# Длина превью для сокращенного списка или None для полных заметок
+def list_preview_length(fields: str, preview_length: int) -> Optional[int]:
+    return preview_length if fields == "summary" else None
+
+
+# Ответ со страницей заметок в выбранной проекции
+def note_page_response(page: dict, preview_length: Optional[int]) -> Response:
+    return adapter_response(NoteSummaryPageAdapter if preview_length else NotePageAdapter, page)
+
+
+# ETag списков заметок пользователя. Ответ зависит еще и от параметров запроса,
+# но ETag сравнивается только в пределах одного URL, поэтому версии достаточно.
+# Слабый, так как одинаковое содержание не гарантирует побайтно одинаковый ответ.
+def notes_etag(user_id: int, version: int) -> str:
+    return f'W/"{user_id}-{version}"'
+
+
+# Проверка заголовка If-None-Match (слабое сравнение, список значений или "*")
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+# ETag списка заметок и готовый ответ 304, если у клиента актуальная версия.
+# Выполняется до запросов к заметкам: для неизменившегося списка это единственный запрос.
+async def check_notes_etag(db: AsyncSession, user_id: int,
+                           if_none_match: Optional[str]) -> tuple[str, Optional[Response]]:
+    etag = notes_etag(user_id, await get_notes_version(db, user_id))
+    if etag_matches(if_none_match, etag):
+        return etag, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return etag, None
 
-@router.get("/", response_model=List[NoteInDB], status_code=status.HTTP_200_OK)
+
+@router.get("/", response_model=Union[NotePage, NoteSummaryPage], status_code=status.HTTP_200_OK,
+            dependencies=[Depends(use_read_replica)])
 async def read_notes(
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,  # Курсор из next_cursor предыдущей страницы
+        # summary - без полного содержания, с превью длиной preview_length (полная заметка - GET /notes/{id})
+        fields: Literal["full", "summary"] = "full",
+        preview_length: int = Query(DEFAULT_PREVIEW_LENGTH, ge=1, le=MAX_PREVIEW_LENGTH),
+        if_none_match: Optional[str] = Header(None),  # ETag ранее полученного списка
         db: AsyncSession = Depends(get_db),
-        current_user: int = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
-    return await get_notes(db=db, user_id=current_user.id)
+    etag, not_modified = await check_notes_etag(db, current_user.id, if_none_match)
+    if not_modified:
+        return not_modified
+
+    preview_length = list_preview_length(fields, preview_length)
+    try:
+        page = await get_notes(db=db, user_id=current_user.id, limit=limit, cursor=cursor,
+                               preview_length=preview_length)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    response = note_page_response(page, preview_length)
+    response.headers["ETag"] = etag
+    return response
 
 
 @router.post("/", response_model=NoteInDB, status_code=status.HTTP_201_CREATED)
 async def create_new_note(
-        request: Request,  # Добавляем объект Request для отладки
         note_in: NoteCreate,
         db: AsyncSession = Depends(get_db),
-        current_user: int = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
-    print(f"Request headers: {request.headers}")  # Выводим заголовки запроса
-
-    return await create_note(db=db, note_in=note_in, user_id=current_user.id)
+    note = await create_note(db=db, note_in=note_in, user_id=current_user.id)
+    return adapter_response(NoteAdapter, note, status_code=status.HTTP_201_CREATED)
 
 
 @router.put("/{note_id}", response_model=NoteInDB, status_code=status.HTTP_200_OK)
@@ -39,38 +120,203 @@ async def update_existing_note(
         note_id: int,
         note_in: NoteCreate,
         db: AsyncSession = Depends(get_db),
-        current_user: int = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     note = await update_note(db=db, note_id=note_id, note_in=note_in, user_id=current_user.id)
 
     if not note:
         raise HTTPException(status_code=404, detail="Note not found or not authorized to update")
 
-    return note
+    return adapter_response(NoteAdapter, note)
 
 
 @router.delete("/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_existing_note(
         note_id: int,
         db: AsyncSession = Depends(get_db),
-        current_user: int = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
-    note = await delete_note(db=db, note_id=note_id, user_id=current_user.id)
+    deleted_id = await delete_note(db=db, note_id=note_id, user_id=current_user.id)
 
-    if not note:
+    if deleted_id is None:
         raise HTTPException(status_code=404, detail="Note not found or not authorized to delete")
 
-    return note
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
-@router.get("/search", response_model=List[NoteInDB], status_code=status.HTTP_200_OK)
+@router.get("/search", response_model=Union[NotePage, NoteSummaryPage], status_code=status.HTTP_200_OK,
+            dependencies=[Depends(use_read_replica)])
 async def search_notes_by_tags(
         tags: List[str] = Query(None),  # Принимаем список тегов через Query-параметры
+        match: Literal["all", "any"] = "all",  # all - все теги (AND), any - хотя бы один (OR)
+        exclude: List[str] = Query(None),  # Теги, которых у заметки быть не должно (NOT)
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        fields: Literal["full", "summary"] = "full",
+        preview_length: int = Query(DEFAULT_PREVIEW_LENGTH, ge=1, le=MAX_PREVIEW_LENGTH),
+        if_none_match: Optional[str] = Header(None),
         db: AsyncSession = Depends(get_db),
-        current_user: int = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     if not tags:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Tags are required for search")
 
-    return await search_notes(db=db, user_id=current_user.id, tags=tags)
+    etag, not_modified = await check_notes_etag(db, current_user.id, if_none_match)
+    if not_modified:
+        return not_modified
+
+    preview_length = list_preview_length(fields, preview_length)
+    try:
+        page = await search_notes(db=db, user_id=current_user.id, tags=tags, limit=limit, cursor=cursor,
+                                  match=match, exclude=exclude, preview_length=preview_length)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    response = note_page_response(page, preview_length)
+    response.headers["ETag"] = etag
+    return response
+
+
+@router.get("/fulltext", response_model=List[NoteSearchResult], status_code=status.HTTP_200_OK,
+            dependencies=[Depends(use_read_replica)])
+async def search_notes_by_text(
+        q: str = Query(..., min_length=1, max_length=256),  # Поисковый запрос (поддерживает синтаксис websearch)
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        offset: int = Query(0, ge=0),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_principal)
+):
+    results = await fulltext_search_notes(db=db, user_id=current_user.id, q=q, limit=limit, offset=offset)
+    return adapter_response(NoteSearchResultListAdapter, results)
+
+
+# Сериализация строки экспорта в одну строку NDJSON
+def export_ndjson_line(row) -> bytes:
+    return orjson.dumps({
+        "id": row.id,
+        "title": row.title,
+        "content": row.content,
+        "tags": row.tags or [],
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+    }) + b"\n"
+
+
+EXPORT_CSV_COLUMNS = ["id", "title", "content", "tags", "created_at", "updated_at"]
+
+
+# Форматирование одной строки CSV
+def csv_line(values: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+# Сериализация строки экспорта в одну строку CSV
+def export_csv_line(row) -> str:
+    return csv_line([
+        row.id, row.title, row.content, ",".join(row.tags or []),
+        row.created_at.isoformat() if row.created_at else "",
+        row.updated_at.isoformat() if row.updated_at else "",
+    ])
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_notes(
+        format: Literal["ndjson", "csv"] = "ndjson",
+        current_user: Principal = Depends(get_current_principal)
+):
+    user_id = current_user.id
+
+    # Сессия открывается внутри генератора: зависимость get_db закрывается до отправки тела
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            if format == "csv":
+                yield csv_line(EXPORT_CSV_COLUMNS)
+            async for row in stream_notes_for_export(db, user_id):
+                yield export_ndjson_line(row) if format == "ndjson" else export_csv_line(row)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(generate(), media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename=notes.{format}",
+    })
+
+
+# Построчное чтение NDJSON из потока тела запроса без буферизации всего тела
+async def iter_ndjson_lines(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > IMPORT_MAX_LINE_BYTES:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail="Import line is too long")
+        for line in lines:
+            yield line
+    yield buffer
+
+
+@router.post("/import", status_code=status.HTTP_201_CREATED)
+async def import_notes(
+        request: Request,
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_principal)
+):
+    imported = 0
+    batch: list[NoteCreate] = []
+    line_number = 0
+
+    try:
+        async for line in iter_ndjson_lines(request):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                batch.append(NoteCreate.model_validate(orjson.loads(line)))
+            except (orjson.JSONDecodeError, ValidationError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f"Invalid note at line {line_number}")
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                imported += await import_notes_batch(db=db, notes_in=batch, user_id=current_user.id)
+                batch = []
+
+        imported += await import_notes_batch(db=db, notes_in=batch, user_id=current_user.id)
+        # Все порции фиксируются одной транзакцией: импорт либо проходит целиком, либо нет
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    return {"imported": imported}
+
+
+# Пакет операций create/update/delete в одной транзакции; результат каждой операции
+# (id и статус) возвращается в порядке запроса
+@router.post("/batch", response_model=NoteBatchResult, status_code=status.HTTP_200_OK)
+async def batch_notes(
+        batch: NoteBatchRequest,
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_principal)
+):
+    try:
+        results = await apply_note_batch(db=db, operations=batch.operations, user_id=current_user.id)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return adapter_response(NoteBatchResultAdapter, {"results": results})
+
+
+# Объявлен последним, чтобы не перехватывать /search, /fulltext и /export
+@router.get("/{note_id}", response_model=NoteInDB, status_code=status.HTTP_200_OK,
+            dependencies=[Depends(use_read_replica)])
+async def read_note(
+        note_id: int,
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_principal)
+):
+    note = await get_note(db=db, note_id=note_id, user_id=current_user.id)
+
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    return adapter_response(NoteAdapter, note)
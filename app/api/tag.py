@@ -0,0 +1,38 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import Principal, get_db, get_current_principal, use_read_replica
+from app.api.note import adapter_response, check_notes_etag
+from app.crud.note import get_user_tags
+from app.schemas.note import TagCount, TagCountListAdapter
+
+router = APIRouter(
+    prefix="/tags",
+    tags=["Теги"],
+)
+
+DEFAULT_TAGS_LIMIT = 10
+MAX_TAGS_LIMIT = 100
+
+
+# Теги текущего пользователя с числом заметок, самые используемые первыми.
+# Каталог меняется только вместе с заметками, поэтому ETag тот же, что у списков заметок.
+@router.get("/", response_model=List[TagCount], status_code=status.HTTP_200_OK,
+            dependencies=[Depends(use_read_replica)])
+async def read_tags(
+        prefix: Optional[str] = Query(None, max_length=64),  # Начало имени тега для автодополнения
+        limit: int = Query(DEFAULT_TAGS_LIMIT, ge=1, le=MAX_TAGS_LIMIT),
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_principal)
+):
+    etag, not_modified = await check_notes_etag(db, current_user.id, if_none_match)
+    if not_modified:
+        return not_modified
+
+    tags = await get_user_tags(db=db, user_id=current_user.id, limit=limit, prefix=prefix)
+    response = adapter_response(TagCountListAdapter, tags)
+    response.headers["ETag"] = etag
+    return response
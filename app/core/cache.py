@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable
+
+from app.core.config import settings
+
+
+class TTLCache:
+    """Ограниченный по размеру LRU-кэш с временем жизни записей.
+
+    Хранится в памяти процесса; при переполнении вытесняется запись,
+    к которой дольше всего не обращались. Ведет счетчики попаданий и промахов.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]  # Запись устарела
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    # Снимок значений записей (в том числе еще не удаленных устаревших) - для оценки размера кэша
+    def values(self) -> list:
+        with self._lock:
+            return [value for _, value in self._data.values()]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+# Кэш аутентифицированных пользователей: ключи ("telegram", telegram_id) и ("id", user_id)
+principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+
+# Проверенные токены доступа: sha256 токена -> утверждения токена, до истечения токена
+verified_token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE,
+                                ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+# Текущая версия токенов и активность пользователя: user_id -> TokenState
+token_state_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+
+
+# Сброс всех записей кэша, относящихся к пользователю
+def invalidate_principal(user):
+    if user.telegram_id is not None:
+        principal_cache.delete(("telegram", user.telegram_id))
+    principal_cache.delete(("id", user.id))
+    token_state_cache.delete(user.id)
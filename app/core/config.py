@@ -1,5 +1,6 @@
-from os import getenv
+from os import cpu_count, getenv
 from os.path import dirname, abspath, join
+from typing import Dict, List, Literal, Optional
 from pydantic import ConfigDict, model_validator
 from pydantic_settings import BaseSettings
 
@@ -23,17 +24,107 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     DATABASE_URL: str = ""
+    MIGRATIONS_DATABASE_URL: str = ""
     TG_API_TOKEN: str
     BACKEND_HOST: str
     BACKEND_PORT: int
     ENVIRONMENT: str
 
+    # Параметры HTTP-клиента бота для обращения к бэкенду
+    BACKEND_TIMEOUT: float = 10.0  # общий таймаут одного запроса, сек.
+    BACKEND_CONNECT_TIMEOUT: float = 3.0  # таймаут установки соединения, сек.
+    BACKEND_POOL_SIZE: int = 100  # максимум соединений в пуле keep-alive
+    BACKEND_KEEPALIVE_TIMEOUT: float = 30.0  # время жизни простаивающего соединения, сек.
+    BACKEND_MAX_CONCURRENCY: int = 50  # максимум одновременных запросов к бэкенду
+    BACKEND_RETRIES: int = 3  # число повторов для идемпотентных запросов
+    BACKEND_RETRY_BACKOFF: float = 0.2  # базовая задержка между повторами, сек.
+    BACKEND_ETAG_CACHE_SIZE: int = 10000  # сколько ответов с ETag хранить для условных GET
+    BACKEND_ETAG_CACHE_TTL: float = 3600.0  # время хранения такого ответа, сек.
+
+    # Транспорт бота к бэкенду: http - через API, direct - прямые вызовы app.crud в процессе бота
+    BOT_TRANSPORT: Literal["http", "direct"] = "http"
+
+    # Кэш заметок пользователей в боте: первые страницы /notes и поиска по тегам
+    BOT_NOTE_CACHE_SIZE: int = 1000  # максимум пользователей в кэше; 0 - кэш выключен
+    BOT_NOTE_CACHE_TTL: float = 60.0  # столько бот может не видеть изменений, сделанных не через него, сек.
+    BOT_NOTE_CACHE_SEARCHES: int = 20  # сколько поисков по тегам хранить на пользователя
+    BOT_NOTE_CACHE_LOG_INTERVAL: float = 300.0  # период записи статистики кэша в журнал, сек.
+
+    # Кэш аутентифицированных пользователей в get_current_user
+    PRINCIPAL_CACHE_SIZE: int = 10000  # максимум записей в кэше
+    PRINCIPAL_CACHE_TTL: float = 60.0  # время жизни записи, сек.; столько же другие воркеры видят отзыв токенов
+    TOKEN_CACHE_SIZE: int = 10000  # максимум проверенных токенов доступа в кэше (хранятся до истечения)
+
+    # Профиль движка БД (настраивается на один воркер gunicorn)
+    DB_ECHO: Optional[bool] = None  # логировать SQL; по умолчанию только при ENVIRONMENT=dev
+    DB_POOL_SIZE: int = 5  # постоянные соединения в пуле
+    DB_MAX_OVERFLOW: int = 10  # дополнительные соединения сверх DB_POOL_SIZE
+    DB_POOL_TIMEOUT: float = 30.0  # ожидание свободного соединения, сек.
+    DB_POOL_RECYCLE: int = 1800  # пересоздание соединений старше N сек.
+    DB_POOL_PRE_PING: bool = True  # проверка соединения перед выдачей из пула
+    DB_STATEMENT_CACHE_SIZE: int = 100  # кэш подготовленных выражений asyncpg на соединение
+    DB_PGBOUNCER: bool = False  # режим совместимости с PgBouncer (без подготовленных выражений)
+
+    # Реплики для чтения (полные URL SQLAlchemy); пусто - все запросы идут в основную БД
+    DB_REPLICA_URLS: List[str] = []
+    DB_REPLICA_STICKY_SECONDS: float = 5.0  # после записи чтения пользователя идут в основную БД столько сек.
+    DB_REPLICA_HEALTH_INTERVAL: float = 5.0  # период проверки доступности реплик, сек.
+    DB_REPLICA_HEALTH_TIMEOUT: float = 2.0  # таймаут одной проверки, сек.
+    DB_REPLICA_MAX_LAG: Optional[float] = 10.0  # отставание (PostgreSQL), при котором реплика исключается
+
+    # Хранилище состояний диалогов (FSM) бота
+    FSM_STORAGE: Literal["memory", "database"] = "memory"  # database - общее для всех экземпляров бота
+    FSM_STORAGE_URL: str = ""  # отдельная БД (например, sqlite+aiosqlite:///fsm.db); пустая - БД приложения
+    FSM_STATE_TTL: float = 86400.0  # время жизни брошенного диалога, сек.
+    FSM_CACHE_TTL: float = 1.0  # время жизни записи в кэше процесса, сек.
+    FSM_CACHE_SIZE: int = 10000  # максимум записей в кэше процесса
+    FSM_FLUSH_INTERVAL: float = 0.05  # период пакетной записи изменений в БД, сек.
+    FSM_CLEANUP_INTERVAL: float = 600.0  # период удаления просроченных диалогов, сек.
+
+    # Режим получения обновлений ботом
+    BOT_MODE: Literal["polling", "webhook"] = "polling"
+    WEBHOOK_URL: str = ""  # публичный адрес бота; пустой - вебхук в Telegram не регистрируется
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_SECRET: str = ""  # секрет из заголовка X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_WORKERS: int = 8  # число воркеров, обрабатывающих очередь обновлений
+    WEBHOOK_QUEUE_SIZE: int = 1000  # максимум принятых, но не обработанных обновлений
+
+    # Хеширование паролей
+    PASSWORD_SCHEMES: List[str] = ["bcrypt"]  # первая схема - для новых хешей, остальные переводятся на нее при входе
+    PASSWORD_ROUNDS: Optional[int] = None  # стоимость (rounds) основной схемы; None - значение passlib по умолчанию
+    PASSWORD_HASH_WORKERS: Optional[int] = None  # потоки хеширования; по умолчанию половина ядер; 0 - в цикле событий
+    PASSWORD_HASH_QUEUE_SIZE: int = 64  # максимум ожидающих операций, сверх него - 503
+
+    # Журналирование
+    LOG_LEVEL: str = "INFO"  # уровень корневого логгера
+    LOG_LEVELS: Dict[str, str] = {}  # уровни отдельных логгеров, например {"aiogram": "WARNING"}
+    LOG_FORMAT: Literal["json", "text"] = "json"
+    LOG_SAMPLING: Dict[str, float] = {}  # доля сохраняемых записей ниже WARNING, например {"app.access": 0.1}
+    LOG_QUEUE_SIZE: int = 10000  # записи сверх очереди отбрасываются, а не блокируют обработку
+    LOG_ACCESS: bool = True  # строка журнала app.access на каждый HTTP-запрос
+
+    # Метрики и диагностика
+    METRICS_ENABLED: bool = True  # эндпоинт /metrics в формате Prometheus
+    SLOW_REQUEST_THRESHOLD_MS: Optional[float] = None  # журналировать SQL запросов дольше порога; None - выключено
+
+    # Токен для служебных эндпоинтов (/internal/...); пустой - эндпоинты отключены
+    INTERNAL_API_TOKEN: str = ""
+
 
     @model_validator(mode="after")
     def get_database_url(self):
         self.DATABASE_URL = (f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}"
-            f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?async_fallback=True"
+            f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         )
+        # Alembic работает с синхронным движком, поэтому для миграций нужен async_fallback
+        self.MIGRATIONS_DATABASE_URL = f"{self.DATABASE_URL}?async_fallback=True"
+        if self.DB_ECHO is None:
+            self.DB_ECHO = self.ENVIRONMENT == "dev"
+        if self.PASSWORD_HASH_WORKERS is None:
+            # Вторая половина ядер остается циклу событий и остальным воркерам
+            self.PASSWORD_HASH_WORKERS = max(1, (cpu_count() or 2) // 2)
         return self
 
     model_config = ConfigDict(env_file=ENV_FILE)
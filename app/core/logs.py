@@ -0,0 +1,193 @@
+# app/core/logs.py
+"""Структурированное журналирование API и бота без блокировки цикла событий.
+
+Обработчики логгеров только кладут запись в очередь (QueueHandler); форматирование
+и запись в поток вывода выполняет фоновый поток QueueListener. Перед постановкой в
+очередь к записи добавляется идентификатор корреляции текущего запроса или
+обновления Telegram, отбрасываются записи по правилам выборки (LOG_SAMPLING), а
+учетные данные в сообщении и полях маскируются.
+"""
+import atexit
+import logging
+import queue
+import random
+import re
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import orjson
+
+from app.core.config import settings
+
+# Идентификатор корреляции: id HTTP-запроса в API, id обновления в боте
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+
+REDACTED = "[REDACTED]"
+
+# Что маскируется в тексте сообщений
+REDACT_PATTERNS = (
+    # JWT: три части base64url, первая начинается с {"
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+"), REDACTED),
+    # Схема авторизации и токен после нее
+    (re.compile(r"(?i)\b(bearer|basic)\s+[\w\-.~+/=]+"), rf"\1 {REDACTED}"),
+    # Токен Telegram-бота, в том числе в URL Bot API
+    (re.compile(r"\d{6,}:[\w-]{30,}"), REDACTED),
+    # Пары вида password=..., "access_token": "..."
+    (re.compile(r"""(?i)(["']?(?:password|passwd|secret|access_token|token|authorization|cookie)["']?"""
+                r"""\s*[:=]\s*)("[^"]*"|'[^']*'|[^\s,;}]+)"""), rf"\1{REDACTED}"),
+)
+
+# Поля записи (из extra=...), значения которых не выводятся никогда
+SENSITIVE_FIELDS = frozenset({"password", "hashed_password", "token", "access_token",
+                              "authorization", "cookie", "secret"})
+
+# Стандартные атрибуты LogRecord; все остальное - поля, переданные через extra
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in REDACT_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+# Поля extra записи с маскированием чувствительных значений
+def record_fields(record: logging.LogRecord) -> dict:
+    fields = {}
+    for key, value in vars(record).items():
+        if key in RESERVED_ATTRS or key.startswith("_"):
+            continue
+        if key.lower() in SENSITIVE_FIELDS:
+            value = REDACTED
+        elif isinstance(value, str):
+            value = redact(value)
+        fields[key] = value
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON."""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "service": self.service,
+            "message": record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_text:
+            entry["exception"] = redact(record.exc_text)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """Читаемый формат для локальной разработки; поля extra выводятся как key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+class ContextFilter(logging.Filter):
+    """Выборка и обогащение записи в потоке, вызвавшем логгер (до постановки в очередь).
+
+    rates - доля сохраняемых записей ниже WARNING по префиксу имени логгера
+    (самый длинный подходящий префикс); предупреждения и ошибки сохраняются всегда.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def sample_rate(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.rates:
+            rate = self.sample_rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        if getattr(record, "correlation_id", None) is None:
+            record.correlation_id = correlation_id.get()
+        return True
+
+
+class RedactingQueueHandler(QueueHandler):
+    """QueueHandler, который подставляет аргументы и маскирует сообщение до постановки
+    в очередь (аргументы могут измениться позже), а форматирование оставляет слушателю.
+    При переполнении очереди запись отбрасывается и учитывается в dropped."""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            # Трассировку фиксируем сейчас: объекты кадров не должны уходить в другой поток
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+# Настройка журналирования процесса; service - имя сервиса в записях (api, bot)
+def setup_logging(service: str):
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter(service) if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    handler = RedactingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter(settings.LOG_SAMPLING))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(settings.LOG_LEVEL)
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+    # Журналы uvicorn направляем в общую очередь вместо их собственных обработчиков
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers[:] = []
+        logging.getLogger(name).propagate = True
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+# Остановка фонового потока с дозаписью накопленных записей
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
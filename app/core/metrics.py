@@ -0,0 +1,174 @@
+# app/core/metrics.py
+"""Метрики приложения в текстовом формате Prometheus.
+
+Метрики хранятся в памяти процесса: при запуске нескольких воркеров gunicorn
+каждый воркер отдает свои значения (Prometheus собирает их как отдельные
+экземпляры или суммирует по label instance). Обновляются только из потока
+цикла событий, поэтому блокировки не нужны.
+"""
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Стандартные границы корзин Prometheus для длительностей, сек.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels):
+        counts, total = self.values.setdefault(labels, ([0] * len(self.buckets), [0.0]))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        total[0] += value
+
+    def samples(self) -> Iterable[str]:
+        bucket_names = self.labelnames + ("le",)
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield (f"{self.name}_bucket{format_labels(bucket_names, labels + (format_value(bound),))} "
+                       f"{cumulative}")
+            yield f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total[0])}"
+            yield f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+        # Функции, вызываемые при выдаче метрик: снимают значения с других подсистем (пул БД и т.п.)
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route")))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "HTTP requests being processed.", ("method",)))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements issued per HTTP request.", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS))
+db_time_per_request_seconds = registry.register(Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per HTTP request.", ("method", "route")))
+db_query_duration_seconds = registry.register(Histogram(
+    "db_query_duration_seconds", "Duration of a single SQL statement."))
+slow_requests_total = registry.register(Counter(
+    "http_slow_requests_total", "Requests slower than SLOW_REQUEST_THRESHOLD_MS.", ("method", "route")))
+
+
+class RequestStats:
+    """SQL-статистика одного HTTP-запроса."""
+
+    def __init__(self, capture_statements: bool = False):
+        self.queries = 0
+        self.db_time = 0.0
+        # (SQL, длительность) - собираются только для журнала медленных запросов
+        self.statements: Optional[list[tuple[str, float]]] = [] if capture_statements else None
+
+
+# Статистика текущего запроса; SQLAlchemy передает контекст в свои greenlet, поэтому
+# обработчики событий движка видят значение, установленное в middleware
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    db_query_duration_seconds.observe(duration)
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += duration
+        if stats.statements is not None:
+            stats.statements.append((statement, duration))
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+# Подключение подсчета запросов и времени БД к движку
+def instrument_engine(engine: AsyncEngine):
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
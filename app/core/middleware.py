@@ -0,0 +1,182 @@
+# app/core/middleware.py
+import logging
+import math
+import re
+import time
+from http.cookies import SimpleCookie
+from typing import Optional
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.logs import correlation_id
+from app.core.metrics import (RequestStats, current_request_stats, db_queries_per_request,
+                              db_time_per_request_seconds, http_request_duration_seconds,
+                              http_requests_in_progress, http_requests_total, slow_requests_total)
+from app.db.routing import WriteMarker, current_write_marker
+
+slow_request_logger = logging.getLogger("app.slow_requests")
+access_logger = logging.getLogger("app.access")
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Принимаем id запроса от клиента (например, от бота) только разумного вида
+REQUEST_ID_PATTERN = re.compile(r"[\w.:-]{1,64}")
+
+# Метка для запросов, не попавших ни в один маршрут (404): без нее сырые пути
+# раздули бы число временных рядов
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: задержка, статус и SQL-статистика каждого HTTP-запроса.
+
+    Метка route - шаблон пути маршрута ("/notes/{note_id}"), а не сам путь.
+    Если задан SLOW_REQUEST_THRESHOLD_MS, для запросов дольше порога в журнал
+    app.slow_requests пишутся все выполненные ими SQL-выражения с длительностями.
+    """
+
+    def __init__(self, app, slow_threshold_ms: float = settings.SLOW_REQUEST_THRESHOLD_MS):
+        self.app = app
+        self.slow_threshold = slow_threshold_ms / 1000 if slow_threshold_ms else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = RequestStats(capture_statements=self.slow_threshold is not None)
+        token = current_request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            current_request_stats.reset(token)
+            http_requests_in_progress.dec(method)
+
+            route = scope.get("route")
+            route_path = getattr(route, "path", UNMATCHED_ROUTE)
+            http_requests_total.inc(method, route_path, status_code)
+            http_request_duration_seconds.observe(duration, method, route_path)
+            db_queries_per_request.observe(stats.queries, method, route_path)
+            db_time_per_request_seconds.observe(stats.db_time, method, route_path)
+
+            if self.slow_threshold is not None and duration >= self.slow_threshold:
+                slow_requests_total.inc(method, route_path)
+                self.log_slow_request(scope, status_code, duration, stats)
+
+    @staticmethod
+    def log_slow_request(scope, status_code: int, duration: float, stats: RequestStats):
+        lines = [f"  {sql_duration * 1000:.1f} ms: {' '.join(statement.split())}"
+                 for statement, sql_duration in stats.statements]
+        slow_request_logger.warning(
+            "Slow request %s %s -> %s in %.1f ms, %d queries, %.1f ms in DB\n%s",
+            scope["method"], scope["path"], status_code, duration * 1000,
+            stats.queries, stats.db_time * 1000, "\n".join(lines),
+        )
+
+
+class RequestContextMiddleware:
+    """ASGI-middleware: идентификатор корреляции и строка журнала доступа.
+
+    Id берется из заголовка X-Request-ID (его передает клиент бота) или
+    генерируется, доступен всем логгерам через app.core.logs.correlation_id
+    и возвращается клиенту в том же заголовке.
+    """
+
+    def __init__(self, app, access_log: bool = settings.LOG_ACCESS):
+        self.app = app
+        self.access_log = access_log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = dict(scope["headers"]).get(REQUEST_ID_HEADER, b"").decode("latin-1")
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid4().hex
+        token = correlation_id.set(request_id)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []),
+                                      (REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if self.access_log:
+                access_logger.info(
+                    "%s %s %s", scope["method"], scope["path"], status_code,
+                    extra={"status": status_code, "duration_ms": round((time.perf_counter() - started) * 1000, 2)},
+                )
+            correlation_id.reset(token)
+
+
+LAST_WRITE_HEADER = b"x-db-last-write"
+LAST_WRITE_COOKIE = "db_last_write"
+
+
+class ReadYourWritesMiddleware:
+    """ASGI-middleware: время последней записи клиента между запросами.
+
+    Если запрос что-то записал в основную БД, ответ получает заголовок
+    X-DB-Last-Write и куку db_last_write с временем записи (кука живет
+    sticky_seconds). Клиент, вернувший это время в заголовке или куке, в
+    течение sticky_seconds читает из основной БД в любом воркере и экземпляре
+    API (см. app.db.routing): реплика могла еще не получить его запись.
+    """
+
+    def __init__(self, app, sticky_seconds: float = settings.DB_REPLICA_STICKY_SECONDS):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    @staticmethod
+    def client_last_write(headers: dict) -> Optional[float]:
+        value = headers.get(LAST_WRITE_HEADER)
+        if value is None and b"cookie" in headers:
+            morsel = SimpleCookie(headers[b"cookie"].decode("latin-1")).get(LAST_WRITE_COOKIE)
+            value = morsel.value if morsel else None
+        try:
+            last_write = float(value) if value is not None else None
+        except ValueError:
+            return None
+        return last_write if last_write is not None and math.isfinite(last_write) else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        marker = WriteMarker(self.client_last_write(dict(scope["headers"])))
+        token = current_write_marker.set(marker)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and marker.wrote_at is not None:
+                value = f"{marker.wrote_at:.3f}"
+                cookie = (f"{LAST_WRITE_COOKIE}={value}; Max-Age={math.ceil(self.sticky_seconds)}; "
+                          f"Path=/; HttpOnly; SameSite=Lax")
+                message["headers"] = [*message.get("headers", []),
+                                      (LAST_WRITE_HEADER, value.encode("latin-1")),
+                                      (b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_write_marker.reset(token)
@@ -1,18 +1,127 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import HTTPException
 from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
 from jose import jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Контекст хеширования из настроек. Границы min/max_rounds совпадают с рабочей
+# стоимостью, поэтому хеш с любой другой стоимостью (как и хеш устаревшей схемы)
+# считается требующим обновления и пересчитывается при следующем входе.
+def create_pwd_context() -> CryptContext:
+    scheme = settings.PASSWORD_SCHEMES[0]
+    options = {}
+    if settings.PASSWORD_ROUNDS is not None:
+        for option in ("rounds", "min_rounds", "max_rounds"):
+            options[f"{scheme}__{option}"] = settings.PASSWORD_ROUNDS
+    return CryptContext(schemes=settings.PASSWORD_SCHEMES, deprecated="auto", **options)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
 
+pwd_context = create_pwd_context()
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+
+HASH_THREAD_NICENESS = 10  # Приоритет (nice) потоков хеширования относительно процесса
+
+
+class PasswordHasher:
+    """Выполнение хеширования паролей в отдельном ограниченном пуле потоков.
+
+    bcrypt занимает процессор на сотни миллисекунд и отпускает GIL, поэтому в
+    потоках он не блокирует цикл событий воркера. Одновременно выполняется не
+    больше workers операций; если ожидающих больше queue_size, новая операция
+    сразу отклоняется с 503, а не копит задержку. Время ожидания в очереди
+    собирается в статистику (см. /internal/password-hasher).
+    """
+
+    def __init__(self, workers: int = settings.PASSWORD_HASH_WORKERS,
+                 queue_size: int = settings.PASSWORD_HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = (ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash",
+                                             initializer=self._lower_thread_priority)
+                          if workers > 0 else None)
+        self._lock = threading.Lock()
+        self.pending = 0  # Операции в очереди и в работе
+        self.completed = 0
+        self.rejected = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_run_time = 0.0
+
+    # На Linux приоритет задается отдельно для каждого потока: понижаем его потокам
+    # хеширования, чтобы при нехватке ядер процессор доставался циклу событий
+    @staticmethod
+    def _lower_thread_priority():
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), HASH_THREAD_NICENESS)
+        except (AttributeError, OSError):
+            pass
+
+    def _record(self, queue_wait: float, run_time: float):
+        with self._lock:
+            self.completed += 1
+            self.total_queue_wait += queue_wait
+            self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+            self.total_run_time += run_time
+
+    def _timed(self, func: Callable, submitted: float, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._record(started - submitted, time.perf_counter() - started)
+
+    async def run(self, func: Callable, *args):
+        if self.pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many concurrent password operations",
+                                headers={"Retry-After": "1"})
+
+        self.pending += 1
+        try:
+            submitted = time.perf_counter()
+            if self._executor is None:
+                return self._timed(func, submitted, *args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, func, submitted, *args)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        completed = self.completed
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self.pending,
+            "completed": completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": self.total_queue_wait / completed * 1000 if completed else 0.0,
+            "queue_wait_max_ms": self.max_queue_wait * 1000,
+            "run_time_avg_ms": self.total_run_time / completed * 1000 if completed else 0.0,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
+
+
+# Проверка пароля. Второй элемент результата - новый хеш, если сохраненный
+# сделан устаревшей схемой или с другой стоимостью (его нужно записать в БД)
+async def verify_and_update_password(plain_password, hashed_password) -> tuple[bool, Optional[str]]:
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash(password):
+    return await password_hasher.run(pwd_context.hash, password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -24,3 +133,12 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, key=settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
+
+
+# Токен доступа пользователя: sub - числовой id (строкой, как требует JWT),
+# ver - версия токенов на момент выдачи, active - активен ли пользователь
+def create_user_access_token(user, expires_delta: timedelta = None):
+    return create_access_token(
+        data={"sub": str(user.id), "ver": user.token_version, "active": bool(user.is_active)},
+        expires_delta=expires_delta,
+    )
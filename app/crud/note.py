@@ -1,121 +1,624 @@
-from typing import List
+import base64
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional
 
-from sqlalchemy import delete, func
+from sqlalchemy import (delete, func, insert, update, tuple_, any_, bindparam, column, values, Integer, String,
+                        literal_column)
+from sqlalchemy.dialects.postgresql import ARRAY, array_agg, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlalchemy import select
 
-from app.models.note import Note, Tag
-from app.schemas.note import NoteCreate
+from app.models.note import Note, Tag, UserTagCount
+from app.models.user import User
+from app.schemas.note import NoteCreate, NoteBatchOperation
 from app.models.note import note_tags  # Импорт ассоциационной таблицы
 
 
-# Вспомогательная асинхронная функция для получения или создания тегов
+# Точка отсчета для кодирования времени в курсоре пагинации
+CURSOR_EPOCH = datetime(1970, 1, 1)
+
+
+# Кодирование позиции (updated_at, id) последней заметки страницы в непрозрачный курсор
+def encode_cursor(updated_at: datetime, note_id: int) -> str:
+    micros = (updated_at - CURSOR_EPOCH) // timedelta(microseconds=1)
+    raw = f"{micros}:{note_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# Декодирование курсора; при некорректном значении выбрасывается ValueError
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        micros, note_id = raw.split(":")
+        return CURSOR_EPOCH + timedelta(microseconds=int(micros)), int(note_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+# Применение keyset-пагинации к запросу: новые заметки первыми, без OFFSET
+def paginate(query, limit: int, cursor: Optional[str] = None):
+    if cursor:
+        updated_at, note_id = decode_cursor(cursor)
+        query = query.where(tuple_(Note.updated_at, Note.id) < tuple_(updated_at, note_id))
+    # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+    return query.order_by(Note.updated_at.desc(), Note.id.desc()).limit(limit + 1)
+
+
+# Формирование страницы результатов и курсора на следующую страницу
+def make_page(notes: list, limit: int) -> dict:
+    next_cursor = None
+    if len(notes) > limit:
+        notes = notes[:limit]
+        last = notes[-1]
+        next_cursor = encode_cursor(last.updated_at, last.id)
+    return {"items": notes, "next_cursor": next_cursor}
+
+
+# Колонки заметки, которые отдает API; выбираются без создания ORM-объектов
+NOTE_COLUMNS = (Note.id, Note.title, Note.content, Note.created_at, Note.updated_at)
+
+
+# Колонки сокращенной заметки для списков. Содержание целиком не выбирается:
+# превью считает сама БД через left(content, n), а для длинного содержания,
+# хранящегося в TOAST, PostgreSQL читает и распаковывает только его начало.
+# truncated - длиннее ли содержание превью (проверяется по n + 1 первым символам).
+def note_summary_columns(preview_length: int):
+    return (
+        Note.id,
+        Note.title,
+        func.left(Note.content, preview_length).label("preview"),
+        (func.char_length(func.left(Note.content, preview_length + 1)) > preview_length).label("truncated"),
+        Note.created_at,
+        Note.updated_at,
+    )
+
+
+# Колонки страницы заметок: полные или сокращенные (если задана длина превью)
+def note_list_columns(preview_length: Optional[int] = None):
+    return note_summary_columns(preview_length) if preview_length else NOTE_COLUMNS
+
+
+# Теги заметок одним запросом: {note_id: [{"id": ..., "name": ...}, ...]}
+async def load_note_tags(db: AsyncSession, note_ids: list[int]) -> dict[int, list[dict]]:
+    tags_by_note: dict[int, list[dict]] = {note_id: [] for note_id in note_ids}
+    if not note_ids:
+        return tags_by_note
+
+    result = await db.execute(
+        select(note_tags.c.note_id, Tag.id, Tag.name)
+        .join(Tag, Tag.id == note_tags.c.tag_id)
+        .where(note_tags.c.note_id == any_(bindparam("note_ids", note_ids, type_=ARRAY(Integer))))
+        .order_by(note_tags.c.note_id, Tag.name)
+    )
+    for note_id, tag_id, tag_name in result.all():
+        tags_by_note[note_id].append({"id": tag_id, "name": tag_name})
+    return tags_by_note
+
+
+# Страница заметок в виде словарей той же формы, что NoteInDB (или NoteSummary).
+# Запрос должен выбирать note_list_columns(); теги догружаются вторым запросом для всей страницы.
+async def fetch_note_page(db: AsyncSession, query, limit: int, cursor: Optional[str] = None) -> dict:
+    result = await db.execute(paginate(query, limit, cursor))
+    page = make_page(result.all(), limit)
+    tags_by_note = await load_note_tags(db, [row.id for row in page["items"]])
+    page["items"] = [{**row._asdict(), "tags": tags_by_note[row.id]} for row in page["items"]]
+    return page
+
+
+# Текущая версия заметок пользователя (один запрос по первичному ключу)
+async def get_notes_version(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(select(User.notes_version).where(User.id == user_id))
+    return result.scalar_one_or_none() or 0
+
+
+# Увеличение версии заметок пользователя. Вызывается в той же транзакции, что и
+# изменение заметок: блокировка строки пользователя до коммита упорядочивает
+# параллельные изменения, и версия только растет.
+async def bump_notes_version(db: AsyncSession, user_id: int):
+    await db.execute(
+        update(User).where(User.id == user_id).values(notes_version=User.notes_version + 1)
+    )
+
+
+# Нормализация имен тегов: обрезка пробелов, приведение регистра, удаление пустых и дублей
+def normalize_tag_names(tag_names: list[str]) -> list[str]:
+    names = (name.strip().casefold() for name in tag_names)
+    return list(dict.fromkeys(name for name in names if name))
+
+
+# Выборка тегов по списку имен одним запросом (name = ANY(:names))
+async def select_tags_by_names(db: AsyncSession, names: list[str]) -> list[Tag]:
+    names_param = bindparam("tag_names", names, type_=ARRAY(String))
+    result = await db.execute(select(Tag).where(Tag.name == any_(names_param)))
+    return list(result.scalars().all())
+
+
+# Вспомогательная асинхронная функция для получения или создания тегов.
+# Существующие теги выбираются одним SELECT, недостающие создаются одним
+# INSERT ... ON CONFLICT DO NOTHING RETURNING, поэтому число запросов не зависит
+# от количества тегов, а параллельное создание одного и того же тега не падает
+# на уникальном индексе tags.name. Возвращает теги в порядке tag_names.
 async def get_or_create_tags(db: AsyncSession, tag_names: list[str]):
-    tags = []
-    for tag_name in tag_names:
-        result = await db.execute(select(Tag).where(Tag.name == tag_name))
-        tag = result.scalars().first()
-        if not tag:
-            tag = Tag(name=tag_name)
-            db.add(tag)
-        tags.append(tag)
-    return tags
-
-
-# Асинхронная функция для получения заметок пользователя
-async def get_notes(db: AsyncSession, user_id: int):
-    query = select(Note).where(Note.user_id == user_id).options(selectinload(Note.tags))
-    result = await db.execute(query)
-    return result.scalars().all()  # Возвращаем все найденные заметки
-
-
-# Асинхронная функция для поиска заметок по тегам
-async def search_notes(db: AsyncSession, user_id: int, tags: List[str]):
-    # Количество тегов для фильтрации
-    tags_count = len(tags)
-
-    # Запрос для поиска заметок, которые содержат все переданные теги
+    names = normalize_tag_names(tag_names)
+    if not names:
+        return []
+
+    tags_by_name = {tag.name: tag for tag in await select_tags_by_names(db, names)}
+
+    # Имена сортируются: параллельные транзакции с тегами "x, y" и "y, x" берут
+    # блокировки уникального индекса в одном порядке и не попадают во взаимоблокировку
+    missing = sorted(name for name in names if name not in tags_by_name)
+    if missing:
+        insert_stmt = (
+            pg_insert(Tag)
+            .values([{"name": name} for name in missing])
+            .on_conflict_do_nothing(index_elements=[Tag.name])
+            .returning(Tag)
+        )
+        result = await db.execute(insert_stmt)
+        tags_by_name.update((tag.name, tag) for tag in result.scalars().all())
+
+        # Теги, которые успела создать параллельная транзакция, дочитываем отдельно
+        raced = [name for name in missing if name not in tags_by_name]
+        if raced:
+            tags_by_name.update((tag.name, tag) for tag in await select_tags_by_names(db, raced))
+
+    return [tags_by_name[name] for name in names]
+
+
+# Изменение каталога тегов пользователя (user_tag_counts) в транзакции записи заметок.
+# added - (tag_id, name) каждой добавленной связи note_tags, removed - tag_id каждой
+# удаленной. Прибавление - один INSERT ... ON CONFLICT DO UPDATE, вычитание - один
+# UPDATE ... FROM (VALUES ...); строки сортируются по tag_id, чтобы параллельные
+# транзакции блокировали их в одном порядке.
+async def adjust_tag_counts(db: AsyncSession, user_id: int, added: list[tuple[int, str]] = (),
+                            removed: list[int] = ()):
+    increments = sorted(Counter(added).items())
+    if increments:
+        upsert = pg_insert(UserTagCount).values([
+            {"user_id": user_id, "tag_id": tag_id, "name": name, "count": count}
+            for (tag_id, name), count in increments
+        ])
+        await db.execute(upsert.on_conflict_do_update(
+            index_elements=[UserTagCount.user_id, UserTagCount.tag_id],
+            set_={"count": UserTagCount.count + upsert.excluded.count},
+        ))
+
+    decrements = sorted(Counter(removed).items())
+    if decrements:
+        changes = values(column("tag_id", Integer), column("count", Integer), name="changes").data(decrements)
+        await db.execute(
+            update(UserTagCount)
+            .where(UserTagCount.user_id == user_id, UserTagCount.tag_id == changes.c.tag_id)
+            .values(count=UserTagCount.count - changes.c.count)
+            .execution_options(synchronize_session=False)
+        )
+
+
+# Вычитание из каталога тегов удаляемых заметок пользователя. Выполняется до DELETE,
+# пока связи note_tags на месте (потом они удаляются каскадно); чужие и
+# несуществующие заметки в подзапрос не попадают.
+async def release_note_tag_counts(db: AsyncSession, user_id: int, note_ids: list[int]):
+    per_tag = (
+        select(note_tags.c.tag_id, func.count().label("count"))
+        .join(Note, Note.id == note_tags.c.note_id)
+        .where(Note.user_id == user_id,
+               Note.id == any_(bindparam("released_note_ids", note_ids, type_=ARRAY(Integer))))
+        .group_by(note_tags.c.tag_id)
+        .subquery()
+    )
+    await db.execute(
+        update(UserTagCount)
+        .where(UserTagCount.user_id == user_id, UserTagCount.tag_id == per_tag.c.tag_id)
+        .values(count=UserTagCount.count - per_tag.c.count)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Условие "строка начинается с prefix" в виде диапазона побайтного сравнения
+# (операторы varchar_pattern_ops). В отличие от LIKE с параметром, диапазон
+# использует индекс и в общем плане подготовленного выражения.
+def prefix_range(column_, prefix: str):
+    conditions = [column_.op("~>=~")(prefix)]
+    if ord(prefix[-1]) < 0x10FFFF:
+        conditions.append(column_.op("~<~")(prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+    return conditions
+
+
+# Теги пользователя с числом заметок, самые используемые первыми;
+# prefix - начало имени тега (для автодополнения)
+async def get_user_tags(db: AsyncSession, user_id: int, limit: int, prefix: Optional[str] = None) -> list[dict]:
+    query = (
+        select(UserTagCount.tag_id.label("id"), UserTagCount.name, UserTagCount.count)
+        .where(UserTagCount.user_id == user_id, UserTagCount.count > 0)
+    )
+    prefix = (prefix or "").strip().casefold()  # Имена тегов хранятся в этом виде
+    if prefix:
+        query = query.where(*prefix_range(UserTagCount.name, prefix))
+    query = query.order_by(UserTagCount.count.desc(), UserTagCount.name).limit(limit)
+    return [row._asdict() for row in (await db.execute(query)).all()]
+
+
+# Асинхронная функция для получения одной заметки пользователя
+async def get_note(db: AsyncSession, note_id: int, user_id: int):
+    result = await db.execute(
+        select(Note).where(Note.id == note_id, Note.user_id == user_id).options(selectinload(Note.tags))
+    )
+    return result.scalars().first()
+
+
+# Асинхронная функция для получения страницы заметок пользователя;
+# с preview_length вместо содержания возвращается превью такой длины
+async def get_notes(db: AsyncSession, user_id: int, limit: int, cursor: Optional[str] = None,
+                    preview_length: Optional[int] = None):
+    query = select(*note_list_columns(preview_length)).where(Note.user_id == user_id)
+    return await fetch_note_page(db, query, limit, cursor)
+
+
+# Условие "у заметки есть хотя бы один из тегов" в виде EXISTS по note_tags
+def has_any_tag(tag_ids: list[int]):
+    if len(tag_ids) == 1:
+        # Для одного тега - простое равенство, чтобы планировщик учел его частоту
+        tag_condition = note_tags.c.tag_id == tag_ids[0]
+    else:
+        tag_condition = note_tags.c.tag_id == any_(bindparam(None, tag_ids, type_=ARRAY(Integer)))
+    return (
+        select(note_tags.c.note_id)
+        .where(note_tags.c.note_id == Note.id)
+        .where(tag_condition)
+        .exists()
+    )
+
+
+# Асинхронная функция для поиска заметок по тегам.
+# match="all" - заметка содержит все теги (AND), match="any" - хотя бы один (OR),
+# exclude - теги, которых у заметки быть не должно (NOT), preview_length - как в get_notes.
+async def search_notes(db: AsyncSession, user_id: int, tags: List[str],
+                       limit: int, cursor: Optional[str] = None,
+                       match: str = "all", exclude: Optional[List[str]] = None,
+                       preview_length: Optional[int] = None):
+    # Теги приводятся к тому же виду, в котором они сохраняются
+    tags = normalize_tag_names(tags)
+    exclude = normalize_tag_names(exclude or [])
+
+    # Сначала одним запросом переводим имена тегов в идентификаторы
+    tag_ids = {tag.name: tag.id for tag in await select_tags_by_names(db, tags + exclude)}
+    required_ids = [tag_ids[name] for name in tags if name in tag_ids]
+    excluded_ids = [tag_ids[name] for name in exclude if name in tag_ids]
+
+    # Если нужного тега нет вовсе, подходящих заметок быть не может - в заметки не идем
+    if not required_ids or (match == "all" and len(required_ids) < len(tags)):
+        return make_page([], limit)
+
+    # Фильтруем заметки по ID пользователя
+    query = select(*note_list_columns(preview_length)).where(Note.user_id == user_id)
+    if match == "all":
+        # Отдельный EXISTS на каждый тег: планировщик сам выбирает порядок проверки
+        # (от самого редкого тега по индексу note_tags(tag_id, note_id) или по PK
+        # (note_id, tag_id) для заметок пользователя) без GROUP BY по всем совпадениям
+        for tag_id in required_ids:
+            query = query.where(has_any_tag([tag_id]))
+    else:
+        query = query.where(has_any_tag(required_ids))
+    if excluded_ids:
+        query = query.where(~has_any_tag(excluded_ids))
+
+    return await fetch_note_page(db, query, limit, cursor)
+
+
+# Конфигурации полнотекстового поиска, которыми построен Note.search_vector
+FULLTEXT_CONFIGS = ("russian", "english")
+
+# Параметры фрагментов с подсветкой найденных слов
+HEADLINE_OPTIONS = "StartSel=<b>, StopSel=</b>, MaxWords=25, MinWords=8, MaxFragments=2"
+
+
+# Построение tsquery по пользовательскому запросу сразу для всех конфигураций
+def build_fulltext_query(q: str):
+    queries = [func.websearch_to_tsquery(literal_column(f"'{config}'::regconfig"), q)
+               for config in FULLTEXT_CONFIGS]
+    tsquery = queries[0]
+    for query in queries[1:]:
+        tsquery = tsquery.op("||")(query)
+    return tsquery
+
+
+# HTML-экранирование текста на стороне БД, чтобы в фрагменте безопасными были только теги подсветки
+def html_escaped(column):
+    return func.replace(func.replace(func.replace(
+        func.coalesce(column, ""), "&", "&amp;"), "<", "&lt;"), ">", "&gt;")
+
+
+# Асинхронная функция для полнотекстового поиска по заголовку и содержанию заметок
+async def fulltext_search_notes(db: AsyncSession, user_id: int, q: str, limit: int, offset: int = 0):
+    tsquery = build_fulltext_query(q)
+    rank = func.ts_rank_cd(Note.search_vector, tsquery)
+
+    # Сначала по индексу (user_id, search_vector) отбираем и ранжируем нужную страницу...
+    ranked = (
+        select(Note.id, rank.label("rank"))
+        .where(Note.user_id == user_id)
+        .where(Note.search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), Note.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+
+    # ...и только для нее строим фрагменты с подсветкой: ts_headline заметно дороже поиска
+    snippet = func.ts_headline(literal_column(f"'{FULLTEXT_CONFIGS[0]}'::regconfig"),
+                               html_escaped(Note.content), tsquery, HEADLINE_OPTIONS)
     query = (
-        select(Note)
-        .join(Note.tags)  # Присоединяем таблицу тегов
-        .where(Note.user_id == user_id)  # Фильтруем заметки по ID пользователя
-        .where(Tag.name.in_(tags))  # Ищем заметки с хотя бы одним из тегов
-        .group_by(Note.id)  # Группируем по заметке
-        .having(func.count(Tag.id) == tags_count)  # Убедимся, что все теги присутствуют
-        .options(selectinload(Note.tags))  # Загружаем теги вместе с заметками
-    )
-
-    # # Запрос для поиска заметок, которые содержат хотя бы один из переданных тегов
-    # query = (
-    #     select(Note)
-    #     .join(Note.tags)  # Присоединяем таблицу тегов
-    #     .where(Note.user_id == user_id)  # Фильтруем заметки по ID пользователя
-    #     .where(Tag.name.in_(tags))  # Ищем заметки, где хотя бы один тег совпадает
-    #     .group_by(Note.id)  # Группируем по заметке
-    #     .options(selectinload(Note.tags))  # Загружаем теги вместе с заметками
-    # )
-    #
-
-    result = await db.execute(query)
-    return result.scalars().all()  # Возвращаем все найденные заметки
-
-
-# Асинхронная функция для создания новой заметки
-async def create_note(db: AsyncSession, note_in: NoteCreate, user_id: int):
+        select(*NOTE_COLUMNS, ranked.c.rank, snippet.label("snippet"))
+        .join(ranked, Note.id == ranked.c.id)
+        .order_by(ranked.c.rank.desc(), Note.id.desc())
+    )
+
+    rows = (await db.execute(query)).all()
+    tags_by_note = await load_note_tags(db, [row.id for row in rows])
+    return [{**row._asdict(), "tags": tags_by_note[row.id]} for row in rows]
+
+
+# Вставка связей заметок с тегами одним INSERT; links - пары (note_id, tag_id)
+async def link_note_tags(db: AsyncSession, links: list[tuple[int, int]]):
+    if links:
+        await db.execute(insert(note_tags), [{"note_id": note_id, "tag_id": tag_id} for note_id, tag_id in links])
+
+
+# Асинхронная функция для создания новой заметки.
+# Заметка возвращается из INSERT ... RETURNING, без refresh и перечитывания тегов
+# после коммита: теги (SELECT и, для новых, INSERT), INSERT заметки, INSERT связей,
+# счетчики каталога тегов и UPDATE версии заметок.
+async def create_note(db: AsyncSession, note_in: NoteCreate, user_id: int) -> dict:
     # Получаем или создаем теги
     tags = await get_or_create_tags(db, note_in.tags)
-    # note = Note(**note_in.model_dump(), user_id=user_id)
-    note = Note(title=note_in.title, content=note_in.content, user_id=user_id, tags=tags)
 
-    db.add(note)
+    now = datetime.utcnow()
+    result = await db.execute(
+        insert(Note)
+        .values(title=note_in.title, content=note_in.content, user_id=user_id, created_at=now, updated_at=now)
+        .returning(*NOTE_COLUMNS)
+    )
+    note = result.one()
+    await link_note_tags(db, [(note.id, tag.id) for tag in tags])
+    await adjust_tag_counts(db, user_id, added=[(tag.id, tag.name) for tag in tags])
+
+    await bump_notes_version(db, user_id)
     await db.commit()  # Асинхронный коммит
-    await db.refresh(note)
-    return note
+    return {**note._asdict(), "tags": [{"id": tag.id, "name": tag.name} for tag in tags]}
 
 
-# Асинхронная функция для обновления заметки
-async def update_note(db: AsyncSession, note_id: int, note_in: NoteCreate, user_id: int):
+# Асинхронная функция для обновления заметки.
+# UPDATE ... RETURNING сразу проверяет владельца и возвращает заметку. Теги
+# сравниваются с текущими: удаляются и добавляются только отличающиеся связи,
+# а теги ищутся или создаются только для добавленных имен.
+async def update_note(db: AsyncSession, note_id: int, note_in: NoteCreate, user_id: int) -> Optional[dict]:
     result = await db.execute(
-        select(Note).where(Note.id == note_id, Note.user_id == user_id).options(selectinload(Note.tags))
+        update(Note)
+        .where(Note.id == note_id, Note.user_id == user_id)
+        .values(title=note_in.title, content=note_in.content, updated_at=datetime.utcnow())
+        .returning(*NOTE_COLUMNS)
+        .execution_options(synchronize_session=False)
     )
-    note = result.scalars().first()
+    note = result.one_or_none()
 
     if not note:
         return None  # Если заметка не найдена или принадлежит другому пользователю
 
-    # Обновляем поля заметки
-    note.title = note_in.title
-    note.content = note_in.content
+    current = {tag["name"]: tag["id"] for tag in (await load_note_tags(db, [note_id]))[note_id]}
+    names = normalize_tag_names(note_in.tags)
 
-    # Обновляем теги
-    note.tags = await get_or_create_tags(db, note_in.tags)
+    removed_ids = [tag_id for name, tag_id in current.items() if name not in names]
+    if removed_ids:
+        await db.execute(delete(note_tags).where(
+            note_tags.c.note_id == note_id,
+            note_tags.c.tag_id == any_(bindparam("removed_tag_ids", removed_ids, type_=ARRAY(Integer))),
+        ))
+    added = await get_or_create_tags(db, [name for name in names if name not in current])
+    await link_note_tags(db, [(note_id, tag.id) for tag in added])
+    await adjust_tag_counts(db, user_id, added=[(tag.id, tag.name) for tag in added], removed=removed_ids)
 
+    await bump_notes_version(db, user_id)
     await db.commit()  # Асинхронный коммит
-    await db.refresh(note)  # Обновляем объект заметки
-    return note
+
+    tag_ids = {**current, **{tag.name: tag.id for tag in added}}
+    return {**note._asdict(), "tags": [{"id": tag_ids[name], "name": name} for name in names]}
 
 
-# Асинхронная функция для удаления заметки
-async def delete_note(db: AsyncSession, note_id: int, user_id: int):
-    # Проверяем, существует ли заметка и принадлежит ли она текущему пользователю
+# Асинхронная функция для удаления заметки: один DELETE ... RETURNING проверяет
+# владельца и удаляет заметку, связи note_tags удаляются каскадно (ON DELETE CASCADE).
+# Возвращает id удаленной заметки или None.
+async def delete_note(db: AsyncSession, note_id: int, user_id: int) -> Optional[int]:
+    await release_note_tag_counts(db, user_id, [note_id])
     result = await db.execute(
-        select(Note).where(Note.id == note_id, Note.user_id == user_id)
+        delete(Note)
+        .where(Note.id == note_id, Note.user_id == user_id)
+        .returning(Note.id)
+        .execution_options(synchronize_session=False)
     )
-    note = result.scalars().first()
+    deleted_id = result.scalar_one_or_none()
 
-    if not note:
-        return None  # Заметка не найдена или принадлежит другому пользователю
+    if deleted_id is None:
+        return None  # Заметка не найдена или принадлежит другому пользователю (счетчики не менялись)
 
-    # Удаляем связанные записи из таблицы note_tags
-    await db.execute(
-        delete(note_tags).where(note_tags.c.note_id == note_id)
+    await bump_notes_version(db, user_id)
+
+    # Фиксируем изменения в базе данных
+    await db.commit()
+
+    return deleted_id
+
+
+# Размер порции строк, которую серверный курсор отдает за один раз при экспорте
+EXPORT_YIELD_PER = 1000
+
+
+# Асинхронный генератор заметок пользователя для экспорта.
+# Строки читаются через серверный курсор порциями, без загрузки всего списка в память
+# и без создания ORM-объектов; теги собираются в массив прямо в запросе.
+async def stream_notes_for_export(db: AsyncSession, user_id: int) -> AsyncIterator:
+    tag_names = (
+        select(array_agg(Tag.name))
+        .join(note_tags, note_tags.c.tag_id == Tag.id)
+        .where(note_tags.c.note_id == Note.id)
+        .scalar_subquery()
+    )
+    query = (
+        select(Note.id, Note.title, Note.content, Note.created_at, Note.updated_at,
+               tag_names.label("tags"))
+        .where(Note.user_id == user_id)
+        .order_by(Note.id)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
     )
+    result = await db.stream(query)
+    async for row in result:
+        yield row
 
-    # Удаляем саму заметку
-    await db.execute(delete(Note).where(Note.id == note_id))
 
-    # Фиксируем изменения в базе данных
+# Вставка заметок одним INSERT ... RETURNING; id возвращаются в порядке notes_in
+async def insert_note_rows(db: AsyncSession, notes_in: list[NoteCreate], user_id: int,
+                           now: datetime) -> list[int]:
+    if not notes_in:
+        return []
+    result = await db.execute(
+        insert(Note).returning(Note.id, sort_by_parameter_order=True),
+        [{"title": note_in.title, "content": note_in.content, "user_id": user_id,
+          "created_at": now, "updated_at": now} for note_in in notes_in],
+    )
+    return list(result.scalars().all())
+
+
+# Массовая вставка порции импортируемых заметок: одна вставка для заметок,
+# одно разрешение тегов на всю порцию и одна вставка связей note_tags.
+# Коммит выполняет вызывающий код, чтобы весь импорт шел в одной транзакции.
+async def import_notes_batch(db: AsyncSession, notes_in: list[NoteCreate], user_id: int) -> int:
+    if not notes_in:
+        return 0
+
+    note_ids = await insert_note_rows(db, notes_in, user_id, datetime.utcnow())
+
+    tags = await get_or_create_tags(db, [name for note_in in notes_in for name in note_in.tags])
+    tag_ids = {tag.name: tag.id for tag in tags}
+
+    links = [
+        {"note_id": note_id, "tag_id": tag_ids[name]}
+        for note_id, note_in in zip(note_ids, notes_in)
+        for name in normalize_tag_names(note_in.tags)
+    ]
+    if links:
+        await db.execute(insert(note_tags), links)
+    tag_names = {tag.id: tag.name for tag in tags}
+    await adjust_tag_counts(db, user_id, added=[(link["tag_id"], tag_names[link["tag_id"]]) for link in links])
+
+    await bump_notes_version(db, user_id)
+    return len(note_ids)
+
+
+# Пакетное выполнение операций create/update/delete над заметками пользователя в
+# одной транзакции. Каждый вид операций выполняется одним выражением на весь пакет
+# (INSERT ... RETURNING, UPDATE ... FROM (VALUES ...), DELETE ... WHERE id = ANY),
+# теги всех операций разрешаются вместе. Несуществующие и чужие заметки получают
+# статус not_found, остальные операции пакета при этом выполняются.
+# Результаты возвращаются в порядке операций. Если одна заметка встречается в
+# нескольких операциях, выбрасывается ValueError (порядок их применения не определен).
+async def apply_note_batch(db: AsyncSession, operations: list[NoteBatchOperation], user_id: int) -> list[dict]:
+    creates = [operation for operation in operations if operation.op == "create"]
+    updates = [operation for operation in operations if operation.op == "update"]
+    deletes = [operation for operation in operations if operation.op == "delete"]
+
+    target_ids = [operation.id for operation in updates + deletes]
+    if len(target_ids) != len(set(target_ids)):
+        raise ValueError("Each note can appear in only one operation")
+
+    # Назначаемые теги создаются при необходимости, снимаемые только ищутся
+    assigned = [name for operation in creates for name in operation.tags]
+    assigned += [name for operation in updates for name in (operation.tags or []) + operation.add_tags]
+    tag_ids = {tag.name: tag.id for tag in await get_or_create_tags(db, assigned)}
+    unknown = [name for name in normalize_tag_names([name for operation in updates
+                                                     for name in operation.remove_tags])
+               if name not in tag_ids]
+    if unknown:
+        tag_ids.update((tag.name, tag.id) for tag in await select_tags_by_names(db, unknown))
+
+    now = datetime.utcnow()
+    created_ids = await insert_note_rows(db, creates, user_id, now)
+    links = [(note_id, tag_ids[name]) for note_id, operation in zip(created_ids, creates)
+             for name in normalize_tag_names(operation.tags)]
+    unlinked_tag_ids = []  # tag_id каждой удаленной связи - для каталога тегов
+
+    updated_ids = set()
+    if updates:
+        # Пустые (NULL) title и content оставляют прежнее значение
+        changes = values(column("id", Integer), column("title", String), column("content", String),
+                         name="changes").data([(operation.id, operation.title, operation.content)
+                                               for operation in updates])
+        result = await db.execute(
+            update(Note)
+            .where(Note.id == changes.c.id, Note.user_id == user_id)
+            .values(title=func.coalesce(changes.c.title, Note.title),
+                    content=func.coalesce(changes.c.content, Note.content),
+                    updated_at=now)
+            .returning(Note.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated_ids = set(result.scalars().all())
+        updated = [operation for operation in updates if operation.id in updated_ids]
+
+        replaced_ids = [operation.id for operation in updated if operation.tags is not None]
+        if replaced_ids:
+            result = await db.execute(delete(note_tags).where(
+                note_tags.c.note_id == any_(bindparam("replaced_ids", replaced_ids, type_=ARRAY(Integer))))
+                .returning(note_tags.c.tag_id))
+            unlinked_tag_ids += result.scalars().all()
+        unlinked = [(operation.id, tag_ids[name]) for operation in updated
+                    for name in normalize_tag_names(operation.remove_tags) if name in tag_ids]
+        if unlinked:
+            result = await db.execute(delete(note_tags).where(
+                tuple_(note_tags.c.note_id, note_tags.c.tag_id).in_(unlinked))
+                .returning(note_tags.c.tag_id))
+            unlinked_tag_ids += result.scalars().all()
+        links += [(operation.id, tag_ids[name]) for operation in updated
+                  for name in normalize_tag_names((operation.tags or []) + operation.add_tags)]
+
+    linked_tag_ids = []
+    if links:
+        # RETURNING отдает только действительно вставленные связи (без уже существовавших)
+        result = await db.execute(pg_insert(note_tags).on_conflict_do_nothing().returning(note_tags.c.tag_id),
+                                  [{"note_id": note_id, "tag_id": tag_id} for note_id, tag_id in links])
+        linked_tag_ids = result.scalars().all()
+    tag_names = {tag_id: name for name, tag_id in tag_ids.items()}
+    await adjust_tag_counts(db, user_id, added=[(tag_id, tag_names[tag_id]) for tag_id in linked_tag_ids],
+                            removed=unlinked_tag_ids)
+
+    deleted_ids = set()
+    if deletes:
+        delete_ids = [operation.id for operation in deletes]
+        await release_note_tag_counts(db, user_id, delete_ids)
+        # Связи note_tags удаляются каскадно
+        result = await db.execute(
+            delete(Note)
+            .where(Note.user_id == user_id,
+                   Note.id == any_(bindparam("delete_ids", delete_ids, type_=ARRAY(Integer))))
+            .returning(Note.id)
+            .execution_options(synchronize_session=False)
+        )
+        deleted_ids = set(result.scalars().all())
+
+    if created_ids or updated_ids or deleted_ids:
+        await bump_notes_version(db, user_id)
     await db.commit()
 
-    return note
+    results = []
+    created = iter(created_ids)
+    for operation in operations:
+        if operation.op == "create":
+            results.append({"op": "create", "id": next(created), "status": "created"})
+        elif operation.op == "update":
+            found = operation.id in updated_ids
+            results.append({"op": "update", "id": operation.id, "status": "updated" if found else "not_found"})
+        else:
+            found = operation.id in deleted_ids
+            results.append({"op": "delete", "id": operation.id, "status": "deleted" if found else "not_found"})
+    return results
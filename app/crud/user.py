@@ -1,19 +1,23 @@
 # app/crud/user.py
+from typing import NamedTuple, Optional
+
 from pydantic import EmailStr
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
 from app.schemas.user import UserCreate
 from app.core.security import get_password_hash
+from app.core.cache import invalidate_principal
 
 
 # Асинхронное создание пользователя
 async def create_user(db: AsyncSession, user_in: UserCreate):
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await get_password_hash(user_in.password)
     user = User(email=user_in.email, hashed_password=hashed_password)
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    invalidate_principal(user)
     return user
 
 
@@ -23,9 +27,48 @@ async def create_user_by_telegram_id(db: AsyncSession, telegram_id: int):
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    invalidate_principal(user)
     return user
 
 
+# Асинхронная деактивация пользователя (блокировка аккаунта)
+async def deactivate_user(db: AsyncSession, user: User):
+    # Выданные токены больше не действуют; версия увеличивается в БД, как в revoke_user_tokens
+    await db.execute(
+        update(User).where(User.id == user.id).values(is_active=0, token_version=User.token_version + 1)
+    )
+    await db.commit()
+    invalidate_principal(user)
+    # Пользователь мог быть взят из кэша, вне текущей сессии: возвращается перечитанная строка
+    return await db.get(User, user.id, populate_existing=True)
+
+
+# Отзыв всех токенов доступа пользователя увеличением версии токенов
+async def revoke_user_tokens(db: AsyncSession, user: User):
+    await db.execute(
+        update(User).where(User.id == user.id).values(token_version=User.token_version + 1)
+    )
+    await db.commit()
+    invalidate_principal(user)
+
+
+class TokenState(NamedTuple):
+    token_version: int
+    is_active: bool
+
+
+# Текущая версия токенов и активность пользователя (один запрос по первичному ключу)
+async def get_token_state(db: AsyncSession, user_id: int) -> Optional[TokenState]:
+    result = await db.execute(select(User.token_version, User.is_active).where(User.id == user_id))
+    row = result.first()
+    return TokenState(row.token_version, bool(row.is_active)) if row else None
+
+
+# Асинхронное получение пользователя по id
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    return await db.get(User, user_id)
+
+
 # Асинхронное получение пользователя по email
 async def get_user_by_email(db: AsyncSession, email: EmailStr):
     result = await db.execute(select(User).where(User.email == email))
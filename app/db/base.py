@@ -1,14 +1,93 @@
+import os
+import time
+from uuid import uuid4
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core.metrics import Gauge, instrument_engine, registry
+from app.db.routing import ReplicaRouter, RoutingSession
+
+
+class PoolWaitStats:
+    """Статистика ожидания соединений из пула в текущем процессе."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float):
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий время получения соединения (ожидание + установка)."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_stats.record(time.perf_counter() - started)
+
+
+# Параметры движка из настроек; настройки asyncpg применяются только к URL с этим драйвером
+# (реплики для локальной проверки можно подменить, например, файлами SQLite)
+def engine_options(url: str = settings.DATABASE_URL) -> dict:
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg"):
+        if settings.DB_PGBOUNCER:
+            # PgBouncer в режиме transaction не сохраняет подготовленные выражения между
+            # транзакциями: отключаем их кэширование и делаем имена уникальными
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+        else:
+            connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+
+    return {
+        "echo": settings.DB_ECHO,
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
 
 # Асинхронный движок базы данных
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(settings.DATABASE_URL, **engine_options())
+
+# Движки реплик для чтения (см. app.db.routing)
+replica_engines = [create_async_engine(url, **engine_options(url)) for url in settings.DB_REPLICA_URLS]
 
-# Создание асинхронной сессии
+# Подсчет SQL-запросов и времени БД для метрик
+for _engine in (engine, *replica_engines):
+    instrument_engine(_engine)
+
+replica_router = ReplicaRouter(
+    engine, replica_engines,
+    sticky_seconds=settings.DB_REPLICA_STICKY_SECONDS,
+    health_interval=settings.DB_REPLICA_HEALTH_INTERVAL,
+    health_timeout=settings.DB_REPLICA_HEALTH_TIMEOUT,
+    max_lag=settings.DB_REPLICA_MAX_LAG,
+)
+
+# Создание асинхронной сессии; выражения распределяет RoutingSession
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    info={"router": replica_router},
     expire_on_commit=False,
     autocommit=False
 )
@@ -20,4 +99,45 @@ class Base(DeclarativeBase):
 # Функция для получения асинхронной сессии
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+# Текущее состояние пула соединений этого процесса (воркера)
+def get_pool_status() -> dict:
+    pool = engine.pool
+    checkouts = pool_wait_stats.checkouts
+    return {
+        "pid": os.getpid(),
+        "pool_size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checkouts": checkouts,
+        "wait_avg_ms": pool_wait_stats.total_wait / checkouts * 1000 if checkouts else 0.0,
+        "wait_max_ms": pool_wait_stats.max_wait * 1000,
+    }
+
+
+db_pool_connections = registry.register(Gauge(
+    "db_pool_connections", "Database pool connections by state.", ("state",)))
+db_pool_checkouts_total = registry.register(Gauge(
+    "db_pool_checkouts_total", "Connections handed out by the pool."))
+db_pool_wait_seconds_total = registry.register(Gauge(
+    "db_pool_wait_seconds_total", "Total time spent waiting for a pool connection."))
+db_pool_wait_max_seconds = registry.register(Gauge(
+    "db_pool_wait_max_seconds", "Longest wait for a pool connection."))
+
+
+# Снятие состояния пула при каждой выдаче метрик
+def collect_pool_metrics():
+    pool = engine.pool
+    db_pool_connections.set(pool.checkedin(), "checked_in")
+    db_pool_connections.set(pool.checkedout(), "checked_out")
+    db_pool_connections.set(pool.overflow(), "overflow")
+    db_pool_checkouts_total.set(pool_wait_stats.checkouts)
+    db_pool_wait_seconds_total.set(pool_wait_stats.total_wait)
+    db_pool_wait_max_seconds.set(pool_wait_stats.max_wait)
+
+
+registry.collectors.append(collect_pool_metrics)
@@ -0,0 +1,243 @@
+# app/db/routing.py
+"""Маршрутизация запросов сессии между основной БД и репликами для чтения.
+
+Сессия, помеченная как только для чтения (mark_read_only - так делает
+зависимость use_read_replica для маршрутов без записи), отправляет SELECT на
+одну из доступных реплик. Все остальное идет в основную БД:
+
+* любые изменения (INSERT/UPDATE/DELETE, flush ORM, SELECT ... FOR UPDATE,
+  text()) - и после первой записи вся сессия остается на основной БД;
+* чтения клиента, который сам записывал в последние DB_REPLICA_STICKY_SECONDS
+  (read-your-writes). Ответ на запрос с записью несет время записи в заголовке
+  X-DB-Last-Write и в куке db_last_write (ReadYourWritesMiddleware); клиент,
+  вернувший его, читает из основной БД, в каком бы воркере ни оказался его
+  следующий запрос. Дополнительно в памяти процесса запоминаются ключи клиента
+  из set_session_identity - для клиентов, которые время записи не возвращают;
+* чтения при отсутствии доступных реплик.
+
+Если чтение по первичному ключу не нашло строку на реплике (pin_to_primary),
+его стоит повторить в основной БД: запись могла еще не дойти до реплики.
+
+Доступность реплик проверяет фоновая задача ReplicaRouter.run_health_checks:
+реплика исключается, если не отвечает за DB_REPLICA_HEALTH_TIMEOUT или (для
+PostgreSQL) отстает больше DB_REPLICA_MAX_LAG, и возвращается после успешной
+проверки. Обрыв соединения с репликой исключает ее сразу.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Hashable, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+# Отставание реплики PostgreSQL в секундах; 0 для основной БД и для реплики,
+# применившей все полученные изменения (иначе на простаивающей БД "отставание" росло бы)
+PG_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+db_replica_healthy = registry.register(Gauge(
+    "db_replica_healthy", "Whether a read replica passed its last health check.", ("replica",)))
+db_reads_routed_total = registry.register(Counter(
+    "db_reads_routed_total", "SELECT statements of read-only sessions by chosen database.", ("target",)))
+
+
+class WriteMarker:
+    """Время записи в рамках одного HTTP-запроса (см. ReadYourWritesMiddleware).
+
+    client_last_write - время последней записи клиента из заголовка или куки
+    запроса, wrote_at - время записи, сделанной самим запросом.
+    """
+
+    def __init__(self, client_last_write: Optional[float] = None):
+        self.client_last_write = client_last_write
+        self.wrote_at: Optional[float] = None
+
+
+current_write_marker: ContextVar[Optional[WriteMarker]] = ContextVar("current_write_marker", default=None)
+
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.healthy = False  # До первой успешной проверки реплика не используется
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class ReplicaRouter:
+    """Основная БД, реплики и состояние, по которому RoutingSession выбирает движок."""
+
+    def __init__(self, primary: AsyncEngine, replicas: list[AsyncEngine], sticky_seconds: float = 5.0,
+                 health_interval: float = 5.0, health_timeout: float = 2.0, max_lag: Optional[float] = None,
+                 sticky_size: int = 100_000):
+        self.primary = primary
+        self.replicas = [Replica(f"replica{index}", engine) for index, engine in enumerate(replicas)]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_lag = max_lag
+        # Ключи клиентов, недавно записывавших в основную БД
+        self.recent_writers = TTLCache(maxsize=sticky_size, ttl=sticky_seconds)
+        self._round_robin = itertools.count()
+        self._health_task: Optional[asyncio.Task] = None
+        for replica in self.replicas:
+            event.listen(replica.engine.sync_engine, "handle_error", self._on_replica_error(replica))
+
+    # Обрыв соединения исключает реплику сразу, не дожидаясь очередной проверки
+    def _on_replica_error(self, replica: Replica):
+        def handle_error(context):
+            if context.is_disconnect and replica.healthy:
+                self._set_health(replica, False, f"{type(context.original_exception).__name__}")
+        return handle_error
+
+    def _set_health(self, replica: Replica, healthy: bool, error: Optional[str] = None):
+        if healthy != replica.healthy:
+            log = logger.info if healthy else logger.warning
+            log("Read replica %s is %s", replica.name, "healthy" if healthy else "unavailable",
+                extra={"replica": replica.name, "error": error, "lag": replica.lag})
+        replica.healthy = healthy
+        replica.error = error
+        db_replica_healthy.set(int(healthy), replica.name)
+
+    # Следующая доступная реплика по кругу или None
+    def choose_replica(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    def is_sticky(self, identity) -> bool:
+        marker = current_write_marker.get()
+        if marker is not None and marker.client_last_write is not None:
+            # Время из будущего (подделка или сильно расходящиеся часы) не учитывается
+            if 0 <= time.time() - marker.client_last_write < self.recent_writers.ttl:
+                return True
+        return any(self.recent_writers.get(key) for key in identity)
+
+    def remember_writes(self, identity):
+        for key in identity:
+            self.recent_writers.set(key, True)
+
+    async def _probe(self, replica: Replica):
+        async with replica.engine.connect() as conn:
+            if replica.engine.dialect.name == "postgresql":
+                replica.lag = float((await conn.execute(PG_REPLICA_LAG_SQL)).scalar() or 0)
+            else:
+                await conn.execute(text("SELECT 1"))
+                replica.lag = None
+
+    async def check_replica(self, replica: Replica) -> bool:
+        try:
+            await asyncio.wait_for(self._probe(replica), self.health_timeout)
+        except Exception as exc:
+            self._set_health(replica, False, f"{type(exc).__name__}: {exc}")
+            return False
+        if self.max_lag is not None and replica.lag is not None and replica.lag > self.max_lag:
+            self._set_health(replica, False, f"lag {replica.lag:.1f}s")
+            return False
+        self._set_health(replica, True)
+        return True
+
+    async def check_replicas(self):
+        await asyncio.gather(*(self.check_replica(replica) for replica in self.replicas))
+
+    async def run_health_checks(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_replicas()
+
+    # Первая проверка выполняется сразу, чтобы первые запросы не попали на недоступную реплику
+    async def start(self):
+        if self.replicas and self._health_task is None:
+            await self.check_replicas()
+            self._health_task = asyncio.create_task(self.run_health_checks())
+
+    async def stop(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def status(self) -> list[dict]:
+        return [{"name": replica.name, "url": replica.engine.url.render_as_string(hide_password=True),
+                 "healthy": replica.healthy, "lag": replica.lag, "error": replica.error}
+                for replica in self.replicas]
+
+
+class RoutingSession(Session):
+    """Синхронная часть AsyncSession, выбирающая движок для каждого выражения.
+
+    Маршрутизатор передается в info["router"] (см. sessionmaker в app.db.base).
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        router: Optional[ReplicaRouter] = self.info.get("router")
+        if router is None or not router.replicas:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+
+        is_read = (getattr(clause, "is_select", False)
+                   and getattr(clause, "_for_update_arg", None) is None
+                   and not self._flushing)
+        if not is_read:
+            self.info["wrote"] = self.info["pinned"] = True
+            return router.primary.sync_engine
+        if not self.info.get("read_only"):
+            return router.primary.sync_engine
+
+        if self.info.get("pinned") or router.is_sticky(self.info.get("identity", ())):
+            db_reads_routed_total.inc("primary_sticky")
+            return router.primary.sync_engine
+        replica = router.choose_replica()
+        if replica is None:
+            db_reads_routed_total.inc("primary_fallback")
+            return router.primary.sync_engine
+        db_reads_routed_total.inc("replica")
+        return replica.engine.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_writes(session: RoutingSession):
+    if session.info.pop("wrote", False):
+        router: Optional[ReplicaRouter] = session.info.get("router")
+        if router is not None:
+            router.remember_writes(session.info.get("identity", ()))
+        marker = current_write_marker.get()
+        if marker is not None:
+            marker.wrote_at = time.time()
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def _forget_writes(session: RoutingSession, previous_transaction):
+    session.info.pop("wrote", None)
+
+
+# Пометка сессии как работающей только на чтение: ее SELECT могут идти на реплики
+def mark_read_only(db: AsyncSession):
+    db.info["read_only"] = True
+
+
+# Перевод оставшихся чтений сессии в основную БД. Возвращает True, если до этого
+# чтения могли идти на реплику, то есть промах чтения имеет смысл повторить.
+def pin_to_primary(db: AsyncSession) -> bool:
+    router: Optional[ReplicaRouter] = db.info.get("router")
+    could_use_replica = bool(router and router.replicas and db.info.get("read_only") and not db.info.get("pinned"))
+    db.info["pinned"] = True
+    return could_use_replica
+
+
+# Ключи клиента, от имени которого работает сессия (например, ("user", id)):
+# после его записей чтения по этим ключам некоторое время идут в основную БД
+def set_session_identity(db: AsyncSession, *keys: Hashable):
+    db.info.setdefault("identity", set()).update(keys)
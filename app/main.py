@@ -2,17 +2,38 @@ import uvicorn
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
-from app.api import auth, note
+from app.api import auth, internal, metrics, note, tag
+from app.core.config import settings
+from app.core.logs import setup_logging
+from app.core.middleware import MetricsMiddleware, ReadYourWritesMiddleware, RequestContextMiddleware
+from app.core.security import password_hasher
+from app.db.base import replica_router
+
+setup_logging("api")
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await replica_router.start()
     yield
-app = FastAPI(lifespan=lifespan)
+    await replica_router.stop()
+    password_hasher.shutdown()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.include_router(auth.router)
 app.include_router(note.router)
+app.include_router(tag.router)
+app.include_router(internal.router)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
+if replica_router.replicas:
+    app.add_middleware(ReadYourWritesMiddleware)
+# Добавлен последним, то есть снаружи: id запроса виден и в журнале медленных запросов
+app.add_middleware(RequestContextMiddleware)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, DateTime, JSON
+from app.db.base import Base
+
+
+# Состояния диалогов (FSM) телеграм-бота, общие для всех его экземпляров
+class FSMRecord(Base):
+    __tablename__ = "fsm_states"
+
+    key = Column(String, primary_key=True)  # Ключ aiogram: бот, чат, пользователь, destiny
+    state = Column(String, nullable=True)
+    data = Column(JSON, nullable=False, default=dict)
+    expires_at = Column(DateTime, nullable=False, index=True)  # Брошенные диалоги удаляются после этого момента
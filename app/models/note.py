@@ -1,15 +1,29 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Table, Index, Computed, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 from app.db.base import Base
 
 # Таблица-связка (association table) для связи "многие ко многим"
 note_tags = Table(
     'note_tags', Base.metadata,
-    Column('note_id', Integer, ForeignKey('notes.id'), primary_key=True),
-    Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True)
+    # Связи удаляются вместе с заметкой или тегом на стороне БД, без отдельного DELETE
+    Column('note_id', Integer, ForeignKey('notes.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # Обратный индекс к первичному ключу (note_id, tag_id): поиск заметок по тегу
+    Index('ix_note_tags_tag_id_note_id', 'tag_id', 'note_id'),
 )
 
+# Выражение для полнотекстового индекса: заголовок весит больше содержания (A > B),
+# текст разбирается и русской, и английской конфигурацией
+NOTE_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(content, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+)
+
+
 class Note(Base):
     __tablename__ = "notes"
 
@@ -19,6 +33,8 @@ class Note(Base):
     # tags = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Генерируемый столбец для полнотекстового поиска, загружается только по запросу
+    search_vector = deferred(Column(TSVECTOR, Computed(NOTE_SEARCH_VECTOR_SQL, persisted=True)))
 
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User")
@@ -26,6 +42,14 @@ class Note(Base):
     # Связь "многие ко многим" с тегами
     tags = relationship("Tag", secondary=note_tags, back_populates="notes", lazy='selectin')
 
+    __table_args__ = (
+        # Индекс под keyset-пагинацию списка заметок пользователя
+        Index("ix_notes_user_id_updated_at_id", "user_id", "updated_at", "id"),
+        # Составной GIN-индекс (требует расширения btree_gin): поиск в заметках
+        # одного пользователя обслуживается одним индексом
+        Index("ix_notes_user_id_search_vector", "user_id", "search_vector", postgresql_using="gin"),
+    )
+
 
 class Tag(Base):
     __tablename__ = "tags"
@@ -34,4 +58,25 @@ class Tag(Base):
     name = Column(String, unique=True, index=True)
 
     # Обратная связь с заметками
-    notes = relationship("Note", secondary=note_tags, back_populates="tags")
\ No newline at end of file
+    notes = relationship("Note", secondary=note_tags, back_populates="tags")
+
+
+class UserTagCount(Base):
+    """Каталог тегов пользователя: сколько его заметок помечено каждым тегом.
+
+    Счетчики меняются в app.crud.note в той же транзакции, что и связи note_tags.
+    Строки с нулевым счетчиком не удаляются (тег может вернуться), в выдачу не попадают.
+    """
+    __tablename__ = "user_tag_counts"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+    # Копия tags.name (теги не переименовываются): поиск по префиксу идет по одному индексу
+    name = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Автодополнение по префиксу имени среди тегов пользователя (сравнение побайтно)
+        Index("ix_user_tag_counts_user_id_name", "user_id", "name",
+              postgresql_ops={"name": "varchar_pattern_ops"}, postgresql_where=text("count > 0")),
+    )
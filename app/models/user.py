@@ -8,4 +8,8 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=True)
     hashed_password = Column(String, nullable=True)
     is_active = Column(Integer, default=1)
-    telegram_id = Column(BigInteger, unique=True, index=True, nullable=True)  # Новый столбец для Telegram ID
\ No newline at end of file
+    telegram_id = Column(BigInteger, unique=True, index=True, nullable=True)  # Новый столбец для Telegram ID
+    # Версия заметок пользователя: растет при каждом изменении заметок, служит ETag списков
+    notes_version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Версия токенов: увеличение отзывает все выданные пользователю токены доступа
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
\ No newline at end of file
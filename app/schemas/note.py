@@ -1,5 +1,5 @@
-from typing import List
-from pydantic import BaseModel, ConfigDict
+from typing import Annotated, List, Literal, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, model_validator
 from datetime import datetime
 
 
@@ -13,6 +13,10 @@ class TagInDB(TagBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TagCount(TagInDB):
+    count: int  # Число заметок пользователя с этим тегом
+
+
 class NoteBase(BaseModel):
     title: str
     content: str
@@ -30,3 +34,86 @@ class NoteInDB(NoteBase):
     tags: List[TagInDB]  # Список тегов, связанных с заметкой
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
+
+
+class NotePage(BaseModel):
+    items: List[NoteInDB]  # Заметки текущей страницы
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (None, если страница последняя)
+
+
+class NoteSummary(BaseModel):
+    """Заметка в сокращенном списке (fields=summary): превью вместо полного содержания."""
+    id: int
+    title: str
+    preview: str  # Первые preview_length символов содержания
+    truncated: bool  # Содержание длиннее превью
+    created_at: datetime
+    updated_at: datetime
+    tags: List[TagInDB]
+
+
+class NoteSummaryPage(BaseModel):
+    items: List[NoteSummary]
+    next_cursor: Optional[str] = None
+
+
+class NoteSearchResult(NoteInDB):
+    rank: float  # Релевантность заметки запросу
+    snippet: str  # Фрагмент содержания с подсветкой совпадений тегами <b>
+
+
+NOTE_BATCH_MAX_OPERATIONS = 500  # Ограничение на число операций в одном пакетном запросе
+
+
+class NoteBatchCreate(NoteCreate):
+    op: Literal["create"]
+
+
+class NoteBatchUpdate(BaseModel):
+    op: Literal["update"]
+    id: int
+    # Не переданные поля не меняются
+    title: Optional[str] = None
+    content: Optional[str] = None
+    tags: Optional[List[str]] = None  # Полная замена тегов
+    add_tags: List[str] = []  # Добавить теги к имеющимся
+    remove_tags: List[str] = []  # Убрать теги из имеющихся
+
+    @model_validator(mode="after")
+    def check_tags(self):
+        if self.tags is not None and (self.add_tags or self.remove_tags):
+            raise ValueError("tags cannot be combined with add_tags or remove_tags")
+        return self
+
+
+class NoteBatchDelete(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+
+NoteBatchOperation = Annotated[Union[NoteBatchCreate, NoteBatchUpdate, NoteBatchDelete],
+                               Field(discriminator="op")]
+
+
+class NoteBatchRequest(BaseModel):
+    operations: List[NoteBatchOperation] = Field(min_length=1, max_length=NOTE_BATCH_MAX_OPERATIONS)
+
+
+class NoteBatchOperationResult(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: int
+    status: Literal["created", "updated", "deleted", "not_found"]
+
+
+class NoteBatchResult(BaseModel):
+    results: List[NoteBatchOperationResult]  # В порядке операций запроса
+
+
+# Адаптеры строятся один раз при импорте и используются для сериализации ответов
+# напрямую в JSON (pydantic-core), минуя jsonable_encoder FastAPI
+NoteAdapter = TypeAdapter(NoteInDB)
+NotePageAdapter = TypeAdapter(NotePage)
+NoteSummaryPageAdapter = TypeAdapter(NoteSummaryPage)
+NoteSearchResultListAdapter = TypeAdapter(List[NoteSearchResult])
+NoteBatchResultAdapter = TypeAdapter(NoteBatchResult)
+TagCountListAdapter = TypeAdapter(List[TagCount])
@@ -0,0 +1,309 @@
+# benchmarks/load.py
+"""Воспроизводимый нагрузочный тест API и сценариев бота.
+
+Заполняет БД из настроек приложения (локальный PostgreSQL, например
+`docker compose up db`, с примененными миграциями) тестовыми пользователями с
+заметками и тегами, затем в течение --duration секунд гоняет --concurrency
+виртуальных клиентов. Каждый клиент выбирает сценарии по весам:
+
+    auth    - регистрация по email, вход, вход по токену (GET /notes/ с Bearer);
+    browse  - список заметок и следующая страница по курсору;
+    write   - создание, изменение и удаление заметки;
+    search  - поиск по тегам (AND/OR);
+    bot     - запросы бота: /auth/login/telegram и список с If-None-Match.
+
+Транспорт --transport asgi вызывает app.main:app в этом же процессе через
+httpx.ASGITransport (без сети, удобно для профилирования), uvicorn - запускает
+`uvicorn app.main:app` отдельным процессом и ходит в него через настоящий сокет.
+По каждому эндпоинту считаются число запросов, ошибки, запросы/с и p50/p95/p99;
+результат пишется в JSON вместе с коммитом и параметрами запуска, чтобы прогоны
+можно было сравнивать между коммитами.
+
+Запуск:
+    python -m benchmarks.load --transport asgi --duration 20 --output load-asgi.json
+    python -m benchmarks.load --transport uvicorn --workers 2 --concurrency 64
+    python -m benchmarks.load --scenarios browse=5 search=2   # свой набор сценариев
+    python -m benchmarks.load --cleanup   # удалить данные прошлых запусков
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import delete, select
+
+from app.db.base import engine
+from app.main import app
+from app.models.note import Note, note_tags
+from app.models.user import User
+from benchmarks.search_notes import BENCH_TELEGRAM_ID_BASE, TAG_PREFIX, cleanup, percentile, seed
+
+BENCH_EMAIL_DOMAIN = "load.bench.example.com"
+BENCH_PASSWORD = "bench-password"
+DEFAULT_SCENARIOS = {"auth": 1, "browse": 6, "write": 2, "search": 3, "bot": 4}
+
+
+class Recorder:
+    """Задержки и ошибки по эндпоинтам (метка вида "GET /notes/")."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str,
+                      expected: tuple[int, ...] = (200,), **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[label] += 1
+            raise
+        self.latencies[label].append((time.perf_counter() - started) * 1000)
+        if response.status_code not in expected:
+            self.errors[label] += 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies.get(label, [])
+            endpoints[label] = {
+                "requests": len(values),
+                "errors": self.errors.get(label, 0),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50), 2) if values else None,
+                "p95_ms": round(percentile(values, 95), 2) if values else None,
+                "p99_ms": round(percentile(values, 99), 2) if values else None,
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        return {"total_requests": total, "total_rps": round(total / elapsed, 2), "endpoints": endpoints}
+
+
+class VirtualClient:
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder,
+                 telegram_ids: list[int], tags: int, rng: random.Random):
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.telegram_id = telegram_ids[index % len(telegram_ids)]
+        self.headers = {"Telegram-ID": str(self.telegram_id)}
+        self.tags = tags
+        self.rng = rng
+        self.etag = None  # Последний ETag списка, как его хранит клиент бота
+        self.registrations = 0
+
+    async def call(self, label: str, method: str, url: str, **kwargs) -> httpx.Response:
+        return await self.recorder.request(self.client, label, method, url, **kwargs)
+
+    def random_tag(self) -> str:
+        # Частые теги (с малыми номерами) выбираются чаще, как и при заполнении БД
+        return f"{TAG_PREFIX}{min(int(self.rng.paretovariate(1.0)) - 1, self.tags - 1)}"
+
+    async def auth(self):
+        self.registrations += 1
+        email = f"user-{self.index}-{self.registrations}@{BENCH_EMAIL_DOMAIN}"
+        credentials = {"email": email, "password": BENCH_PASSWORD, "telegram_id": None}
+        await self.call("POST /auth/register", "POST", "/auth/register", json=credentials)
+        response = await self.call("POST /auth/login", "POST", "/auth/login", json=credentials)
+        self.client.cookies.clear()  # Токен передаем явно, а не через куки
+        if response.status_code == 200:
+            token = response.json()["access_token"]
+            await self.call("GET /notes/ (bearer)", "GET", "/notes/",
+                            headers={"Authorization": f"Bearer {token}"})
+
+    async def browse(self):
+        response = await self.call("GET /notes/", "GET", "/notes/", headers=self.headers)
+        cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+        if cursor:
+            await self.call("GET /notes/?cursor", "GET", "/notes/",
+                            params={"cursor": cursor}, headers=self.headers)
+
+    async def write(self):
+        note = {"title": "load test", "content": "created by benchmarks.load",
+                "tags": [self.random_tag(), self.random_tag()]}
+        response = await self.call("POST /notes/", "POST", "/notes/", json=note,
+                                   headers=self.headers, expected=(201,))
+        if response.status_code != 201:
+            return
+        note_id = response.json()["id"]
+        note["title"] = "load test (edited)"
+        await self.call("PUT /notes/{id}", "PUT", f"/notes/{note_id}", json=note, headers=self.headers)
+        await self.call("DELETE /notes/{id}", "DELETE", f"/notes/{note_id}", headers=self.headers,
+                        expected=(204,))
+
+    async def search(self):
+        match = self.rng.choice(["all", "any"])
+        params = [("tags", self.random_tag()) for _ in range(self.rng.randint(1, 2))] + [("match", match)]
+        await self.call(f"GET /notes/search ({match})", "GET", "/notes/search",
+                        params=params, headers=self.headers)
+
+    async def bot(self):
+        await self.call("POST /auth/login/telegram", "POST", "/auth/login/telegram", headers=self.headers)
+        headers = {**self.headers, "If-None-Match": self.etag} if self.etag else self.headers
+        response = await self.call("GET /notes/?limit=10 (bot)", "GET", "/notes/", params={"limit": 10},
+                                   headers=headers, expected=(200, 304))
+        self.etag = response.headers.get("ETag", self.etag)
+
+    async def run(self, scenarios: dict[str, int], deadline: float):
+        names, weights = list(scenarios), list(scenarios.values())
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(names, weights=weights)[0]
+            try:
+                await getattr(self, scenario)()
+            except httpx.HTTPError:
+                pass  # Уже учтено в ошибках эндпоинта
+
+
+async def cleanup_all():
+    await cleanup()
+    async with engine.begin() as conn:
+        user_ids = select(User.id).where(User.email.endswith(f"@{BENCH_EMAIL_DOMAIN}")).scalar_subquery()
+        note_ids = select(Note.id).where(Note.user_id.in_(user_ids)).scalar_subquery()
+        await conn.execute(delete(note_tags).where(note_tags.c.note_id.in_(note_ids)))
+        await conn.execute(delete(Note).where(Note.user_id.in_(user_ids)))
+        await conn.execute(delete(User).where(User.email.endswith(f"@{BENCH_EMAIL_DOMAIN}")))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Запуск uvicorn отдельным процессом и ожидание, пока он начнет принимать соединения
+async def start_uvicorn(port: int, workers: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        stdout=subprocess.DEVNULL,
+    )
+    async with httpx.AsyncClient() as probe:
+        for _ in range(100):
+            if process.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                await probe.get(f"http://127.0.0.1:{port}/docs")
+                return process
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start in time")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_scenarios(values: list[str]) -> dict[str, int]:
+    if not values:
+        return dict(DEFAULT_SCENARIOS)
+    scenarios = {}
+    for value in values:
+        name, _, weight = value.partition("=")
+        if name not in DEFAULT_SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}, expected one of {', '.join(DEFAULT_SCENARIOS)}")
+        scenarios[name] = int(weight or 1)
+    return scenarios
+
+
+async def run(args):
+    if args.cleanup:
+        await cleanup_all()
+        await engine.dispose()
+        return
+
+    scenarios = parse_scenarios(args.scenarios)
+    rng = random.Random(args.seed)
+    await cleanup_all()
+    started = time.perf_counter()
+    await seed(args.users, args.notes, args.tags, args.tags_per_note, rng)
+    print(f"Seeded {args.users} users x {args.notes} notes in {time.perf_counter() - started:.1f}s")
+    telegram_ids = [BENCH_TELEGRAM_ID_BASE + i for i in range(args.users)]
+
+    server = None
+    if args.transport == "uvicorn":
+        port = free_port()
+        server = await start_uvicorn(port, args.workers)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                   timeout=args.timeout)
+
+    recorder = Recorder()
+    try:
+        async with client:
+            # Прогрев: соединения в пулах, кэши; в отчет не попадает
+            warmup = [VirtualClient(i, client, Recorder(), telegram_ids, args.tags, random.Random(i))
+                      for i in range(args.concurrency)]
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(vc.run({"browse": 1, "bot": 1}, deadline) for vc in warmup))
+
+            clients = [VirtualClient(i, client, recorder, telegram_ids, args.tags,
+                                     random.Random(args.seed * 1000 + i)) for i in range(args.concurrency)]
+            started = time.perf_counter()
+            await asyncio.gather(*(vc.run(scenarios, started + args.duration) for vc in clients))
+            elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "transport": args.transport,
+        "config": {
+            "concurrency": args.concurrency, "duration": args.duration, "workers": args.workers,
+            "users": args.users, "notes": args.notes, "tags": args.tags, "scenarios": scenarios,
+            "seed": args.seed, "cpu_count": os.cpu_count(),
+        },
+        "elapsed_s": round(elapsed, 2),
+        **recorder.report(elapsed),
+    }
+
+    print(f"{'endpoint':<32}{'req':>8}{'err':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for label, stats in result["endpoints"].items():
+        print(f"{label:<32}{stats['requests']:>8}{stats['errors']:>6}{stats['rps']:>9.1f}"
+              f"{stats['p50_ms'] or 0:>9.1f}{stats['p95_ms'] or 0:>9.1f}{stats['p99_ms'] or 0:>9.1f}")
+    print(f"total: {result['total_requests']} requests, {result['total_rps']} req/s")
+
+    with open(args.output, "w") as file:
+        json.dump(result, file, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+
+    if not args.keep:
+        await cleanup_all()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the API and bot request flows")
+    parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unmeasured warm-up")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout, seconds")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--notes", type=int, default=200, help="notes per user")
+    parser.add_argument("--tags", type=int, default=100, help="size of the tag vocabulary")
+    parser.add_argument("--tags-per-note", type=int, default=3)
+    parser.add_argument("--scenarios", nargs="*", metavar="NAME=WEIGHT",
+                        help=f"scenario weights, default: {DEFAULT_SCENARIOS}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="load-results.json", help="JSON report path")
+    parser.add_argument("--keep", action="store_true", help="keep seeded data after the run")
+    parser.add_argument("--cleanup", action="store_true", help="only remove benchmark data")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,112 @@
+# benchmarks/login_burst.py
+"""Нагрузочный тест: задержка эндпоинтов заметок во время волны входов по паролю.
+
+Приложение запускается в этом же процессе (httpx.ASGITransport), поэтому любая
+блокировка цикла событий хешированием сразу видна на задержке /notes/.
+Тест создает пользователя с паролем и Telegram-пользователя с заметками, затем
+измеряет GET /notes/ в две фазы: без нагрузки и одновременно с непрерывными
+POST /auth/login. Печатает p50/p95/max для каждой фазы и статистику пула хеширования.
+
+Запуск:
+    python -m benchmarks.login_burst
+    python -m benchmarks.login_burst --logins 16 --duration 5
+    python -m benchmarks.login_burst --inline   # хеширование в цикле событий, как раньше
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from sqlalchemy import delete
+
+from app.core import security
+from app.crud.note import create_note
+from app.crud.user import create_user, create_user_by_telegram_id
+from app.db.base import engine, AsyncSessionLocal
+from app.main import app
+from app.models.user import User
+from app.schemas.note import NoteCreate
+from app.schemas.user import UserCreate
+from benchmarks.search_notes import BENCH_TELEGRAM_ID_BASE, cleanup, percentile
+
+BENCH_EMAIL = "login-burst@bench.example.com"
+BENCH_PASSWORD = "bench-password"
+
+
+async def seed(notes: int) -> int:
+    await cleanup()
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(User.email == BENCH_EMAIL))
+        await db.commit()
+        await create_user(db, UserCreate(email=BENCH_EMAIL, password=BENCH_PASSWORD, telegram_id=None))
+        user = await create_user_by_telegram_id(db, BENCH_TELEGRAM_ID_BASE)
+        for i in range(notes):
+            await create_note(db, NoteCreate(title=f"note {i}", content="benchmark " * 20, tags=["bench"]),
+                              user.id)
+    return user.telegram_id
+
+
+async def read_notes_loop(client: httpx.AsyncClient, telegram_id: int, stop: asyncio.Event,
+                          latencies: list[float]):
+    headers = {"Telegram-ID": str(telegram_id)}
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/notes/", headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def login_loop(client: httpx.AsyncClient, stop: asyncio.Event, counters: dict):
+    while not stop.is_set():
+        response = await client.post("/auth/login", json={
+            "email": BENCH_EMAIL, "password": BENCH_PASSWORD, "telegram_id": None,
+        })
+        counters[response.status_code] = counters.get(response.status_code, 0) + 1
+
+
+async def phase(client: httpx.AsyncClient, telegram_id: int, readers: int, logins: int,
+                duration: float) -> tuple[list[float], dict]:
+    stop = asyncio.Event()
+    latencies: list[float] = []
+    counters: dict = {}
+    tasks = [asyncio.create_task(read_notes_loop(client, telegram_id, stop, latencies))
+             for _ in range(readers)]
+    tasks += [asyncio.create_task(login_loop(client, stop, counters)) for _ in range(logins)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return latencies, counters
+
+
+async def run(args):
+    if args.inline:
+        security.password_hasher = security.PasswordHasher(workers=0)
+
+    telegram_id = await seed(args.notes)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await phase(client, telegram_id, args.readers, 0, 0.5)  # Прогрев
+
+        print(f"{'phase':<10}{'requests':>10}{'p50, ms':>10}{'p95, ms':>10}{'max, ms':>10}  logins")
+        for name, logins in (("baseline", 0), ("burst", args.logins)):
+            latencies, counters = await phase(client, telegram_id, args.readers, logins, args.duration)
+            print(f"{name:<10}{len(latencies):>10}{statistics.median(latencies):>10.1f}"
+                  f"{percentile(latencies, 95):>10.1f}{max(latencies):>10.1f}  {counters or '-'}")
+
+    print("password hasher:", security.password_hasher.stats())
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(User.email == BENCH_EMAIL))
+        await db.commit()
+    await cleanup()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Note endpoint latency during a login burst")
+    parser.add_argument("--notes", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=4, help="concurrent GET /notes/ clients")
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login clients during the burst")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per phase")
+    parser.add_argument("--inline", action="store_true", help="hash in the event loop (previous behaviour)")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,164 @@
+# benchmarks/replica_routing.py
+"""Проверка маршрутизации запросов между основной БД и репликой (app.db.routing).
+
+Основная БД и реплика - две независимые БД (по умолчанию два файла SQLite во
+временном каталоге, либо два PostgreSQL через --primary/--replica). В каждой
+создается таблица routing_probe с одной строкой - именем БД, так что по
+результату SELECT видно, куда ушел запрос. Проверяется:
+
+    чтение в сессии только для чтения идет на реплику, в обычной - в основную БД;
+    запись идет в основную БД, и после нее сессия остается на основной;
+    после записи чтения того же клиента идут в основную БД до конца окна
+    DB_REPLICA_STICKY_SECONDS, чтения других клиентов - на реплику;
+    время записи, переданное клиентом (X-DB-Last-Write), действует и в другом
+    процессе (отдельный ReplicaRouter без памяти о записях);
+    после pin_to_primary сессия читает из основной БД;
+    недоступная реплика исключается, чтения идут в основную БД;
+    (SQLite) реплика возвращается после успешной проверки доступности.
+
+Завершается с кодом 1, если какая-то проверка не прошла.
+
+Запуск:
+    python -m benchmarks.replica_routing
+    python -m benchmarks.replica_routing --primary postgresql+asyncpg://.../notes \\
+        --replica postgresql+asyncpg://.../notes_replica
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import Column, MetaData, String, Table, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.routing import (ReplicaRouter, RoutingSession, WriteMarker, current_write_marker, mark_read_only,
+                            pin_to_primary, set_session_identity)
+
+STICKY_SECONDS = 0.5
+
+metadata = MetaData()
+routing_probe = Table("routing_probe", metadata, Column("name", String, primary_key=True))
+
+
+async def prepare(engine, name: str):
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.drop_all)
+        await conn.run_sync(metadata.create_all)
+        await conn.execute(routing_probe.insert().values(name=name))
+
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def expect(self, description: str, actual, expected):
+        ok = actual == expected
+        self.failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {description}: {actual}" + ("" if ok else f" (expected {expected})"))
+
+
+async def read_probe(session_factory, read_only: bool = True, identity=()) -> str:
+    async with session_factory() as db:
+        if read_only:
+            mark_read_only(db)
+        set_session_identity(db, *identity)
+        return (await db.execute(select(routing_probe.c.name))).scalar_one()
+
+
+async def main(primary_url: str, replica_url: str, down_url: str, recover_dir: str = None) -> int:
+    primary = create_async_engine(primary_url)
+    replica = create_async_engine(replica_url)
+    await prepare(primary, "primary")
+    await prepare(replica, "replica")
+
+    router = ReplicaRouter(primary, [replica], sticky_seconds=STICKY_SECONDS, health_timeout=2.0)
+    session_factory = sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession,
+                                   info={"router": router}, expire_on_commit=False)
+    checks = Checks()
+
+    await router.check_replicas()
+    checks.expect("replica healthy", router.replicas[0].healthy, True)
+    checks.expect("read-only session reads from", await read_probe(session_factory), "replica")
+    checks.expect("regular session reads from", await read_probe(session_factory, read_only=False), "primary")
+
+    async with session_factory() as db:
+        mark_read_only(db)
+        set_session_identity(db, ("id", 1))
+        await db.execute(update(routing_probe).values(name=routing_probe.c.name))
+        after_write = (await db.execute(select(routing_probe.c.name))).scalar_one()
+        await db.commit()
+    checks.expect("read after write in the same session", after_write, "primary")
+    checks.expect("writer reads right after commit from",
+                  await read_probe(session_factory, identity=[("id", 1)]), "primary")
+    checks.expect("another client reads from", await read_probe(session_factory, identity=[("id", 2)]), "replica")
+    await asyncio.sleep(STICKY_SECONDS + 0.1)
+    checks.expect("writer reads after the sticky window from",
+                  await read_probe(session_factory, identity=[("id", 1)]), "replica")
+
+    # Другой воркер: память о записях пустая, время записи приходит от клиента
+    other_router = ReplicaRouter(primary, [replica], sticky_seconds=STICKY_SECONDS, health_timeout=2.0)
+    other_factory = sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession,
+                                 info={"router": other_router}, expire_on_commit=False)
+    await other_router.check_replicas()
+    for description, last_write, expected in (("client sent a fresh write time", time.time(), "primary"),
+                                              ("client sent a stale write time", time.time() - 60, "replica"),
+                                              ("client sent a future write time", time.time() + 60, "replica")):
+        token = current_write_marker.set(WriteMarker(last_write))
+        try:
+            checks.expect(f"another worker, {description}, reads from", await read_probe(other_factory), expected)
+        finally:
+            current_write_marker.reset(token)
+
+    async with other_factory() as db:
+        mark_read_only(db)
+        before = (await db.execute(select(routing_probe.c.name))).scalar_one()
+        checks.expect("pin_to_primary reports a possible replica read", pin_to_primary(db), True)
+        after = (await db.execute(select(routing_probe.c.name))).scalar_one()
+    checks.expect("read before pin_to_primary from", before, "replica")
+    checks.expect("read after pin_to_primary from", after, "primary")
+
+    down = create_async_engine(down_url)
+    down_router = ReplicaRouter(primary, [down], health_timeout=2.0)
+    down_factory = sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession,
+                                info={"router": down_router}, expire_on_commit=False)
+    await down_router.check_replicas()
+    checks.expect("unreachable replica healthy", down_router.replicas[0].healthy, False)
+    checks.expect("read-only session falls back to", await read_probe(down_factory), "primary")
+
+    if recover_dir:
+        os.makedirs(recover_dir)
+        await prepare(down, "recovered")
+        await down_router.check_replicas()
+        checks.expect("replica healthy after recovery", down_router.replicas[0].healthy, True)
+        checks.expect("read-only session reads from", await read_probe(down_factory), "recovered")
+
+    for probe_engine in (primary, replica, down) if recover_dir else (primary, replica):
+        async with probe_engine.begin() as conn:
+            await conn.run_sync(metadata.drop_all)
+    await router.stop()
+    await other_router.stop()
+    await down_router.stop()
+    await primary.dispose()
+    return 1 if checks.failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check primary/replica routing")
+    parser.add_argument("--primary", help="primary database URL (default: SQLite file)")
+    parser.add_argument("--replica", help="replica database URL (default: SQLite file)")
+    parser.add_argument("--down", default="postgresql+asyncpg://postgres@127.0.0.1:1/notes",
+                        help="URL of an unreachable replica (PostgreSQL mode)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.primary and args.replica:
+            urls = (args.primary, args.replica, args.down, None)
+        else:
+            # Недоступная реплика - файл в еще не созданном каталоге; каталог создается для проверки восстановления
+            missing = os.path.join(workdir, "missing")
+            urls = (f"sqlite+aiosqlite:///{workdir}/primary.db", f"sqlite+aiosqlite:///{workdir}/replica.db",
+                    f"sqlite+aiosqlite:///{missing}/replica.db", missing)
+        sys.exit(asyncio.run(main(*urls)))
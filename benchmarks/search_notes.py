@@ -0,0 +1,153 @@
+# benchmarks/search_notes.py
+"""Бенчмарк поиска заметок по тегам.
+
+Заполняет БД (из настроек приложения) N пользователями по M заметок с тегами
+из словаря в K тегов (частоты тегов неравномерны: есть и частые, и редкие),
+после чего выполняет серию поисковых запросов через app.crud.note.search_notes
+и печатает p50/p95 задержки по каждому режиму поиска.
+
+Запуск:
+    python -m benchmarks.search_notes --users 50 --notes 2000 --tags 200
+    python -m benchmarks.search_notes --explain   # дополнительно вывести план запроса
+    python -m benchmarks.search_notes --cleanup   # удалить данные прошлых запусков
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.dialects import postgresql
+
+from app.db.base import engine, AsyncSessionLocal
+from app.models.note import Note, Tag, note_tags
+from app.models.user import User
+from app.crud.note import search_notes, paginate, has_any_tag
+
+# Диапазон telegram_id для тестовых пользователей, чтобы не пересекаться с реальными
+BENCH_TELEGRAM_ID_BASE = 9_000_000_000_000
+TAG_PREFIX = "bench-tag-"
+BATCH_SIZE = 5000
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def cleanup():
+    async with engine.begin() as conn:
+        user_ids = select(User.id).where(User.telegram_id >= BENCH_TELEGRAM_ID_BASE).scalar_subquery()
+        note_ids = select(Note.id).where(Note.user_id.in_(user_ids)).scalar_subquery()
+        await conn.execute(delete(note_tags).where(note_tags.c.note_id.in_(note_ids)))
+        await conn.execute(delete(Note).where(Note.user_id.in_(user_ids)))
+        await conn.execute(delete(User).where(User.telegram_id >= BENCH_TELEGRAM_ID_BASE))
+        await conn.execute(delete(Tag).where(Tag.name.startswith(TAG_PREFIX)))
+
+
+async def seed(users: int, notes: int, tags: int, tags_per_note: int, rng: random.Random):
+    await cleanup()
+    async with engine.begin() as conn:
+        tag_rows = await conn.execute(
+            insert(Tag).returning(Tag.id),
+            [{"name": f"{TAG_PREFIX}{k}"} for k in range(tags)],
+        )
+        tag_ids = [row.id for row in tag_rows]
+        # Распределение, близкое к закону Ципфа: первые теги встречаются намного чаще последних
+        weights = [1 / (rank + 1) for rank in range(tags)]
+
+        user_rows = await conn.execute(
+            insert(User).returning(User.id),
+            [{"telegram_id": BENCH_TELEGRAM_ID_BASE + i, "is_active": 1} for i in range(users)],
+        )
+        user_ids = [row.id for row in user_rows]
+
+        for user_id in user_ids:
+            for offset in range(0, notes, BATCH_SIZE):
+                batch = min(BATCH_SIZE, notes - offset)
+                note_rows = await conn.execute(
+                    insert(Note).returning(Note.id),
+                    [{"title": f"note {offset + i}", "content": "benchmark " * 20, "user_id": user_id}
+                     for i in range(batch)],
+                )
+                links = []
+                for row in note_rows:
+                    chosen = set(rng.choices(tag_ids, weights=weights, k=tags_per_note))
+                    links.extend({"note_id": row.id, "tag_id": tag_id} for tag_id in chosen)
+                await conn.execute(insert(note_tags), links)
+
+        await conn.execute(text("ANALYZE notes"))
+        await conn.execute(text("ANALYZE note_tags"))
+        await conn.execute(text("ANALYZE tags"))
+    return user_ids
+
+
+def random_query(rng: random.Random, tags: int) -> dict:
+    mode = rng.choice(["all", "any", "not"])
+    names = [f"{TAG_PREFIX}{rng.randrange(tags)}" for _ in range(rng.randint(1, 3))]
+    if mode == "not":
+        return {"tags": names[:1], "match": "all", "exclude": [f"{TAG_PREFIX}{rng.randrange(tags)}"],
+                "mode": mode}
+    return {"tags": names, "match": mode, "exclude": None, "mode": mode}
+
+
+async def explain(user_id: int, tags: list[str]):
+    # План для AND-поиска по двум тегам (частому и редкому)
+    async with AsyncSessionLocal() as db:
+        tag_rows = await db.execute(select(Tag).where(Tag.name.in_(tags)))
+        query = select(Note).where(Note.user_id == user_id)
+        for tag in tag_rows.scalars():
+            query = query.where(has_any_tag([tag.id]))
+        compiled = paginate(query, 20).compile(dialect=postgresql.dialect(),
+                                               compile_kwargs={"literal_binds": True})
+        result = await db.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}"))
+        print("\n".join(row[0] for row in result))
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+
+    if args.cleanup:
+        await cleanup()
+        await engine.dispose()
+        return
+
+    started = time.perf_counter()
+    user_ids = await seed(args.users, args.notes, args.tags, args.tags_per_note, rng)
+    print(f"Seeded {args.users} users x {args.notes} notes x {args.tags} tags "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    latencies: dict[str, list[float]] = {"all": [], "any": [], "not": []}
+    async with AsyncSessionLocal() as db:
+        for _ in range(args.queries):
+            query = random_query(rng, args.tags)
+            started = time.perf_counter()
+            await search_notes(db, rng.choice(user_ids), query["tags"], limit=20,
+                               match=query["match"], exclude=query["exclude"])
+            latencies[query["mode"]].append((time.perf_counter() - started) * 1000)
+
+    print(f"{'mode':<6}{'count':>8}{'p50, ms':>12}{'p95, ms':>12}")
+    for mode, values in latencies.items():
+        if values:
+            print(f"{mode:<6}{len(values):>8}{statistics.median(values):>12.2f}"
+                  f"{percentile(values, 95):>12.2f}")
+
+    if args.explain:
+        await explain(user_ids[0], [f"{TAG_PREFIX}0", f"{TAG_PREFIX}{args.tags - 1}"])
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark note search by tags")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--notes", type=int, default=1000, help="notes per user")
+    parser.add_argument("--tags", type=int, default=100, help="size of the tag vocabulary")
+    parser.add_argument("--tags-per-note", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--explain", action="store_true", help="print EXPLAIN ANALYZE of an AND search")
+    parser.add_argument("--cleanup", action="store_true", help="only remove benchmark data")
+    asyncio.run(run(parser.parse_args()))
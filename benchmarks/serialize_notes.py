@@ -0,0 +1,101 @@
+# benchmarks/serialize_notes.py
+"""Бенчмарк выдачи списка заметок (/notes) до и после быстрой сериализации.
+
+Заполняет БД (из настроек приложения) одним пользователем с заметками и для
+страниц размером 10, 1000 и 10000 заметок сравнивает два пути:
+
+    before - ORM-объекты Note с selectinload(Note.tags), проверка через
+             response_model и jsonable_encoder FastAPI, стандартный JSONResponse;
+    after  - выборка колонок без ORM (get_notes) и сериализация заранее
+             построенным TypeAdapter (adapter_response).
+
+Каждый запрос выполняется в новой сессии, как в API. Ограничение limit<=100
+эндпоинта здесь не действует: измеряется стоимость выборки и сериализации.
+
+Запуск:
+    python -m benchmarks.serialize_notes
+    python -m benchmarks.serialize_notes --sizes 10 1000 10000 --duration 3
+    python -m benchmarks.serialize_notes --cleanup   # удалить данные прошлых запусков
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.api.note import adapter_response
+from app.crud.note import get_notes, make_page, paginate
+from app.db.base import engine, AsyncSessionLocal
+from app.models.note import Note
+from app.schemas.note import NotePage, NotePageAdapter
+from benchmarks.search_notes import cleanup, seed
+
+# Поле ответа так же, как FastAPI строит его из response_model=NotePage
+NOTE_PAGE_FIELD = create_model_field(name="Response_read_notes", type_=NotePage, mode="serialization")
+
+
+# Прежний путь: ORM-гидратация и сериализация средствами FastAPI
+async def before(user_id: int, limit: int) -> bytes:
+    async with AsyncSessionLocal() as db:
+        query = select(Note).where(Note.user_id == user_id).options(selectinload(Note.tags))
+        result = await db.execute(paginate(query, limit))
+        page = make_page(result.scalars().all(), limit)
+        content = await serialize_response(field=NOTE_PAGE_FIELD, response_content=page)
+    return JSONResponse(content).body
+
+
+# Новый путь: колонки без ORM и TypeAdapter
+async def after(user_id: int, limit: int) -> bytes:
+    async with AsyncSessionLocal() as db:
+        page = await get_notes(db, user_id, limit)
+    return adapter_response(NotePageAdapter, page).body
+
+
+# Число запросов в секунду за duration секунд (не меньше min_runs запусков)
+async def throughput(handler, user_id: int, limit: int, duration: float, min_runs: int = 3) -> float:
+    await handler(user_id, limit)  # Прогрев: соединение в пуле, кэш планов
+    runs = 0
+    started = time.perf_counter()
+    while runs < min_runs or time.perf_counter() - started < duration:
+        await handler(user_id, limit)
+        runs += 1
+    return runs / (time.perf_counter() - started)
+
+
+async def run(args):
+    if args.cleanup:
+        await cleanup()
+        await engine.dispose()
+        return
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    user_id, = await seed(1, max(args.sizes), args.tags, args.tags_per_note, rng)
+    print(f"Seeded {max(args.sizes)} notes in {time.perf_counter() - started:.1f}s")
+
+    # Оба пути должны отдавать одинаковые заметки
+    assert (await before(user_id, 10)).count(b'"id"') == (await after(user_id, 10)).count(b'"id"')
+
+    print(f"{'notes':>8}{'before, req/s':>16}{'after, req/s':>16}{'speedup':>10}")
+    for size in args.sizes:
+        old = await throughput(before, user_id, size, args.duration)
+        new = await throughput(after, user_id, size, args.duration)
+        print(f"{size:>8}{old:>16.1f}{new:>16.1f}{new / old:>9.2f}x")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /notes serialization before and after")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="notes per page")
+    parser.add_argument("--tags", type=int, default=100, help="size of the tag vocabulary")
+    parser.add_argument("--tags-per-note", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per measurement")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cleanup", action="store_true", help="only remove benchmark data")
+    asyncio.run(run(parser.parse_args()))
@@ -1,18 +1,13 @@
 # telegram_bot/auth.py
-import aiohttp
-from app.core.config import settings as s
+from telegram_bot.transport import BackendTransport
 
 
-async def authorize_user(telegram_id: int):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-                f"http://{s.BACKEND_HOST}:{s.BACKEND_PORT}/auth/login/telegram",
-                headers={"Telegram-ID": str(telegram_id)}) as response:
+async def authorize_user(backend: BackendTransport, telegram_id: int):
+    response = await backend.login_telegram(telegram_id)
 
-            if response.status == 200:
-                # Пользователь найден, возвращаем данные
-                user_data = await response.json()
-                return user_data
-            else:
-                # Пользователь не найден
-                return None
+    if response.status == 200:
+        # Пользователь найден, возвращаем данные
+        return response.data
+    else:
+        # Пользователь не найден
+        return None
@@ -0,0 +1,169 @@
+# telegram_bot/backend.py
+import asyncio
+from typing import Any, NamedTuple, Optional
+
+import aiohttp
+
+from app.core.cache import TTLCache
+from app.core.config import settings as s
+from app.core.logs import correlation_id
+
+# Методы, которые можно безопасно повторять при сетевых сбоях
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Коды ответа, при которых имеет смысл повторить идемпотентный запрос
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+# Время последней записи пользователя, которое API ставит в ответ и ждет обратно
+# (read-your-writes при чтении с реплик, см. app.core.middleware.ReadYourWritesMiddleware)
+LAST_WRITE_HEADER = "X-DB-Last-Write"
+
+
+class BackendResponse(NamedTuple):
+    status: int
+    data: Any  # Разобранный JSON или текст ответа
+
+
+class BackendClient:
+    """Общий HTTP-клиент бота для обращения к бэкенду.
+
+    Держит один пул keep-alive соединений на всё время жизни бота,
+    ограничивает число одновременных запросов и повторяет идемпотентные
+    запросы с экспоненциальной задержкой. Для GET-запросов от имени
+    пользователя запоминает последний ответ с ETag и при повторном запросе
+    отправляет If-None-Match: если список не изменился, бэкенд отвечает 304
+    без тела, и клиент возвращает сохраненные данные. Время последней записи
+    пользователя (X-DB-Last-Write) возвращается в его следующих запросах, пока
+    API читает его данные из основной БД.
+    """
+
+    def __init__(
+            self,
+            base_url: str = None,
+            timeout: float = s.BACKEND_TIMEOUT,
+            connect_timeout: float = s.BACKEND_CONNECT_TIMEOUT,
+            pool_size: int = s.BACKEND_POOL_SIZE,
+            keepalive_timeout: float = s.BACKEND_KEEPALIVE_TIMEOUT,
+            max_concurrency: int = s.BACKEND_MAX_CONCURRENCY,
+            retries: int = s.BACKEND_RETRIES,
+            retry_backoff: float = s.BACKEND_RETRY_BACKOFF,
+            etag_cache_size: int = s.BACKEND_ETAG_CACHE_SIZE,
+            etag_cache_ttl: float = s.BACKEND_ETAG_CACHE_TTL,
+            last_write_ttl: float = s.DB_REPLICA_STICKY_SECONDS,
+    ):
+        self.base_url = base_url or f"http://{s.BACKEND_HOST}:{s.BACKEND_PORT}"
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._etag_cache = TTLCache(maxsize=etag_cache_size, ttl=etag_cache_ttl)
+        self._last_writes = TTLCache(maxsize=etag_cache_size, ttl=last_write_ttl)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,  # Кэшируем DNS, чтобы не резолвить хост на каждый запрос
+            )
+            self._session = aiohttp.ClientSession(
+                base_url=self.base_url,
+                connector=connector,
+                timeout=self.timeout,
+                # Одна сессия обслуживает всех пользователей бота: куки API делили бы их состояние
+                cookie_jar=aiohttp.DummyCookieJar(),
+            )
+        return self
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(
+            self,
+            method: str,
+            path: str,
+            telegram_id: int = None,
+            *,
+            params: Any = None,
+            json: Any = None,
+            timeout: float = None,
+    ) -> BackendResponse:
+        if self._session is None:
+            raise RuntimeError("BackendClient is not started")
+
+        method = method.upper()
+        headers = {"Telegram-ID": str(telegram_id)} if telegram_id is not None else {}
+        if correlation_id.get():
+            headers["X-Request-ID"] = correlation_id.get()
+        last_write = self._last_writes.get(telegram_id) if telegram_id is not None else None
+        if last_write:
+            headers[LAST_WRITE_HEADER] = last_write
+        cache_key = self._etag_cache_key(method, path, telegram_id, params)
+        cached = self._etag_cache.get(cache_key) if cache_key else None
+        if cached:
+            headers["If-None-Match"] = cached[0]
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+        attempts = self.retries + 1 if method in IDEMPOTENT_METHODS else 1
+
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                async with self._semaphore:
+                    async with self._session.request(
+                            method, path, params=params, json=json,
+                            headers=headers, timeout=request_timeout) as response:
+                        if telegram_id is not None and LAST_WRITE_HEADER in response.headers:
+                            self._last_writes.set(telegram_id, response.headers[LAST_WRITE_HEADER])
+                        if response.status in RETRY_STATUSES and not last_attempt:
+                            await response.read()  # Возвращаем соединение в пул
+                        elif response.status == 304 and cached:
+                            return BackendResponse(200, cached[1])
+                        else:
+                            body = await self._read_body(response)
+                            etag = response.headers.get("ETag")
+                            if cache_key and response.status == 200 and etag:
+                                self._etag_cache.set(cache_key, (etag, body))
+                            return BackendResponse(response.status, body)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def get(self, path: str, telegram_id: int = None, **kwargs) -> BackendResponse:
+        return await self.request("GET", path, telegram_id, **kwargs)
+
+    async def post(self, path: str, telegram_id: int = None, **kwargs) -> BackendResponse:
+        return await self.request("POST", path, telegram_id, **kwargs)
+
+    async def put(self, path: str, telegram_id: int = None, **kwargs) -> BackendResponse:
+        return await self.request("PUT", path, telegram_id, **kwargs)
+
+    async def delete(self, path: str, telegram_id: int = None, **kwargs) -> BackendResponse:
+        return await self.request("DELETE", path, telegram_id, **kwargs)
+
+    # Ключ кэша условных GET: ответы хранятся отдельно для каждого пользователя и URL
+    @staticmethod
+    def _etag_cache_key(method: str, path: str, telegram_id: Optional[int], params: Any):
+        if method != "GET" or telegram_id is None:
+            return None
+        if isinstance(params, dict):
+            params = params.items()
+        return telegram_id, path, tuple((str(key), str(value)) for key, value in params or ())
+
+    @staticmethod
+    async def _read_body(response: aiohttp.ClientResponse) -> Any:
+        if response.content_type == "application/json":
+            return await response.json()
+        return await response.text()
@@ -1,19 +1,47 @@
-import logging
 from aiogram import Bot, Dispatcher
 from aiogram.types import BotCommand
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 from telegram_bot import handlers
+from telegram_bot.cache import CachingTransport
+from telegram_bot.rendering import LIST_PREVIEW_LENGTH
+from telegram_bot.transport import create_transport
+from telegram_bot.storage import DatabaseStorage
+from telegram_bot.webhook import run_webhook
 
 from app.core.config import settings
+from app.core.logs import correlation_id, setup_logging
 
 TG_API_TOKEN = settings.TG_API_TOKEN  # API токен Telegram
 
 # Логирование
-logging.basicConfig(level=logging.INFO)
+setup_logging("bot")
+
+
+# Выбор хранилища состояний FSM по настройкам
+def create_storage() -> BaseStorage:
+    if settings.FSM_STORAGE == "database":
+        if settings.FSM_STORAGE_URL:
+            return DatabaseStorage.from_url(settings.FSM_STORAGE_URL)
+        from app.db.base import engine
+        return DatabaseStorage(engine)
+    return MemoryStorage()
+
 
 # Инициализация бота и диспетчера
 bot = Bot(token=TG_API_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+dp = Dispatcher(storage=create_storage())
+
+# Идентификатор корреляции для всех записей журнала при обработке одного обновления;
+# клиент бэкенда передает его в API заголовком X-Request-ID
+@dp.update.outer_middleware()
+async def correlation_middleware(handler, event, data):
+    token = correlation_id.set(f"tg-{event.update_id}")
+    try:
+        return await handler(event, data)
+    finally:
+        correlation_id.reset(token)
+
 
 # Регистрация хэндлеров
 # register_handlers(dp)
@@ -25,13 +53,27 @@ async def set_bot_commands(bot: Bot):
         BotCommand(command="/start", description="Начать работу"),
         BotCommand(command="/notes", description="Получить список заметок"),
         BotCommand(command="/newnote", description="Создать новую заметку"),
-        BotCommand(command="/findnote", description="Найти заметку по тегу")
+        BotCommand(command="/findnote", description="Найти заметку по тегу"),
+        BotCommand(command="/search", description="Найти заметку по тексту"),
+        BotCommand(command="/retag", description="Заменить тег во всех заметках")
     ]
     await bot.set_my_commands(commands)
 
 async def main():
     await set_bot_commands(bot)
-    await dp.start_polling(bot)
+    if isinstance(dp.storage, DatabaseStorage) and settings.FSM_STORAGE_URL:
+        # Отдельную БД состояний миграции приложения не создают: таблица создается при запуске
+        await dp.storage.create_table()
+    # Транспорт к бэкенду живет столько же, сколько бот, и закрывается при остановке
+    backend = create_transport()
+    if settings.BOT_NOTE_CACHE_SIZE:
+        # Кэшируются страницы ровно в том виде, в котором их запрашивают обработчики
+        backend = CachingTransport(backend, limit=handlers.NOTES_PAGE_SIZE, preview_length=LIST_PREVIEW_LENGTH)
+    async with backend:
+        if settings.BOT_MODE == "webhook":
+            await run_webhook(dp, bot, backend=backend)
+        else:
+            await dp.start_polling(bot, backend=backend)
 
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,287 @@
+# telegram_bot/cache.py
+"""Кэш заметок пользователей в памяти бота.
+
+CachingTransport оборачивает транспорт к бэкенду и хранит для каждого
+пользователя (LRU по telegram_id, не больше BOT_NOTE_CACHE_SIZE) первую
+страницу /notes и первые страницы недавних поисков по тегам - в том
+сокращенном виде (fields=summary), в котором их запрашивают обработчики.
+
+* Повторный /notes или поиск по тем же тегам отвечается из кэша.
+* Новый поиск по тегам отвечается пересечением множеств по индексу
+  тег -> заметки, если в кэше есть полный список, в котором заведомо лежат
+  все подходящие заметки: весь список заметок пользователя или результат
+  поиска по части тех же тегов, уместившиеся в одну страницу.
+* Заметка, созданная через бота, сразу добавляется во все подходящие
+  страницы (write-through) - следующий /notes ее покажет без запроса.
+* /retag (POST /notes/batch) сбрасывает записи пользователя.
+
+Записи пользователя живут BOT_NOTE_CACHE_TTL секунд с первого заполнения:
+столько бот может не видеть изменений, сделанных не через него (в API или
+другим экземпляром бота). Доля попаданий и оценка занимаемой памяти пишутся
+в журнал раз в BOT_NOTE_CACHE_LOG_INTERVAL секунд.
+"""
+import asyncio
+import logging
+import sys
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings as s
+from app.crud.note import normalize_tag_names
+from telegram_bot.backend import BackendResponse
+from telegram_bot.transport import BackendTransport
+
+logger = logging.getLogger(__name__)
+
+
+# Оценка памяти, занимаемой объектом вместе с вложенными контейнерами, в байтах
+def deep_sizeof(obj, seen: set = None) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+# Заметка из ответа на создание (NoteInDB) в виде элемента сокращенного списка (NoteSummary)
+def note_summary(note: dict, preview_length: int) -> dict:
+    return {
+        "id": note["id"],
+        "title": note["title"],
+        "preview": note["content"][:preview_length],
+        "truncated": len(note["content"]) > preview_length,
+        "created_at": note["created_at"],
+        "updated_at": note["updated_at"],
+        "tags": note["tags"],
+    }
+
+
+class UserNotes:
+    """Закэшированные страницы заметок одного пользователя.
+
+    Страница - id заметок в порядке API и курсор следующей страницы; сами
+    заметки хранятся один раз в notes, а tag_index (тег -> id заметок)
+    строится по ним же.
+    """
+
+    def __init__(self, max_searches: int, max_page_length: int):
+        self.max_searches = max_searches
+        self.max_page_length = max_page_length
+        self.notes: dict[int, dict] = {}
+        self.tag_index: dict[str, set[int]] = {}
+        self.list_page: Optional[tuple[list[int], Optional[str]]] = None
+        self.searches: OrderedDict[frozenset, tuple[list[int], Optional[str]]] = OrderedDict()
+
+    def _add_notes(self, notes: list[dict]) -> list[int]:
+        for note in notes:
+            self.notes[note["id"]] = note
+            for tag in note["tags"]:
+                self.tag_index.setdefault(tag["name"], set()).add(note["id"])
+        return [note["id"] for note in notes]
+
+    def page(self, page: tuple[list[int], Optional[str]]) -> dict:
+        note_ids, next_cursor = page
+        return {"items": [self.notes[note_id] for note_id in note_ids], "next_cursor": next_cursor}
+
+    def store_list(self, page: dict):
+        self.list_page = (self._add_notes(page["items"]), page["next_cursor"])
+
+    def store_search(self, tags: frozenset, page: dict):
+        self.searches[tags] = (self._add_notes(page["items"]), page["next_cursor"])
+        self.searches.move_to_end(tags)
+        while len(self.searches) > self.max_searches:
+            self.searches.popitem(last=False)
+
+    def find_search(self, tags: frozenset) -> Optional[tuple[list[int], Optional[str]]]:
+        page = self.searches.get(tags)
+        if page is not None:
+            self.searches.move_to_end(tags)
+        return page
+
+    # Поиск по тегам без бэкенда: пересечение индекса тегов с полным списком,
+    # в котором заведомо есть все подходящие заметки. Если результат не
+    # помещается в страницу, курсор для следующей взять негде - возвращается None.
+    def derive_search(self, tags: frozenset, limit: int) -> Optional[tuple[list[int], Optional[str]]]:
+        sources = [(frozenset(), self.list_page)]
+        sources += [(source_tags, page) for source_tags, page in self.searches.items() if source_tags < tags]
+        for source_tags, page in sources:
+            if page is None or page[1] is not None:
+                continue
+            matching = set(page[0]).intersection(*(self.tag_index.get(tag, ()) for tag in tags - source_tags))
+            if len(matching) <= limit:
+                # Порядок - как в исходном списке (новые заметки первыми)
+                return [note_id for note_id in page[0] if note_id in matching], None
+        return None
+
+    # Новая заметка - самая свежая, поэтому встает первой во все страницы, куда подходит.
+    # Переросшие страницы сбрасываются, чтобы запись пользователя не росла без предела.
+    def add_created(self, note: dict):
+        note_id, = self._add_notes([note])
+        note_tags = {tag["name"] for tag in note["tags"]}
+        if self.list_page is not None:
+            self.list_page = self._prepend(note_id, self.list_page)
+        for tags, page in list(self.searches.items()):
+            if tags <= note_tags:
+                page = self._prepend(note_id, page)
+                if page is None:
+                    del self.searches[tags]
+                else:
+                    self.searches[tags] = page
+
+    def _prepend(self, note_id: int, page: tuple[list[int], Optional[str]]):
+        note_ids, next_cursor = page
+        if len(note_ids) >= self.max_page_length:
+            return None
+        return [note_id, *note_ids], next_cursor
+
+
+class CachingTransport(BackendTransport):
+    """Транспорт с кэшем заметок пользователей поверх другого транспорта.
+
+    Кэшируются только первые страницы с теми limit и preview_length, с
+    которыми их запрашивают обработчики; остальные запросы идут напрямую.
+    """
+
+    def __init__(
+            self,
+            transport: BackendTransport,
+            limit: int,
+            preview_length: int,
+            size: int = s.BOT_NOTE_CACHE_SIZE,
+            ttl: float = s.BOT_NOTE_CACHE_TTL,
+            max_searches: int = s.BOT_NOTE_CACHE_SEARCHES,
+            log_interval: float = s.BOT_NOTE_CACHE_LOG_INTERVAL,
+    ):
+        self.transport = transport
+        self.limit = limit
+        self.preview_length = preview_length
+        self.max_searches = max_searches
+        self.log_interval = log_interval
+        self._users = TTLCache(maxsize=size, ttl=ttl)
+        self.hits = 0  # Ответ из кэша как есть
+        self.local_hits = 0  # Поиск, посчитанный по кэшу пересечением тегов
+        self.misses = 0
+        self._logged_requests = 0
+        self._stats_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.transport.start()
+        if self.log_interval and self._stats_task is None:
+            self._stats_task = asyncio.create_task(self._log_stats_loop())
+        return self
+
+    async def close(self):
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+            self._stats_task = None
+        self.log_stats()
+        await self.transport.close()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.local_hits + self.misses
+        return {
+            "users": len(self._users),
+            "hits": self.hits,
+            "local_hits": self.local_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.local_hits) / requests, 4) if requests else 0.0,
+            "bytes": deep_sizeof(self._users.values()),
+        }
+
+    def log_stats(self):
+        requests = self.hits + self.local_hits + self.misses
+        if requests != self._logged_requests:
+            self._logged_requests = requests
+            logger.info("Note cache stats", extra=self.stats())
+
+    async def _log_stats_loop(self):
+        while True:
+            await asyncio.sleep(self.log_interval)
+            self.log_stats()
+
+    def _cacheable(self, limit: int, cursor: Optional[str], preview_length: Optional[int]) -> bool:
+        return cursor is None and limit == self.limit and preview_length == self.preview_length
+
+    # Запись пользователя; новая заводится при первом заполнении и не продлевается последующими
+    def _user_notes(self, telegram_id: int) -> UserNotes:
+        user_notes = self._users.get(telegram_id)
+        if user_notes is None:
+            user_notes = UserNotes(self.max_searches, max_page_length=2 * self.limit)
+            self._users.set(telegram_id, user_notes)
+        return user_notes
+
+    async def list_notes(self, telegram_id, limit, cursor=None, preview_length=None):
+        if not self._cacheable(limit, cursor, preview_length):
+            return await self.transport.list_notes(telegram_id, limit, cursor, preview_length)
+
+        user_notes = self._users.get(telegram_id)
+        if user_notes is not None and user_notes.list_page is not None:
+            self.hits += 1
+            return BackendResponse(200, user_notes.page(user_notes.list_page))
+
+        self.misses += 1
+        response = await self.transport.list_notes(telegram_id, limit, cursor, preview_length)
+        if response.status == 200:
+            self._user_notes(telegram_id).store_list(response.data)
+        return response
+
+    async def search_notes(self, telegram_id, tags, limit, cursor=None, preview_length=None):
+        # Теги приводятся к тому виду, в котором их сравнивает бэкенд
+        key = frozenset(normalize_tag_names(tags))
+        if not key or not self._cacheable(limit, cursor, preview_length):
+            return await self.transport.search_notes(telegram_id, tags, limit, cursor, preview_length)
+
+        user_notes = self._users.get(telegram_id)
+        if user_notes is not None:
+            page = user_notes.find_search(key)
+            if page is not None:
+                self.hits += 1
+                return BackendResponse(200, user_notes.page(page))
+            page = user_notes.derive_search(key, limit)
+            if page is not None:
+                self.local_hits += 1
+                user_notes.store_search(key, user_notes.page(page))
+                return BackendResponse(200, user_notes.page(page))
+
+        self.misses += 1
+        response = await self.transport.search_notes(telegram_id, tags, limit, cursor, preview_length)
+        if response.status == 200:
+            self._user_notes(telegram_id).store_search(key, response.data)
+        return response
+
+    async def create_note(self, telegram_id, title, content, tags):
+        response = await self.transport.create_note(telegram_id, title, content, tags)
+        user_notes = self._users.get(telegram_id)
+        if response.status == 201 and user_notes is not None:
+            user_notes.add_created(note_summary(response.data, self.preview_length))
+        return response
+
+    async def batch_notes(self, telegram_id, operations):
+        try:
+            return await self.transport.batch_notes(telegram_id, operations)
+        finally:
+            # Пакет мог изменить любые заметки пользователя, даже если ответ не дошел
+            self._users.delete(telegram_id)
+
+    async def login_telegram(self, telegram_id):
+        return await self.transport.login_telegram(telegram_id)
+
+    async def register_telegram(self, telegram_id):
+        return await self.transport.register_telegram(telegram_id)
+
+    async def fulltext_search(self, telegram_id, q, limit):
+        return await self.transport.fulltext_search(telegram_id, q, limit)
+
+    async def get_note(self, telegram_id, note_id):
+        return await self.transport.get_note(telegram_id, note_id)
+
+    async def list_tags(self, telegram_id, limit, prefix=None):
+        return await self.transport.list_tags(telegram_id, limit, prefix)
@@ -1,16 +1,29 @@
 # telegram_bot/handlers.py
-from aiogram import Router, types
-from aiogram.filters import Command
+import asyncio
+import html
+import logging
+from functools import partial
+
+import aiohttp
+from aiogram import F, Router, types
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
+from sqlalchemy.exc import SQLAlchemyError
 
-import aiohttp
 from typer.cli import state
 
-from app.core.config import settings as s
 from telegram_bot.auth import authorize_user
+from telegram_bot.transport import BackendTransport
+from telegram_bot.rendering import LIST_PREVIEW_LENGTH, MESSAGE_LIMIT, format_tags, pack_notes, split_text
 
 router = Router()
+logger = logging.getLogger(__name__)
+
+NOTES_PAGE_SIZE = 10  # Сколько заметок запрашивать у бэкенда за одну страницу
+QUICK_TAGS_LIMIT = 6  # Сколько самых используемых тегов предлагать кнопками при вводе тегов
+RETAG_SEARCH_PAGE_SIZE = 100  # Страница поиска при сборе заметок для /retag (максимум API)
+RETAG_BATCH_SIZE = 500  # Операций в одном запросе POST /notes/batch
 
 
 # Определение состояний для FSM
@@ -19,14 +32,15 @@ class NoteForm(StatesGroup):
     waiting_for_content = State()  # состояние для ввода содержания заметки
     waiting_for_tags = State()  # состояние для ввода тегов к заметке
     searching_by_tags = State()  # состояние для поиска заметок по тегам
+    searching_by_text = State()  # состояние для полнотекстового поиска заметок
 
 
 # Обработчик команды /start
 @router.message(Command("start"))
-async def start(message: types.Message):
-    user = await authorize_user(message.from_user.id)
+async def start(message: types.Message, backend: BackendTransport):
+    user = await authorize_user(backend, message.from_user.id)
 
-    print(f"\n{user=}\n")
+    logger.debug("User authorization checked", extra={"registered": user is not None})
     if user:
         # Пользователь найден, авторизован
         await message.answer(f"Привет, {user['telegram_id']}!\n"
@@ -34,50 +48,139 @@ async def start(message: types.Message):
                              f"Команды по работе с заметками доступны в 'Меню'.")
     else:
         # Пользователь не найден, выполняем регистрацию
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                    f"http://{s.BACKEND_HOST}:{s.BACKEND_PORT}/auth/register/telegram",
-                    headers={"Telegram-ID": str(message.from_user.id)}) as response:
-
-                print(f"\n{response=}\n")
-                print(f"{await response.text()=}")  # Выводим тело ответа для диагностики
-
-                if response.status == 200:
-                    # Пользователь успешно зарегистрирован
-                    await message.answer("Поздравляем, Вы зарегистрировались в приложении 'Мои заметки'! "
-                                         "Команды по работе с заметками доступны в 'Меню'.")
-                else:
-                    await message.answer("Произошла ошибка при регистрации. Попробуйте снова позже.")
+        response = await backend.register_telegram(message.from_user.id)
+
+        logger.info("User registration finished", extra={"status": response.status})
+
+        if response.status == 200:
+            # Пользователь успешно зарегистрирован
+            await message.answer("Поздравляем, Вы зарегистрировались в приложении 'Мои заметки'! "
+                                 "Команды по работе с заметками доступны в 'Меню'.")
+        else:
+            await message.answer("Произошла ошибка при регистрации. Попробуйте снова позже.")
+
+
+# Клавиатура быстрого ответа с самыми используемыми тегами пользователя: нажатие
+# отправляет имя тега как обычное сообщение. extra - дополнительные кнопки в конце.
+# Если предложить нечего (или каталог тегов недоступен), возвращает None.
+async def quick_tags_keyboard(backend: BackendTransport, telegram_id: int, extra: tuple = ()):
+    try:
+        response = await backend.list_tags(telegram_id, QUICK_TAGS_LIMIT)
+    except (aiohttp.ClientError, asyncio.TimeoutError, SQLAlchemyError):
+        # Клавиатура - только подсказка: без нее диалог продолжается обычным вводом
+        logger.warning("Quick tags are unavailable", exc_info=True)
+        return None
+    names = [tag["name"] for tag in response.data] if response.status == 200 else []
+    if not names:
+        return None
+    buttons = [types.KeyboardButton(text=name) for name in [*names, *extra]]
+    return types.ReplyKeyboardMarkup(
+        keyboard=[buttons[index:index + 3] for index in range(0, len(buttons), 3)],
+        resize_keyboard=True, one_time_keyboard=True,
+        input_field_placeholder="Теги через запятую",
+    )
 
 
 # Вспомогательная функция для отображения списка заметок
-async def display_notes(notes: list, message: types.Message):
-    """Отображение списка заметок в сообщениях Telegram."""
-    for note in notes:
-        tags_list = [tag['name'] for tag in note['tags']]
-        tags_str = ', '.join(tags_list) if tags_list else 'нет'
-        await message.answer(
-            f"Заметка: {note['title']}\n"
-            f"{note['content']}\n"
-            f"Теги: {tags_str}"
-        )
+async def display_notes(notes: list, message: types.Message, bodies_html: list = None,
+                        extra_buttons: list = None):
+    """Отображение списка заметок в минимальном числе сообщений Telegram.
+
+    Заметки упаковываются в сообщения до 4096 символов, длинное содержание
+    сворачивается до превью с кнопкой загрузки полного текста. Дополнительные
+    кнопки (например, "Следующая страница") прикрепляются к последнему сообщению.
+    """
+    messages = pack_notes(notes, bodies_html)
+    for index, chunk in enumerate(messages):
+        rows = [[button] for button in chunk.buttons]
+        if extra_buttons and index == len(messages) - 1:
+            rows.append(extra_buttons)
+        keyboard = types.InlineKeyboardMarkup(inline_keyboard=rows) if rows else None
+        await message.answer(chunk.text, parse_mode="HTML", reply_markup=keyboard)
+
+
+# Вспомогательная функция для отображения одной страницы заметок;
+# fetch_page(cursor) запрашивает страницу у бэкенда
+async def display_notes_page(
+        message: types.Message,
+        fetch_page,
+        callback_prefix: str,
+        cursor: str = None,
+        empty_text: str = "У вас нет заметок.",
+        error_text: str = "Ошибка при получении заметок.",
+):
+    response = await fetch_page(cursor)
+    if response.status != 200:
+        await message.answer(error_text)
+        return
+
+    page = response.data
+    if not page["items"]:
+        await message.answer(empty_text)
+        return
+
+    # Если есть следующая страница, предлагаем загрузить ее по кнопке
+    extra_buttons = None
+    if page["next_cursor"]:
+        extra_buttons = [types.InlineKeyboardButton(
+            text="Следующая страница »", callback_data=f"{callback_prefix}:{page['next_cursor']}")]
+
+    await display_notes(page["items"], message, extra_buttons=extra_buttons)
 
 
 # Получение списка заметок
 @router.message(Command("notes"))
-async def get_notes(message: types.Message):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"http://{s.BACKEND_HOST}:{s.BACKEND_PORT}/notes",
-                               headers={"Telegram-ID": str(message.from_user.id)}) as response:
-
-            if response.status == 200:
-                notes = await response.json()
-                if notes:
-                    await display_notes(notes, message)  # Используем вспомогательную функцию
-                else:
-                    await message.answer("У вас нет заметок.")
-            else:
-                await message.answer("Ошибка при получении заметок.")
+async def get_notes(message: types.Message, backend: BackendTransport):
+    await display_notes_page(
+        message, partial(backend.list_notes, message.from_user.id, NOTES_PAGE_SIZE,
+                         preview_length=LIST_PREVIEW_LENGTH), "notes")
+
+
+# Удаление отработавшей кнопки "Следующая страница" с сохранением кнопок заметок
+async def drop_next_page_button(callback: types.CallbackQuery):
+    markup = callback.message.reply_markup
+    rows = [row for row in (markup.inline_keyboard if markup else [])
+            if not any(button.callback_data == callback.data for button in row)]
+    await callback.message.edit_reply_markup(
+        reply_markup=types.InlineKeyboardMarkup(inline_keyboard=rows) if rows else None)
+
+
+# Загрузка следующей страницы списка заметок по кнопке
+@router.callback_query(F.data.startswith("notes:"))
+async def get_notes_next_page(callback: types.CallbackQuery, backend: BackendTransport):
+    cursor = callback.data.split(":", 1)[1]
+    await callback.answer()
+    await drop_next_page_button(callback)
+    await display_notes_page(
+        callback.message, partial(backend.list_notes, callback.from_user.id, NOTES_PAGE_SIZE,
+                                  preview_length=LIST_PREVIEW_LENGTH),
+        "notes", cursor=cursor)
+
+
+# Загрузка полного текста одной заметки по кнопке из списка
+@router.callback_query(F.data.startswith("note:"))
+async def get_full_note(callback: types.CallbackQuery, backend: BackendTransport):
+    note_id = int(callback.data.split(":", 1)[1])
+    response = await backend.get_note(callback.from_user.id, note_id)
+    await callback.answer()
+
+    if response.status != 200:
+        await callback.message.answer("Не удалось загрузить заметку.")
+        return
+
+    note = response.data
+    text = (f"<b>{html.escape(note['title'])}</b>\n"
+            f"{html.escape(note['content'])}\n"
+            f"<i>Теги: {format_tags(note)}</i>")
+    if len(text) <= MESSAGE_LIMIT:
+        await callback.message.answer(text, parse_mode="HTML")
+        return
+
+    # Очень длинная заметка: заголовок отдельно, содержание - простым текстом по частям
+    await callback.message.answer(f"<b>{html.escape(note['title'][:MESSAGE_LIMIT // 2])}</b>\n"
+                                  f"<i>Теги: {format_tags(note)}</i>", parse_mode="HTML")
+    for part in split_text(note['content']):
+        await callback.message.answer(part)
 
 
 # Создание новой заметки (состояние FSM)
@@ -95,15 +198,16 @@ async def note_title_received(message: types.Message, state: FSMContext):
 
 
 @router.message(NoteForm.waiting_for_content)
-async def note_content_received(message: types.Message, state: FSMContext):
+async def note_content_received(message: types.Message, state: FSMContext, backend: BackendTransport):
     await state.update_data(content=message.text)
     await message.answer(
-        "Теперь введите теги для заметки (через запятую) или введите 'нет', если теги не нужны.")
+        "Теперь введите теги для заметки (через запятую) или введите 'нет', если теги не нужны.",
+        reply_markup=await quick_tags_keyboard(backend, message.from_user.id, extra=("нет",)))
     await state.set_state(NoteForm.waiting_for_tags)
 
 
 @router.message(NoteForm.waiting_for_tags)
-async def note_tags_received(message: types.Message, state: FSMContext):
+async def note_tags_received(message: types.Message, state: FSMContext, backend: BackendTransport):
     data = await state.get_data()
     title = data['title']
     content = data['content']
@@ -115,50 +219,129 @@ async def note_tags_received(message: types.Message, state: FSMContext):
         # Разбиваем строку на теги, убираем лишние пробелы
         tags = [tag.strip() for tag in tags_input.split(",")]
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-                f"http://{s.BACKEND_HOST}:{s.BACKEND_PORT}/notes",
-                json={"title": title, "content": content, "tags": tags},
-                headers={"Telegram-ID": str(message.from_user.id)}) as response:
+    response = await backend.create_note(message.from_user.id, title, content, tags)
 
-            print(f"Response status: {response.status}")
-            print(f"Response text: {await response.text()}")  # Выводим тело ответа для отладки
+    # Тело ответа не журналируем: в нем текст заметки пользователя
+    logger.debug("Note creation finished", extra={"status": response.status})
 
-            if response.status == 201:
-                await message.answer("Заметка успешно создана!")
-            else:
-                await message.answer("Ошибка при создании заметки.")
+    if response.status == 201:
+        await message.answer("Заметка успешно создана!", reply_markup=types.ReplyKeyboardRemove())
+    else:
+        await message.answer("Ошибка при создании заметки.", reply_markup=types.ReplyKeyboardRemove())
 
     await state.clear()
 
 
 # Поиск заметок по тегам
 @router.message(Command("findnote"))
-async def find_note_by_tag(message: types.Message, state: FSMContext):
-    await message.answer("Введите теги для поиска (через запятую).")
+async def find_note_by_tag(message: types.Message, state: FSMContext, backend: BackendTransport):
+    await message.answer("Введите теги для поиска (через запятую).",
+                         reply_markup=await quick_tags_keyboard(backend, message.from_user.id))
     await state.set_state(NoteForm.searching_by_tags)
 
 
 # Обработчик для ввода тегов
 @router.message(NoteForm.searching_by_tags)
-async def handle_tags_input(message: types.Message, state: FSMContext):
+async def handle_tags_input(message: types.Message, state: FSMContext, backend: BackendTransport):
     tags_input = message.text.strip()
     tags = [tag.strip() for tag in tags_input.split(",")]  # Разбиваем строку на теги
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            f"http://{s.BACKEND_HOST}:{s.BACKEND_PORT}/notes/search",
-            params={"tags": tags},  # Передаем теги в параметрах запроса
-            headers={"Telegram-ID": str(message.from_user.id)}
-        ) as response:
-            if response.status == 200:
-                notes = await response.json()
-                if notes:
-                    await display_notes(notes, message)  # Используем вспомогательную функцию
-                else:
-                    await message.answer("Заметки с такими тегами не найдены.")
-            else:
-                await message.answer("Ошибка при поиске заметок.")
-
-    # Завершаем состояние после поиска
-    await state.clear()
\ No newline at end of file
+    # Завершаем состояние поиска, но запоминаем теги для загрузки следующих страниц
+    await state.clear()
+    await state.update_data(search_tags=tags)
+
+    await display_notes_page(
+        message, partial(backend.search_notes, message.from_user.id, tags, NOTES_PAGE_SIZE,
+                         preview_length=LIST_PREVIEW_LENGTH), "search",
+        empty_text="Заметки с такими тегами не найдены.",
+        error_text="Ошибка при поиске заметок.")
+
+
+# Загрузка следующей страницы результатов поиска по кнопке
+@router.callback_query(F.data.startswith("search:"))
+async def search_notes_next_page(callback: types.CallbackQuery, state: FSMContext,
+                                 backend: BackendTransport):
+    cursor = callback.data.split(":", 1)[1]
+    tags = (await state.get_data()).get("search_tags")
+    await callback.answer()
+    await drop_next_page_button(callback)
+
+    if not tags:
+        await callback.message.answer("Поиск устарел, выполните /findnote еще раз.")
+        return
+
+    await display_notes_page(
+        callback.message, partial(backend.search_notes, callback.from_user.id, tags, NOTES_PAGE_SIZE,
+                                  preview_length=LIST_PREVIEW_LENGTH),
+        "search", cursor=cursor,
+        empty_text="Заметки с такими тегами не найдены.",
+        error_text="Ошибка при поиске заметок.")
+
+
+
+# Полнотекстовый поиск по заголовкам и содержанию заметок
+@router.message(Command("search"))
+async def find_note_by_text(message: types.Message, state: FSMContext):
+    await message.answer("Введите слова для поиска по тексту заметок.")
+    await state.set_state(NoteForm.searching_by_text)
+
+
+# Обработчик для ввода поискового запроса
+@router.message(NoteForm.searching_by_text)
+async def handle_text_query_input(message: types.Message, state: FSMContext, backend: BackendTransport):
+    await state.clear()
+
+    response = await backend.fulltext_search(message.from_user.id, message.text.strip(), NOTES_PAGE_SIZE)
+    if response.status != 200:
+        await message.answer("Ошибка при поиске заметок.")
+        return
+
+    results = response.data
+    if not results:
+        await message.answer("Заметки по такому запросу не найдены.")
+        return
+
+    # Фрагменты приходят с бэкенда уже экранированными, с подсветкой совпадений тегами <b>
+    await display_notes(results, message, bodies_html=[note['snippet'] for note in results])
+
+
+# Массовая замена тега во всех заметках: /retag старый, новый.
+# Заметки со старым тегом собираются постранично, затем меняются пакетами
+# POST /notes/batch - один запрос и одна транзакция на RETAG_BATCH_SIZE заметок.
+@router.message(Command("retag"))
+async def retag_notes(message: types.Message, command: CommandObject, backend: BackendTransport):
+    names = [tag.strip() for tag in (command.args or "").split(",")]
+    if len(names) != 2 or not all(names):
+        await message.answer("Укажите старый и новый тег через запятую: /retag старый, новый")
+        return
+    old_tag, new_tag = names
+
+    note_ids, cursor = [], None
+    while True:
+        # Нужны только id: содержание не запрашиваем
+        response = await backend.search_notes(message.from_user.id, [old_tag], RETAG_SEARCH_PAGE_SIZE, cursor,
+                                              preview_length=1)
+        if response.status != 200:
+            await message.answer("Ошибка при поиске заметок.")
+            return
+        note_ids += [note["id"] for note in response.data["items"]]
+        cursor = response.data["next_cursor"]
+        if not cursor:
+            break
+
+    if not note_ids:
+        await message.answer(f"Заметки с тегом «{old_tag}» не найдены.")
+        return
+
+    updated = 0
+    for start in range(0, len(note_ids), RETAG_BATCH_SIZE):
+        operations = [{"op": "update", "id": note_id, "add_tags": [new_tag], "remove_tags": [old_tag]}
+                      for note_id in note_ids[start:start + RETAG_BATCH_SIZE]]
+        response = await backend.batch_notes(message.from_user.id, operations)
+        if response.status != 200:
+            logger.warning("Retag batch failed", extra={"status": response.status})
+            await message.answer(f"Ошибка при изменении тегов. Обновлено заметок: {updated}.")
+            return
+        updated += sum(result["status"] == "updated" for result in response.data["results"])
+
+    await message.answer(f"Тег «{old_tag}» заменен на «{new_tag}» в заметках: {updated}.")
@@ -0,0 +1,111 @@
+# telegram_bot/rendering.py
+import html
+
+from aiogram import types
+
+MESSAGE_LIMIT = 4096  # Максимальная длина текста одного сообщения Telegram
+PREVIEW_LENGTH = 300  # Длина превью содержания заметки в списке
+# Длина превью, запрашиваемого у бэкенда для списков: на символ больше PREVIEW_LENGTH,
+# чтобы по нему было видно, что содержание не помещается и его надо свернуть
+LIST_PREVIEW_LENGTH = PREVIEW_LENGTH + 1
+TITLE_LENGTH = 200  # Длина заголовка в списке
+BUTTON_TITLE_LENGTH = 30  # Длина заголовка на кнопке "открыть заметку"
+TAGS_LENGTH = 1000  # Длина строки тегов (HTML): заметка с экранированными заголовком и превью умещается в сообщение
+NOTE_SEPARATOR = "\n\n"
+
+
+# Обрезка текста до заданной длины с многоточием
+def truncate(text: str, length: int) -> tuple[str, bool]:
+    text = text or ""
+    if len(text) <= length:
+        return text, False
+    return text[:length - 1].rstrip() + "…", True
+
+
+# Форматирование строки тегов заметки не длиннее length символов HTML;
+# не поместившиеся теги заменяются их числом
+def format_tags(note: dict, length: int = TAGS_LENGTH) -> str:
+    names = [html.escape(tag['name']) for tag in note['tags']]
+    text = ', '.join(names)
+    if len(text) <= length:
+        return text or 'нет'
+    rest = f"… и еще {len(names)}"  # Самый длинный вариант хвоста
+    shown = []
+    used = 0
+    for name in names:
+        used += len(name) + len(', ')
+        if used + len(rest) > length:
+            break
+        shown.append(name)
+    return ', '.join([*shown, f"… и еще {len(names) - len(shown)}"])
+
+
+# HTML-блок одной заметки для списка; body_html - готовый безопасный HTML вместо превью
+def format_note(note: dict, body_html: str = None) -> tuple[str, bool]:
+    title, _ = truncate(note['title'], TITLE_LENGTH)
+    collapsed = body_html is not None  # Готовый фрагмент - это всегда часть заметки
+    if body_html is None:
+        # В сокращенном списке вместо содержания приходит его начало (preview)
+        content = note['content'] if 'content' in note else note['preview']
+        preview, collapsed = truncate(content, PREVIEW_LENGTH)
+        body_html = html.escape(preview)
+    block = (f"<b>{html.escape(title)}</b>\n"
+             f"{body_html}\n"
+             f"<i>Теги: {format_tags(note)}</i>")
+    return block, collapsed
+
+
+# Кнопка загрузки полного текста заметки
+def full_note_button(note: dict) -> types.InlineKeyboardButton:
+    title, _ = truncate(note['title'], BUTTON_TITLE_LENGTH)
+    return types.InlineKeyboardButton(text=f"📄 {title}", callback_data=f"note:{note['id']}")
+
+
+class NoteListMessage:
+    """Текст одного сообщения со списком заметок и кнопками к нему."""
+
+    def __init__(self):
+        self.blocks: list[str] = []
+        self.buttons: list[types.InlineKeyboardButton] = []
+        self.length = 0
+
+    def fits(self, block: str) -> bool:
+        extra = len(NOTE_SEPARATOR) if self.blocks else 0
+        return self.length + extra + len(block) <= MESSAGE_LIMIT
+
+    def add(self, block: str, button: types.InlineKeyboardButton = None):
+        self.length += (len(NOTE_SEPARATOR) if self.blocks else 0) + len(block)
+        self.blocks.append(block)
+        if button:
+            self.buttons.append(button)
+
+    @property
+    def text(self) -> str:
+        return NOTE_SEPARATOR.join(self.blocks)
+
+
+# Упаковка списка заметок в минимальное число сообщений не длиннее MESSAGE_LIMIT.
+# Для заметок со свернутым содержанием добавляются кнопки "открыть полностью".
+def pack_notes(notes: list, bodies_html: list = None) -> list[NoteListMessage]:
+    messages = [NoteListMessage()]
+    for index, note in enumerate(notes):
+        block, collapsed = format_note(note, bodies_html[index] if bodies_html else None)
+        # Пустое сообщение Telegram не примет: первый блок всегда остается в текущем
+        if messages[-1].blocks and not messages[-1].fits(block):
+            messages.append(NoteListMessage())
+        messages[-1].add(block, full_note_button(note) if collapsed else None)
+    return messages
+
+
+# Разбиение длинного простого текста на части не длиннее limit, по возможности по строкам
+def split_text(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        parts.append(text)
+    return parts
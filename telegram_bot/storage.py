@@ -0,0 +1,164 @@
+# telegram_bot/storage.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.core.cache import TTLCache
+from app.core.config import settings as s
+from app.models.fsm import FSMRecord
+
+logger = logging.getLogger(__name__)
+
+fsm_states = FSMRecord.__table__
+
+# Пустая запись: состояние не задано, данных нет
+EMPTY_RECORD = (None, {})
+
+
+class DatabaseStorage(BaseStorage):
+    """Хранилище состояний FSM в базе данных, общее для нескольких экземпляров бота.
+
+    Записи пишутся пачками фоновой задачей раз в flush_interval секунд и
+    дополнительно кэшируются в памяти процесса на cache_ttl секунд. Пока
+    запись не сброшена или лежит в кэше, другой экземпляр бота может увидеть
+    ее прежнюю версию, поэтому оба интервала должны быть заметно меньше паузы
+    между сообщениями пользователя. Брошенные диалоги удаляются через state_ttl.
+    Работает с PostgreSQL и с SQLite (для тестов).
+    """
+
+    def __init__(
+            self,
+            engine: AsyncEngine,
+            key_builder: Optional[KeyBuilder] = None,
+            state_ttl: float = s.FSM_STATE_TTL,
+            cache_ttl: float = s.FSM_CACHE_TTL,
+            cache_size: int = s.FSM_CACHE_SIZE,
+            flush_interval: float = s.FSM_FLUSH_INTERVAL,
+            cleanup_interval: float = s.FSM_CLEANUP_INTERVAL,
+            dispose_engine: bool = False,
+    ):
+        self.engine = engine
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.state_ttl = timedelta(seconds=state_ttl)
+        self.flush_interval = flush_interval
+        self.cleanup_interval = cleanup_interval
+        self.dispose_engine = dispose_engine
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._dirty: dict[str, tuple[Optional[str], Dict[str, Any]]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_cleanup = datetime.utcnow()
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "DatabaseStorage":
+        return cls(create_async_engine(url), dispose_engine=True, **kwargs)
+
+    async def create_table(self):
+        # Для отдельной БД состояний (FSM_STORAGE_URL) и тестов; в БД приложения таблицу создает миграция
+        async with self.engine.begin() as conn:
+            await conn.run_sync(fsm_states.create, checkfirst=True)
+
+    async def _get_record(self, key: str) -> tuple[Optional[str], Dict[str, Any]]:
+        if key in self._dirty:
+            return self._dirty[key]
+        record = self._cache.get(key)
+        if record is not None:
+            return record
+
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(fsm_states.c.state, fsm_states.c.data)
+                .where(fsm_states.c.key == key)
+                .where(fsm_states.c.expires_at > datetime.utcnow())
+            )
+            row = result.first()
+        record = (row.state, dict(row.data or {})) if row else EMPTY_RECORD
+        self._cache.set(key, record)
+        return record
+
+    def _put_record(self, key: str, record: tuple[Optional[str], Dict[str, Any]]):
+        self._dirty[key] = record
+        self._cache.set(key, record)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        db_key = self.key_builder.build(key)
+        _, data = await self._get_record(db_key)
+        self._put_record(db_key, (state.state if isinstance(state, State) else state, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._get_record(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        db_key = self.key_builder.build(key)
+        state, _ = await self._get_record(db_key)
+        self._put_record(db_key, (state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._get_record(self.key_builder.build(key))
+        return data.copy()
+
+    def _upsert(self, rows: list[dict]):
+        insert = pg_insert if self.engine.dialect.name == "postgresql" else sqlite_insert
+        stmt = insert(fsm_states).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[fsm_states.c.key],
+            set_={
+                "state": stmt.excluded.state,
+                "data": stmt.excluded.data,
+                "expires_at": stmt.excluded.expires_at,
+            },
+        )
+
+    # Сброс накопленных изменений в БД одним запросом
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        expires_at = datetime.utcnow() + self.state_ttl
+        rows = [{"key": key, "state": state, "data": data, "expires_at": expires_at}
+                for key, (state, data) in dirty.items()]
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(self._upsert(rows))
+        except Exception:
+            # Возвращаем изменения в очередь, не затирая более свежие
+            self._dirty = {**dirty, **self._dirty}
+            raise
+
+    # Удаление брошенных диалогов
+    async def cleanup(self):
+        async with self.engine.begin() as conn:
+            await conn.execute(delete(fsm_states).where(fsm_states.c.expires_at <= datetime.utcnow()))
+        self._last_cleanup = datetime.utcnow()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if (datetime.utcnow() - self._last_cleanup).total_seconds() >= self.cleanup_interval:
+                    await self.cleanup()
+            except Exception:
+                logger.exception("Failed to flush FSM states")
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        if self.dispose_engine:
+            await self.engine.dispose()
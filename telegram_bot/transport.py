@@ -0,0 +1,238 @@
+# telegram_bot/transport.py
+"""Транспорт бота к бэкенду.
+
+HttpTransport ходит в API по HTTP и подходит для раздельного развертывания.
+DirectTransport вызывает app.crud напрямую в процессе бота, с сессией из
+AsyncSessionLocal, и избавляет от сетевого вызова и двойного (де)кодирования
+JSON, когда бот и API развернуты вместе. Выбирается настройкой BOT_TRANSPORT.
+Оба транспорта возвращают BackendResponse с теми же кодами и данными, что и API.
+"""
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from pydantic import ValidationError
+
+from app.core.cache import principal_cache
+from app.core.config import settings as s
+from app.crud import note as note_crud
+from app.crud import user as user_crud
+from app.db.base import AsyncSessionLocal
+from app.schemas.note import (NoteBatchRequest, NoteBatchResult, NoteCreate, NoteInDB, NotePage, NoteSearchResult,
+                              NoteSummaryPage, TagCount)
+from app.schemas.user import UserInDB
+from telegram_bot.backend import BackendClient, BackendResponse
+
+
+class BackendTransport(ABC):
+    async def start(self):
+        return self
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @abstractmethod
+    async def login_telegram(self, telegram_id: int) -> BackendResponse: ...
+
+    @abstractmethod
+    async def register_telegram(self, telegram_id: int) -> BackendResponse: ...
+
+    # С preview_length возвращается сокращенный список (fields=summary): превью вместо содержания
+    @abstractmethod
+    async def list_notes(self, telegram_id: int, limit: int, cursor: Optional[str] = None,
+                         preview_length: Optional[int] = None) -> BackendResponse: ...
+
+    @abstractmethod
+    async def search_notes(self, telegram_id: int, tags: List[str], limit: int, cursor: Optional[str] = None,
+                           preview_length: Optional[int] = None) -> BackendResponse: ...
+
+    @abstractmethod
+    async def fulltext_search(self, telegram_id: int, q: str, limit: int) -> BackendResponse: ...
+
+    @abstractmethod
+    async def get_note(self, telegram_id: int, note_id: int) -> BackendResponse: ...
+
+    @abstractmethod
+    async def create_note(self, telegram_id: int, title: str, content: str,
+                          tags: List[str]) -> BackendResponse: ...
+
+    # Теги пользователя с числом заметок, самые используемые первыми
+    @abstractmethod
+    async def list_tags(self, telegram_id: int, limit: int, prefix: Optional[str] = None) -> BackendResponse: ...
+
+    # operations - операции в формате POST /notes/batch
+    @abstractmethod
+    async def batch_notes(self, telegram_id: int, operations: List[dict]) -> BackendResponse: ...
+
+
+class HttpTransport(BackendTransport):
+    def __init__(self, client: BackendClient = None):
+        self.client = client or BackendClient()
+
+    async def start(self):
+        await self.client.start()
+        return self
+
+    async def close(self):
+        await self.client.close()
+
+    async def login_telegram(self, telegram_id):
+        return await self.client.post("/auth/login/telegram", telegram_id)
+
+    async def register_telegram(self, telegram_id):
+        return await self.client.post("/auth/register/telegram", telegram_id)
+
+    async def list_notes(self, telegram_id, limit, cursor=None, preview_length=None):
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        if preview_length:
+            params.update(fields="summary", preview_length=preview_length)
+        return await self.client.get("/notes/", telegram_id, params=params)
+
+    async def search_notes(self, telegram_id, tags, limit, cursor=None, preview_length=None):
+        params = [("tags", tag) for tag in tags] + [("limit", limit)]
+        if cursor:
+            params.append(("cursor", cursor))
+        if preview_length:
+            params += [("fields", "summary"), ("preview_length", preview_length)]
+        return await self.client.get("/notes/search", telegram_id, params=params)
+
+    async def fulltext_search(self, telegram_id, q, limit):
+        return await self.client.get("/notes/fulltext", telegram_id, params={"q": q, "limit": limit})
+
+    async def get_note(self, telegram_id, note_id):
+        return await self.client.get(f"/notes/{note_id}", telegram_id)
+
+    async def create_note(self, telegram_id, title, content, tags):
+        return await self.client.post("/notes/", telegram_id,
+                                      json={"title": title, "content": content, "tags": tags})
+
+    async def list_tags(self, telegram_id, limit, prefix=None):
+        params = {"limit": limit}
+        if prefix:
+            params["prefix"] = prefix
+        return await self.client.get("/tags/", telegram_id, params=params)
+
+    async def batch_notes(self, telegram_id, operations):
+        return await self.client.post("/notes/batch", telegram_id, json={"operations": operations})
+
+
+class DirectTransport(BackendTransport):
+    """Вызовы app.crud в процессе бота, без HTTP."""
+
+    # Поиск пользователя так же, как это делает get_current_user в API
+    @staticmethod
+    async def _get_user(db, telegram_id: int):
+        cache_key = ("telegram", telegram_id)
+        user = principal_cache.get(cache_key)
+        if not user:
+            user = await user_crud.get_user_by_telegram_id(db, telegram_id)
+            if user:
+                principal_cache.set(cache_key, user)
+        return user
+
+    @staticmethod
+    def _ok(schema, value, status: int = 200) -> BackendResponse:
+        return BackendResponse(status, schema.model_validate(value, from_attributes=True).model_dump(mode="json"))
+
+    async def login_telegram(self, telegram_id):
+        async with AsyncSessionLocal() as db:
+            user = await user_crud.get_user_by_telegram_id(db, telegram_id)
+            if not user:
+                return BackendResponse(404, {"detail": "User not found"})
+            return self._ok(UserInDB, user)
+
+    async def register_telegram(self, telegram_id):
+        async with AsyncSessionLocal() as db:
+            if await user_crud.get_user_by_telegram_id(db, telegram_id):
+                return BackendResponse(400, {"detail": "User with this Telegram ID already exists"})
+            return self._ok(UserInDB, await user_crud.create_user_by_telegram_id(db, telegram_id))
+
+    async def list_notes(self, telegram_id, limit, cursor=None, preview_length=None):
+        async with AsyncSessionLocal() as db:
+            user = await self._get_user(db, telegram_id)
+            if not user:
+                return BackendResponse(401, {"detail": "Invalid Telegram ID"})
+            try:
+                page = await note_crud.get_notes(db, user.id, limit=limit, cursor=cursor,
+                                                 preview_length=preview_length)
+            except ValueError:
+                return BackendResponse(400, {"detail": "Invalid cursor"})
+            return self._ok(NoteSummaryPage if preview_length else NotePage, page)
+
+    async def search_notes(self, telegram_id, tags, limit, cursor=None, preview_length=None):
+        async with AsyncSessionLocal() as db:
+            user = await self._get_user(db, telegram_id)
+            if not user:
+                return BackendResponse(401, {"detail": "Invalid Telegram ID"})
+            try:
+                page = await note_crud.search_notes(db, user.id, tags, limit=limit, cursor=cursor,
+                                                    preview_length=preview_length)
+            except ValueError:
+                return BackendResponse(400, {"detail": "Invalid cursor"})
+            return self._ok(NoteSummaryPage if preview_length else NotePage, page)
+
+    async def fulltext_search(self, telegram_id, q, limit):
+        async with AsyncSessionLocal() as db:
+            user = await self._get_user(db, telegram_id)
+            if not user:
+                return BackendResponse(401, {"detail": "Invalid Telegram ID"})
+            results = await note_crud.fulltext_search_notes(db, user.id, q, limit=limit)
+            return BackendResponse(200, [
+                NoteSearchResult.model_validate(result, from_attributes=True).model_dump(mode="json")
+                for result in results
+            ])
+
+    async def get_note(self, telegram_id, note_id):
+        async with AsyncSessionLocal() as db:
+            user = await self._get_user(db, telegram_id)
+            if not user:
+                return BackendResponse(401, {"detail": "Invalid Telegram ID"})
+            note = await note_crud.get_note(db, int(note_id), user.id)
+            if not note:
+                return BackendResponse(404, {"detail": "Note not found"})
+            return self._ok(NoteInDB, note)
+
+    async def create_note(self, telegram_id, title, content, tags):
+        async with AsyncSessionLocal() as db:
+            user = await self._get_user(db, telegram_id)
+            if not user:
+                return BackendResponse(401, {"detail": "Invalid Telegram ID"})
+            note_in = NoteCreate(title=title, content=content, tags=tags)
+            return self._ok(NoteInDB, await note_crud.create_note(db, note_in, user.id), status=201)
+
+    async def list_tags(self, telegram_id, limit, prefix=None):
+        async with AsyncSessionLocal() as db:
+            user = await self._get_user(db, telegram_id)
+            if not user:
+                return BackendResponse(401, {"detail": "Invalid Telegram ID"})
+            tags = await note_crud.get_user_tags(db, user.id, limit=limit, prefix=prefix)
+            return BackendResponse(200, [TagCount.model_validate(tag).model_dump(mode="json") for tag in tags])
+
+    async def batch_notes(self, telegram_id, operations):
+        try:
+            batch = NoteBatchRequest(operations=operations)
+        except ValidationError as exc:
+            return BackendResponse(422, {"detail": exc.errors(include_url=False, include_context=False)})
+        async with AsyncSessionLocal() as db:
+            user = await self._get_user(db, telegram_id)
+            if not user:
+                return BackendResponse(401, {"detail": "Invalid Telegram ID"})
+            try:
+                results = await note_crud.apply_note_batch(db, batch.operations, user.id)
+            except ValueError as exc:
+                return BackendResponse(400, {"detail": str(exc)})
+            return self._ok(NoteBatchResult, {"results": results})
+
+
+# Создание транспорта по настройкам
+def create_transport() -> BackendTransport:
+    if s.BOT_TRANSPORT == "direct":
+        return DirectTransport()
+    return HttpTransport()
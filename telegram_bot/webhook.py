@@ -0,0 +1,119 @@
+# telegram_bot/webhook.py
+"""Прием обновлений Telegram через вебхук.
+
+Эндпоинт проверяет секретный токен, сразу отвечает Telegram и кладет
+обновление в ограниченную очередь, которую разбирают фоновые воркеры.
+Несколько экземпляров бота можно поставить за балансировщик; общее
+состояние диалогов обеспечивает FSM_STORAGE=database.
+
+Для локальной проверки без Telegram достаточно оставить WEBHOOK_URL пустым
+(вебхук не регистрируется) и отправить сохраненное обновление:
+
+    curl -X POST localhost:8080/telegram/webhook \\
+         -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \\
+         -H "Content-Type: application/json" -d @update.json
+"""
+import asyncio
+import hmac
+import logging
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+from pydantic import ValidationError
+
+from app.core.config import settings as s
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    def __init__(
+            self,
+            dp: Dispatcher,
+            bot: Bot,
+            secret: str = s.WEBHOOK_SECRET,
+            path: str = s.WEBHOOK_PATH,
+            workers: int = s.WEBHOOK_WORKERS,
+            queue_size: int = s.WEBHOOK_QUEUE_SIZE,
+            **workflow_data: Any,
+    ):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.path = path
+        self.workers = workers
+        self.workflow_data = workflow_data
+        self.queue: asyncio.Queue[Update] = asyncio.Queue(maxsize=queue_size)
+        self._tasks: list[asyncio.Task] = []
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not self.secret or not hmac.compare_digest(token, self.secret):
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except (ValueError, ValidationError):
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram повторит доставку позже, а балансировщик может отдать ее другому экземпляру
+            logger.warning("Webhook queue is full, update %s rejected", update.update_id)
+            return web.Response(status=503)
+
+        return web.Response()
+
+    async def _worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update, **self.workflow_data)
+            except Exception:
+                logger.exception("Failed to process update %s", update.update_id)
+            finally:
+                self.queue.task_done()
+
+    async def _on_startup(self, app: web.Application):
+        await self.dp.emit_startup(bot=self.bot, dispatcher=self.dp, bots=[self.bot],
+                                   **self.dp.workflow_data, **self.workflow_data)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _on_shutdown(self, app: web.Application):
+        # Дорабатываем уже принятые обновления, затем останавливаем воркеров
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.dp.emit_shutdown(bot=self.bot, dispatcher=self.dp, bots=[self.bot],
+                                    **self.dp.workflow_data, **self.workflow_data)
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, **workflow_data: Any):
+    server = WebhookServer(dp, bot, **workflow_data)
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host=s.WEBHOOK_HOST, port=s.WEBHOOK_PORT)
+    await site.start()
+
+    if s.WEBHOOK_URL:
+        await bot.set_webhook(f"{s.WEBHOOK_URL.rstrip('/')}{server.path}",
+                              secret_token=server.secret, drop_pending_updates=False)
+
+    try:
+        await asyncio.Event().wait()  # Работаем до отмены задачи (Ctrl+C / SIGTERM)
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
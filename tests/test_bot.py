@@ -0,0 +1,438 @@
+# tests/test_bot.py
+import asyncio
+
+import aiohttp
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy.exc import OperationalError
+
+from app.crud.note import normalize_tag_names
+from telegram_bot.backend import BackendResponse
+from telegram_bot.cache import CachingTransport, note_summary
+from telegram_bot.handlers import NoteForm, quick_tags_keyboard
+from telegram_bot.rendering import MESSAGE_LIMIT, PREVIEW_LENGTH, format_tags, pack_notes
+from telegram_bot.storage import DatabaseStorage
+from telegram_bot.transport import BackendTransport
+from telegram_bot.webhook import SECRET_HEADER, WebhookServer
+
+pytestmark = pytest.mark.anyio
+
+
+# Два экземпляра бота с общей БД состояний (SQLite-файл вместо PostgreSQL)
+async def test_database_storage_is_shared_between_instances(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'fsm.db'}"
+    # Без кэша процесса каждое чтение идет в БД; изменения сбрасываются только явно
+    first = DatabaseStorage.from_url(url, cache_ttl=0, flush_interval=60)
+    second = DatabaseStorage.from_url(url, cache_ttl=0, flush_interval=60)
+    await first.create_table()
+    await second.create_table()
+    key = StorageKey(bot_id=1, chat_id=2, user_id=3)
+    try:
+        await first.set_state(key, NoteForm.waiting_for_tags)
+        await first.set_data(key, {"title": "Заголовок", "content": "Текст"})
+        assert await second.get_state(key) is None  # Еще не сброшено в БД
+
+        await first.flush()
+        assert await second.get_state(key) == NoteForm.waiting_for_tags.state
+        assert await second.get_data(key) == {"title": "Заголовок", "content": "Текст"}
+
+        await second.set_state(key, None)
+        await second.set_data(key, {})
+        await second.flush()
+        assert await first.get_state(key) is None
+        assert await first.get_data(key) == {}
+    finally:
+        await first.close()
+        await second.close()
+
+
+async def test_database_storage_create_table_is_idempotent(tmp_path):
+    storage = DatabaseStorage.from_url(f"sqlite+aiosqlite:///{tmp_path / 'fsm.db'}")
+    await storage.create_table()
+    await storage.create_table()
+    key = StorageKey(bot_id=1, chat_id=1, user_id=1)
+    await storage.set_data(key, {"search_tags": ["a"]})
+    await storage.close()  # close сбрасывает несохраненные изменения
+
+    reopened = DatabaseStorage.from_url(f"sqlite+aiosqlite:///{tmp_path / 'fsm.db'}")
+    assert await reopened.get_data(key) == {"search_tags": ["a"]}
+    await reopened.close()
+
+
+class FakeBackend(BackendTransport):
+    """Бэкенд в памяти для проверки CachingTransport: заметки одного пользователя,
+    новые первыми, поиск по всем тегам (AND), счетчик обращений."""
+
+    def __init__(self):
+        self.notes: list[dict] = []
+        self.calls: list[str] = []
+
+    def add(self, title: str, content: str = "content", tags: list[str] = ()) -> dict:
+        created = {"id": len(self.notes) + 1, "title": title, "content": content,
+                   "created_at": "2026-01-01T00:00:00", "updated_at": "2026-01-01T00:00:00",
+                   "tags": [{"id": index, "name": name} for index, name in enumerate(normalize_tag_names(tags))]}
+        self.notes.insert(0, created)
+        return created
+
+    def page(self, notes: list[dict], limit: int, cursor: str, preview_length: int) -> BackendResponse:
+        start = int(cursor or 0)
+        items = [note_summary(note, preview_length) for note in notes[start:start + limit]]
+        next_cursor = str(start + limit) if start + limit < len(notes) else None
+        return BackendResponse(200, {"items": items, "next_cursor": next_cursor})
+
+    async def list_notes(self, telegram_id, limit, cursor=None, preview_length=None):
+        self.calls.append("list")
+        return self.page(self.notes, limit, cursor, preview_length)
+
+    async def search_notes(self, telegram_id, tags, limit, cursor=None, preview_length=None):
+        self.calls.append("search")
+        wanted = set(normalize_tag_names(tags))
+        matching = [note for note in self.notes if wanted <= {tag["name"] for tag in note["tags"]}]
+        return self.page(matching, limit, cursor, preview_length)
+
+    async def create_note(self, telegram_id, title, content, tags):
+        self.calls.append("create")
+        return BackendResponse(201, self.add(title, content, tags))
+
+    async def batch_notes(self, telegram_id, operations):
+        self.calls.append("batch")
+        return BackendResponse(200, {"results": []})
+
+    # Пользователь один и уже зарегистрирован
+    async def login_telegram(self, telegram_id):
+        self.calls.append("login")
+        return BackendResponse(200, {"id": 1, "email": None, "telegram_id": telegram_id, "is_active": True})
+
+    async def register_telegram(self, telegram_id):
+        self.calls.append("register")
+        return BackendResponse(400, {"detail": "User with this Telegram ID already exists"})
+
+    async def fulltext_search(self, telegram_id, q, limit):
+        self.calls.append("fulltext")
+        found = [note for note in self.notes if q.casefold() in f"{note['title']} {note['content']}".casefold()]
+        return BackendResponse(200, [{**note, "rank": 1.0, "snippet": note["content"]} for note in found[:limit]])
+
+    async def get_note(self, telegram_id, note_id):
+        self.calls.append("get")
+        note = next((note for note in self.notes if note["id"] == int(note_id)), None)
+        if note is None:
+            return BackendResponse(404, {"detail": "Note not found"})
+        return BackendResponse(200, note)
+
+    async def list_tags(self, telegram_id, limit, prefix=None):
+        self.calls.append("tags")
+        counts: dict[str, int] = {}
+        for note in self.notes:
+            for tag in note["tags"]:
+                counts[tag["name"]] = counts.get(tag["name"], 0) + 1
+        names = [name for name in counts if name.startswith(prefix or "")]
+        names.sort(key=lambda name: (-counts[name], name))
+        return BackendResponse(200, [{"id": index, "name": name, "count": counts[name]}
+                                     for index, name in enumerate(names[:limit])])
+
+
+PAGE_SIZE = 3
+PREVIEW = 5
+USER = 1
+
+
+def ids(response: BackendResponse) -> list[int]:
+    return [note["id"] for note in response.data["items"]]
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+@pytest.fixture
+def cache(backend):
+    return CachingTransport(backend, limit=PAGE_SIZE, preview_length=PREVIEW, log_interval=0)
+
+
+async def test_note_cache_serves_repeated_list(cache, backend):
+    backend.add("a")
+    first = await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    second = await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    assert ids(first) == ids(second) == [1]
+    assert backend.calls == ["list"]
+    assert cache.stats()["hit_ratio"] == 0.5
+
+
+async def test_note_cache_bypasses_other_pages_and_sizes(cache, backend):
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    await cache.list_notes(USER, PAGE_SIZE, cursor="3", preview_length=PREVIEW)
+    await cache.list_notes(USER, PAGE_SIZE + 1, preview_length=PREVIEW)
+    await cache.search_notes(USER, ["a"], 100, preview_length=1)
+    assert backend.calls == ["list", "list", "list", "search"]
+
+
+async def test_note_cache_writes_created_note_through(cache, backend):
+    backend.add("old", tags=["a"])
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    await cache.search_notes(USER, ["a"], PAGE_SIZE, preview_length=PREVIEW)
+    await cache.search_notes(USER, ["b"], PAGE_SIZE, preview_length=PREVIEW)
+    await cache.create_note(USER, "new", "long content", ["A", "c"])
+    backend.calls.clear()
+
+    listed = await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    assert ids(listed) == [2, 1]
+    assert listed.data["items"][0]["preview"] == "long "
+    assert listed.data["items"][0]["truncated"] is True
+    assert ids(await cache.search_notes(USER, ["a"], PAGE_SIZE, preview_length=PREVIEW)) == [2, 1]
+    assert ids(await cache.search_notes(USER, ["b"], PAGE_SIZE, preview_length=PREVIEW)) == []
+    assert backend.calls == []
+
+
+async def test_note_cache_drops_pages_grown_by_creates(cache, backend):
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    # Страница растет до 2 * PAGE_SIZE заметок, следующая запись ее сбрасывает
+    for index in range(2 * PAGE_SIZE + 1):
+        await cache.create_note(USER, f"note {index}", "content", [])
+    backend.calls.clear()
+
+    listed = await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    assert backend.calls == ["list"]
+    assert len(listed.data["items"]) == PAGE_SIZE
+
+
+async def test_note_cache_derives_search_from_complete_list(cache, backend):
+    backend.add("one", tags=["a"])
+    backend.add("two", tags=["a", "b"])
+    backend.add("three", tags=["b"])
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    backend.calls.clear()
+
+    for query in (["A"], [" b ", "a"], ["b"], ["missing"]):
+        expected = await backend.search_notes(USER, query, PAGE_SIZE, preview_length=PREVIEW)
+        backend.calls.clear()
+        assert ids(await cache.search_notes(USER, query, PAGE_SIZE, preview_length=PREVIEW)) == ids(expected)
+        assert backend.calls == []
+    assert cache.local_hits == 4
+
+
+async def test_note_cache_derives_search_from_complete_subset_search(cache, backend):
+    for index in range(PAGE_SIZE + 1):
+        backend.add(f"untagged {index}")
+    backend.add("one", tags=["a"])
+    backend.add("two", tags=["a", "b"])
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)  # Неполный список: есть курсор
+    await cache.search_notes(USER, ["a"], PAGE_SIZE, preview_length=PREVIEW)
+    backend.calls.clear()
+
+    assert ids(await cache.search_notes(USER, ["a", "b"], PAGE_SIZE, preview_length=PREVIEW)) == [6]
+    assert backend.calls == []
+
+
+async def test_note_cache_does_not_derive_search_from_incomplete_page(cache, backend):
+    for index in range(PAGE_SIZE + 1):
+        backend.add(f"note {index}", tags=["a"])
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    backend.calls.clear()
+
+    found = await cache.search_notes(USER, ["a"], PAGE_SIZE, preview_length=PREVIEW)
+    assert backend.calls == ["search"]
+    assert found.data["next_cursor"] is not None
+
+
+async def test_note_cache_does_not_derive_search_larger_than_page(backend):
+    cache = CachingTransport(backend, limit=PAGE_SIZE, preview_length=PREVIEW, log_interval=0)
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    # Полный список растет записью через бота, но результат поиска в страницу не помещается
+    for index in range(PAGE_SIZE + 1):
+        await cache.create_note(USER, f"note {index}", "content", ["a"])
+    backend.calls.clear()
+
+    found = await cache.search_notes(USER, ["a"], PAGE_SIZE, preview_length=PREVIEW)
+    assert backend.calls == ["search"]
+    assert len(found.data["items"]) == PAGE_SIZE and found.data["next_cursor"] is not None
+
+
+async def test_note_cache_batch_clears_user_entry(cache, backend):
+    backend.add("one", tags=["a"])
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    await cache.search_notes(USER, ["a"], PAGE_SIZE, preview_length=PREVIEW)
+    await cache.batch_notes(USER, [{"op": "update", "id": 1, "add_tags": ["b"], "remove_tags": ["a"]}])
+    backend.calls.clear()
+
+    await cache.search_notes(USER, ["a"], PAGE_SIZE, preview_length=PREVIEW)
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    assert backend.calls == ["search", "list"]
+
+
+async def test_note_cache_entry_expires(backend):
+    cache = CachingTransport(backend, limit=PAGE_SIZE, preview_length=PREVIEW, ttl=0, log_interval=0)
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    await cache.list_notes(USER, PAGE_SIZE, preview_length=PREVIEW)
+    assert backend.calls == ["list", "list"]
+
+
+def rendered_note(note_id: int, title: str = "title", content: str = "content", tags=("a",)) -> dict:
+    return {"id": note_id, "title": title, "content": content,
+            "tags": [{"id": index, "name": name} for index, name in enumerate(tags)]}
+
+
+def test_pack_notes_fits_short_notes_into_one_message():
+    messages = pack_notes([rendered_note(index) for index in range(10)])
+    assert len(messages) == 1
+    assert messages[0].text.count("<b>title</b>") == 10
+    assert messages[0].buttons == []
+
+
+def test_pack_notes_splits_by_message_limit_and_keeps_order():
+    notes = [rendered_note(index, title=f"note {index}", content="x" * PREVIEW_LENGTH) for index in range(40)]
+    messages = pack_notes(notes)
+    assert len(messages) > 1
+    assert all(len(message.text) <= MESSAGE_LIMIT for message in messages)
+    titles = [line for message in messages for line in message.text.split("\n") if line.startswith("<b>")]
+    assert titles == [f"<b>note {index}</b>" for index in range(40)]
+
+
+def test_pack_notes_collapses_long_content_with_button():
+    long_note = rendered_note(7, content="y" * (PREVIEW_LENGTH + 1))
+    [message] = pack_notes([rendered_note(1), long_note])
+    assert "y" * (PREVIEW_LENGTH + 1) not in message.text
+    assert "…" in message.text
+    assert [button.callback_data for button in message.buttons] == ["note:7"]
+
+
+def test_pack_notes_renders_summary_preview_and_escapes_html():
+    summary = {"id": 3, "title": "<b>x</b>", "preview": "a & b", "truncated": False,
+               "tags": [{"id": 1, "name": "<tag>"}]}
+    [message] = pack_notes([summary])
+    assert message.text == "<b>&lt;b&gt;x&lt;/b&gt;</b>\na &amp; b\n<i>Теги: &lt;tag&gt;</i>"
+
+
+def test_pack_notes_uses_ready_html_bodies():
+    [message] = pack_notes([rendered_note(1)], bodies_html=["<b>found</b> here"])
+    assert "<b>found</b> here" in message.text
+    assert [button.callback_data for button in message.buttons] == ["note:1"]
+
+
+# Обновление в том виде, в котором его присылает Telegram (см. пример curl в telegram_bot/webhook.py)
+RECORDED_UPDATE = {
+    "update_id": 815000001,
+    "message": {
+        "message_id": 42,
+        "from": {"id": 1234567, "is_bot": False, "first_name": "Test", "language_code": "ru"},
+        "chat": {"id": 1234567, "first_name": "Test", "type": "private"},
+        "date": 1760000000,
+        "text": "/notes",
+        "entities": [{"offset": 0, "length": 6, "type": "bot_command"}],
+    },
+}
+SECRET = "webhook-secret"
+
+
+@pytest.fixture
+async def webhook():
+    """Сервер вебхука с диспетчером, записывающим тексты полученных сообщений."""
+    received: asyncio.Queue[str] = asyncio.Queue()
+    router = Router()
+
+    @router.message()
+    async def record(message: Message):
+        await received.put(message.text)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:AAHdqTcvCH1vGWJxfSeofSAs0K5PALDsaw")
+    clients: list[TestClient] = []
+
+    async def start(**kwargs) -> tuple[WebhookServer, TestClient]:
+        server = WebhookServer(dp, bot, secret=SECRET, path="/telegram/webhook", **kwargs)
+        client = TestClient(TestServer(server.create_app()))
+        await client.start_server()
+        clients.append(client)
+        return server, client
+
+    yield start, received
+    for client in clients:
+        await client.close()
+    await bot.session.close()
+
+
+async def post_update(client: TestClient, update, secret: str = SECRET) -> int:
+    response = await client.post("/telegram/webhook", json=update, headers={SECRET_HEADER: secret})
+    return response.status
+
+
+async def test_webhook_delivers_recorded_update(webhook):
+    start, received = webhook
+    _, client = await start(workers=1)
+    assert await post_update(client, RECORDED_UPDATE) == 200
+    assert await asyncio.wait_for(received.get(), timeout=5) == "/notes"
+
+
+async def test_webhook_rejects_wrong_or_missing_secret(webhook):
+    start, received = webhook
+    _, client = await start(workers=1)
+    assert await post_update(client, RECORDED_UPDATE, secret="wrong") == 401
+    response = await client.post("/telegram/webhook", json=RECORDED_UPDATE)
+    assert response.status == 401
+    assert received.empty()
+
+
+async def test_webhook_rejects_malformed_update(webhook):
+    start, _ = webhook
+    server, client = await start(workers=1)
+    response = await client.post("/telegram/webhook", data=b"{not json",
+                                 headers={SECRET_HEADER: SECRET, "Content-Type": "application/json"})
+    assert response.status == 400
+    assert await post_update(client, {"message": {"text": "no update_id"}}) == 400
+    assert server.queue.empty()
+
+
+async def test_webhook_answers_503_when_queue_is_full(webhook):
+    start, _ = webhook
+    # Без воркеров очередь не разбирается
+    server, client = await start(workers=0, queue_size=1)
+    assert await post_update(client, RECORDED_UPDATE) == 200
+    assert await post_update(client, {**RECORDED_UPDATE, "update_id": 815000002}) == 503
+    assert server.queue.get_nowait().update_id == 815000001
+    server.queue.task_done()  # Иначе остановка сервера ждет обработки принятого обновления
+
+
+def test_pack_notes_limits_long_tag_list():
+    tag_names = [f"tag-{index:04d}-<&>" for index in range(600)]
+    notes = [rendered_note(1, title="&" * 200, content='"' * PREVIEW_LENGTH, tags=tag_names), rendered_note(2)]
+    messages = pack_notes(notes)
+    assert all(message.blocks and len(message.text) <= MESSAGE_LIMIT for message in messages)
+    first = messages[0].blocks[0]
+    assert "tag-0000-&lt;&amp;&gt;" in first
+    assert "tag-0599" not in first
+    shown = first.count("tag-")
+    assert first.endswith(f"… и еще {600 - shown}</i>")
+
+
+def test_format_tags_keeps_short_lists():
+    assert format_tags(rendered_note(1, tags=("a", "b"))) == "a, b"
+    assert format_tags(rendered_note(1, tags=())) == "нет"
+    assert format_tags(rendered_note(1, tags=("x" * 50,)), length=20) == "… и еще 1"
+
+
+class UnreachableTagCatalogue(FakeBackend):
+    def __init__(self, error: Exception):
+        super().__init__()
+        self.error = error
+
+    async def list_tags(self, telegram_id, limit, prefix=None):
+        raise self.error
+
+
+async def test_quick_tags_keyboard_offers_most_used_tags(backend):
+    backend.add("a", tags=["work", "home"])
+    backend.add("b", tags=["work"])
+    keyboard = await quick_tags_keyboard(backend, USER, extra=("нет",))
+    assert [[button.text for button in row] for row in keyboard.keyboard] == [["work", "home", "нет"]]
+    assert await quick_tags_keyboard(FakeBackend(), USER) is None
+
+
+# Недоступный каталог тегов не прерывает /newnote и /findnote: клавиатуры просто нет
+@pytest.mark.parametrize("error", [aiohttp.ClientConnectionError("refused"), asyncio.TimeoutError(),
+                                   OperationalError("SELECT 1", {}, Exception("connection lost"))])
+async def test_quick_tags_keyboard_ignores_backend_errors(error):
+    assert await quick_tags_keyboard(UnreachableTagCatalogue(error), USER, extra=("нет",)) is None
@@ -0,0 +1,147 @@
+# tests/test_notes.py
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.api.note import etag_matches, notes_etag
+from app.core.metrics import RequestStats, current_request_stats
+from app.crud.note import (apply_note_batch, create_note, decode_cursor, delete_note, encode_cursor,
+                           update_note)
+from app.crud.user import create_user_by_telegram_id
+from app.db.base import AsyncSessionLocal
+from app.models.note import Note, Tag
+from app.models.user import User
+from app.schemas.note import NoteBatchRequest, NoteCreate
+
+pytestmark = pytest.mark.anyio
+
+@pytest.mark.parametrize("updated_at, note_id", [
+    (datetime(2024, 9, 21, 12, 30, 15, 123456), 42),
+    (datetime(1970, 1, 1), 1),
+    (datetime(2100, 1, 1, 0, 0, 0, 1), 2 ** 31 - 1),
+])
+def test_cursor_round_trip(updated_at, note_id):
+    cursor = encode_cursor(updated_at, note_id)
+    assert "=" not in cursor  # Курсор передается в query-параметре без экранирования
+    assert decode_cursor(cursor) == (updated_at, note_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "bm90LWEtbnVtYmVy", encode_cursor(datetime(2024, 1, 1), 1)[:-3]])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    (None, False),
+    ("", False),
+    ('W/"1-5"', True),
+    ('"1-5"', True),  # Слабое сравнение: W/ не учитывается
+    ('W/"1-4"', False),
+    ('W/"2-5"', False),
+    ('W/"1-4", W/"1-5"', True),
+    (" * ", True),
+])
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(if_none_match, notes_etag(1, 5)) is matches
+
+
+# Тесты записи работают с БД приложения: данные теста отделены префиксом тегов
+# и Telegram ID вне диапазона настоящих пользователей (и нагрузочных тестов)
+TAG_PREFIX = "test-write-"
+TELEGRAM_ID = 8_999_999_999_990
+
+
+def tags(*names: str) -> list[str]:
+    return [TAG_PREFIX + name for name in names]
+
+
+def note(*tag_names: str) -> NoteCreate:
+    return NoteCreate(title="title", content="content", tags=tags(*tag_names))
+
+
+# Выполнение операции в новой сессии, как в API
+async def run(operation, *args):
+    async with AsyncSessionLocal() as db:
+        return await operation(db, *args)
+
+
+# То же с подсчетом SQL-выражений (тем же счетчиком, что и метрика db_queries_per_request;
+# BEGIN и COMMIT не считаются) и проверкой бюджета
+async def run_within_budget(budget: int, operation, *args):
+    stats = RequestStats(capture_statements=True)
+    token = current_request_stats.set(stats)
+    try:
+        result = await run(operation, *args)
+    finally:
+        current_request_stats.reset(token)
+    statements = "\n".join(" ".join(statement.split())[:200] for statement, _ in stats.statements)
+    assert stats.queries <= budget, f"{stats.queries} queries, budget {budget}:\n{statements}"
+    return result
+
+
+async def cleanup(engine):
+    async with engine.begin() as conn:
+        # Связи note_tags удаляются каскадно
+        user_ids = select(User.id).where(User.telegram_id == TELEGRAM_ID).scalar_subquery()
+        await conn.execute(delete(Note).where(Note.user_id.in_(user_ids)))
+        await conn.execute(delete(User).where(User.telegram_id == TELEGRAM_ID))
+        await conn.execute(delete(Tag).where(Tag.name.startswith(TAG_PREFIX)))
+
+
+@pytest.fixture
+async def user_id(database):
+    await cleanup(database)
+    async with AsyncSessionLocal() as db:
+        user = await create_user_by_telegram_id(db, TELEGRAM_ID)
+    yield user.id
+    await cleanup(database)
+
+
+@pytest.mark.parametrize("existing, tag_names, budget", [
+    pytest.param([], ["a", "b"], 6, id="new tags"),
+    pytest.param(["a", "b"], ["a", "b"], 5, id="existing tags"),
+    pytest.param([], [], 2, id="no tags"),
+])
+async def test_create_note_query_budget(user_id, existing, tag_names, budget):
+    if existing:
+        await run(create_note, note(*existing), user_id)
+    created = await run_within_budget(budget, create_note, note(*tag_names), user_id)
+    assert sorted(tag["name"] for tag in created["tags"]) == tags(*tag_names)
+
+
+@pytest.mark.parametrize("initial, other, tag_names, budget", [
+    pytest.param(["a", "b"], [], ["b", "a"], 3, id="same tags"),
+    pytest.param(["a", "b"], [], ["a"], 5, id="drop a tag"),
+    pytest.param(["a"], ["b"], ["a", "b"], 6, id="add existing tag"),
+    pytest.param(["a", "b"], [], ["c"], 9, id="replace with new tag"),
+])
+async def test_update_note_query_budget(user_id, initial, other, tag_names, budget):
+    created = await run(create_note, note(*initial), user_id)
+    if other:
+        await run(create_note, note(*other), user_id)
+    updated = await run_within_budget(budget, update_note, created["id"], note(*tag_names), user_id)
+    assert sorted(tag["name"] for tag in updated["tags"]) == sorted(tags(*tag_names))
+
+
+async def test_update_missing_note_query_budget(user_id):
+    assert await run_within_budget(1, update_note, 0, note("a"), user_id) is None
+
+
+async def test_delete_note_query_budget(user_id):
+    created = await run(create_note, note("a", "b"), user_id)
+    assert await run_within_budget(3, delete_note, created["id"], user_id) == created["id"]
+    assert await run_within_budget(2, delete_note, created["id"], user_id) is None
+
+
+async def test_note_batch_query_budget(user_id):
+    first = await run(create_note, note("c"), user_id)
+    second = await run(create_note, note("a", "b"), user_id)
+    batch = NoteBatchRequest(operations=[
+        *({"op": "create", "title": "t", "content": "c", "tags": tags("a", "d")} for _ in range(50)),
+        {"op": "update", "id": first["id"], "add_tags": tags("b"), "remove_tags": tags("c")},
+        {"op": "delete", "id": second["id"]},
+    ])
+    results = await run_within_budget(12, apply_note_batch, batch.operations, user_id)
+    assert [result["status"] for result in results[-2:]] == ["updated", "deleted"]